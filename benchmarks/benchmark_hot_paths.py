@@ -0,0 +1,356 @@
+"""
+Benchmark suite for the SimplePYBotSDK hot paths. Runs offline: robots use synthetic configurations and
+clients connect over loopback.
+
+Usage:
+    python benchmarks/benchmark_hot_paths.py --motors 10,100,1000 --clients 1,10 --output results.json
+
+Results are written as JSON (to stdout if --output is not given), SDK messages are printed to stderr.
+Durations are in microseconds.
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import selectors
+import socket
+import statistics
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import simplepybotsdk  # noqa: E402
+from simplepybotsdk.motionScheduler import MotionScheduler, MotionHandle  # noqa: E402
+from simplepybotsdk.parserJSONCommands import ParserJSONCommands  # noqa: E402
+from simplepybotsdk.telemetry import TelemetryBuffer  # noqa: E402
+
+RESULTS_VERSION = 1
+
+
+def create_config(directory: str, motors: int, backend: str = "array") -> str:
+    """
+    Write a synthetic robot configuration.
+    :param directory: directory of the configuration file.
+    :param motors: number of motors. Sensors are one every 10 motors.
+    :param backend: MotorsStore backend.
+    :return: path of the configuration file.
+    """
+    keys = ["motor_{}".format(i) for i in range(motors)]
+    configuration = {
+        "id": "benchmark_{}".format(motors),
+        "version": "1",
+        "name": "Benchmark robot with {} motors".format(motors),
+        "enable_parser_json_commands": True,
+        "enable_twist_controller": True,
+        "motors_store_backend": backend,
+        "socket_max_connections": 0,
+        "web_socket_max_connections": 0,
+        "motors": {key: {
+            "id": str(i),
+            "offset": float(i % 90),
+            "type": "virtual-servo",
+            "angle_limit": [-90, 90],
+            "orientation": "direct" if i % 2 == 0 else "indirect"
+        } for i, key in enumerate(keys)},
+        "motors_type": {"virtual-servo": {"angle_speed": 60}},
+        "sensors": {"sensor_{}".format(i): {"id": "s{}".format(i), "offset": 0.0} for i in range(max(1, motors // 10))},
+        "poses": {
+            "zero": {key: 0 for key in keys},
+            "half": {key: 45 for key in keys}
+        }
+    }
+    path = os.path.join(directory, "benchmark_{}_{}.json".format(motors, backend))
+    with open(path, "w") as f:
+        json.dump(configuration, f)
+    return path
+
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def summarize(durations: list) -> dict:
+    """
+    :param durations: list of durations in seconds.
+    :return: dict with iterations, mean, median, p95, min, max in microseconds and operations per second.
+    """
+    durations = sorted(durations)
+    mean = statistics.mean(durations)
+    return {
+        "iterations": len(durations),
+        "mean_us": round(mean * 1e6, 3),
+        "median_us": round(statistics.median(durations) * 1e6, 3),
+        "p95_us": round(durations[int(len(durations) * 0.95) - 1] * 1e6, 3),
+        "min_us": round(durations[0] * 1e6, 3),
+        "max_us": round(durations[-1] * 1e6, 3),
+        "ops_per_second": round(1 / mean, 1) if mean > 0 else None
+    }
+
+
+def measure(function, iterations: int, warmup: int = 10) -> dict:
+    """
+    :param function: function to call.
+    :param iterations: number of timed calls.
+    :param warmup: number of calls before timing.
+    :return: summarize() of the calls duration.
+    """
+    for _ in range(warmup):
+        function()
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return summarize(durations)
+
+
+def bench_motors_tick(config_path: str, iterations: int) -> dict:
+    """Cost of a motors thread tick with all the motors moving, telemetry included."""
+    robot = simplepybotsdk.RobotSDK(config_path, motors_check_per_second=0)  # Ticks are called by the benchmark
+    robot.telemetry = TelemetryBuffer(robot, 200)
+    store = robot.motors_store
+    for i in range(len(store)):
+        store.max_step[i] = 0.01  # Motors never reach the goal during the benchmark
+        store.goal[i] = 1e9 if i % 2 == 0 else -1e9
+    return measure(robot._motors_tick, iterations)
+
+
+def bench_point_to_point(config_path: str, iterations: int) -> dict:
+    """Point to point compilation (with and without cache) and playback of all the rows by the scheduler."""
+    robot = simplepybotsdk.RobotSDK(config_path, motors_check_per_second=0)
+    compiler = robot.trajectory_compiler
+    goal = {m.key: 30 for m in robot.motors}
+
+    def compile_uncached():
+        compiler.invalidate()
+        compiler.compile_move(goal, 2)
+
+    def play():
+        scheduler = MotionScheduler(robot)
+        scheduler._pending.append(MotionHandle(compiler.compile_move(goal, 2)))
+        while len(scheduler._pending) > 0 or len(scheduler._active) > 0:
+            scheduler.tick()
+
+    trajectory = compiler.compile_move(goal, 2)
+    result = {
+        "rows": trajectory.number_of_steps,
+        "compile": measure(compile_uncached, iterations),
+        "compile_cached": measure(lambda: compiler.compile_move(goal, 2), iterations),
+        "play": measure(play, max(1, iterations // 10), warmup=1)
+    }
+    result["rows_per_second"] = round(trajectory.number_of_steps * 1e6 / result["play"]["mean_us"], 1)
+    return result
+
+
+def bench_status(config_path: str, iterations: int) -> dict:
+    """Live status dict and its serialization, with and without the status cache."""
+    robot = simplepybotsdk.RobotSDK(config_path, motors_check_per_second=0)
+
+    def rebuild_json():
+        robot.status_cache.invalidate()
+        robot.status_cache.get_json()
+
+    def rebuild_binary():
+        robot.status_cache.invalidate()
+        robot.status_cache.get_binary()
+
+    return {
+        "get_robot_dict_status": measure(robot.get_robot_dict_status, iterations),
+        "get_robot_dict_status_json": measure(lambda: json.dumps(robot.get_robot_dict_status()), iterations),
+        "status_cache_json_rebuild": measure(rebuild_json, iterations),
+        "status_cache_binary_rebuild": measure(rebuild_binary, iterations),
+        "status_cache_json_hit": measure(robot.status_cache.get_json, iterations)
+    }
+
+
+def bench_parser(config_path: str, iterations: int) -> dict:
+    """ParserJSONCommands dispatch of common client messages."""
+    robot = simplepybotsdk.RobotSDK(config_path, motors_check_per_second=0)
+    parser = ParserJSONCommands(robot)
+    live_status = {"type": "C2R", "data": {"area": "status", "action": "live_status"}}
+    motors = {"type": "C2R", "data": {"area": "motors", "commands": [
+        {"key": m.key, "action": "set_goal_angle", "goal_angle": 10} for m in robot.motors]}}
+    batch = {"type": "C2R", "data": {"area": "motors", "action": "set_goal_angles",
+                                     "goal_angles": [10] * len(robot.motors)}}
+    twist = {"type": "C2R", "data": {"area": "twist", "go": {"linear": {"x": 1, "y": 0, "z": 0},
+                                                              "angular": {"x": 0, "y": 0, "z": 0.5}}}}
+    return {
+        "live_status": measure(lambda: parser(live_status), iterations),
+        "motors_set_goal_angle": measure(lambda: parser(motors), iterations),
+        "motors_set_goal_angles_batch": measure(lambda: parser(batch), iterations),
+        "twist": measure(lambda: parser(twist), iterations)
+    }
+
+
+def _receive(clients: list, seconds: float, marker: bytes) -> list:
+    """
+    Read from all the clients for some seconds.
+    :return: list of messages received by every client, counted by marker occurrences.
+    """
+    selector = selectors.DefaultSelector()
+    counts = {}
+    tails = {}
+    for c in clients:
+        c.setblocking(False)
+        selector.register(c, selectors.EVENT_READ)
+        counts[c] = 0
+        tails[c] = b""
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for key, _ in selector.select(timeout=0.05):
+            data = tails[key.fileobj] + key.fileobj.recv(65536)
+            counts[key.fileobj] += data.count(marker)
+            tails[key.fileobj] = data[-len(marker):]
+    selector.close()
+    return [counts[c] for c in clients]
+
+
+def _fan_out_result(robot, received: list, seconds: float, rate: float) -> dict:
+    per_second = [r / seconds for r in received]
+    metrics = robot.get_metrics()
+    result = {
+        "clients": len(received),
+        "rate": rate,
+        "messages_per_client_per_second_mean": round(statistics.mean(per_second), 2),
+        "messages_per_client_per_second_min": round(min(per_second), 2),
+        "loops": robot.get_loops_stats()
+    }
+    for name in ("send_seconds", "broadcast_seconds"):
+        for values in metrics.get(name, []):
+            result[name] = {"count": values["count"], "mean_us": round(values["mean"] * 1e6, 3),
+                            "max_us": round(values["max"] * 1e6, 3)}
+    return result
+
+
+def bench_socket_fan_out(config_path: str, clients: int, seconds: float, rate: float, mode: str) -> dict:
+    """RobotSocketSDK status messages sent to many loopback clients."""
+    port = get_free_port()
+    robot = simplepybotsdk.RobotSocketSDK(config_path, "localhost", port, motors_check_per_second=0,
+                                          socket_send_per_second=rate, socket_mode=mode)
+    robot.show_log_message = False
+    time.sleep(0.3)
+    connections = [socket.create_connection(("localhost", port)) for _ in range(clients)]
+    try:
+        _receive(connections, 0.5, b'"live_status"')  # Messages sent while the clients were connecting
+        received = _receive(connections, seconds, b'"live_status"')
+    finally:
+        for c in connections:
+            c.close()
+    return _fan_out_result(robot, received, seconds, rate)
+
+
+def bench_web_socket_fan_out(config_path: str, clients: int, seconds: float, rate: float) -> dict:
+    """RobotWebSocketSDK status frames sent to many loopback clients."""
+    port = get_free_port()
+    robot = simplepybotsdk.RobotWebSocketSDK(config_path, "localhost", port, motors_check_per_second=0,
+                                             socket_send_per_second=rate)
+    robot.show_log_message = False
+    time.sleep(0.3)
+    connections = []
+    for _ in range(clients):
+        c = socket.create_connection(("localhost", port))
+        c.sendall("GET / HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                  "Sec-WebSocket-Key: {}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+                  .format(base64.b64encode(os.urandom(16)).decode()).encode())
+        connections.append(c)
+    try:
+        _receive(connections, 0.5, b'"live_status"')  # Messages sent while the clients were connecting
+        received = _receive(connections, seconds, b'"live_status"')
+    finally:
+        for c in connections:
+            c.close()
+    return _fan_out_result(robot, received, seconds, rate)
+
+
+def bench_rest_status(config_path: str, iterations: int) -> dict:
+    """REST GET /status/ latency over loopback."""
+    rest_port = get_free_port()
+    robot = simplepybotsdk.RobotRESTSDK(config_path, "localhost", get_free_port(), "localhost", rest_port,
+                                        motors_check_per_second=0)
+    robot.show_log_message = False
+    robot.rest_configure()
+    robot.rest_serve_forever()
+    time.sleep(0.3)
+    url = "http://localhost:{}{}/status/".format(rest_port, robot.rest_base_url)
+    result = measure(lambda: urllib.request.urlopen(url).read(), iterations)
+    robot._server.shutdown()
+    return result
+
+
+def run(args) -> dict:
+    results = {
+        "version": RESULTS_VERSION,
+        "sdk_version": simplepybotsdk.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": datetime.now().isoformat(),
+        "benchmarks": {}
+    }
+    directory = tempfile.mkdtemp(prefix="simplepybotsdk_benchmark_")
+    for motors in args.motors:
+        for backend in args.backends:
+            config_path = create_config(directory, motors, backend)
+            name = "{}_motors_{}".format(motors, backend)
+            log("Benchmark {}".format(name))
+            iterations = max(10, args.iterations * 10 // motors)
+            bench = {
+                "motors_tick": bench_motors_tick(config_path, args.iterations),
+                "point_to_point": bench_point_to_point(config_path, iterations),
+                "status": bench_status(config_path, iterations),
+                "parser": bench_parser(config_path, iterations)
+            }
+            if not args.skip_network and backend == args.backends[0]:
+                bench["rest_status"] = bench_rest_status(config_path, min(iterations, 200))
+                for clients in args.clients:
+                    for mode in ("thread", "asyncio"):
+                        log("Benchmark {}: socket {} with {} clients".format(name, mode, clients))
+                        bench["socket_{}_{}_clients".format(mode, clients)] = bench_socket_fan_out(
+                            config_path, clients, args.duration, args.rate, mode)
+                    log("Benchmark {}: websocket with {} clients".format(name, clients))
+                    bench["web_socket_{}_clients".format(clients)] = bench_web_socket_fan_out(
+                        config_path, clients, args.duration, args.rate)
+            results["benchmarks"][name] = bench
+    return results
+
+
+def log(message: str):
+    sys.stderr.write(message + "\n")
+    sys.stderr.flush()
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="SimplePYBotSDK hot paths benchmark")
+    parser.add_argument("--motors", default="10,100,1000", help="comma separated motors count (default: %(default)s)")
+    parser.add_argument("--backends", default="array", help="comma separated MotorsStore backends: array,numpy")
+    parser.add_argument("--clients", default="1,10", help="comma separated socket clients count (default: %(default)s)")
+    parser.add_argument("--iterations", type=int, default=1000, help="iterations of the 10 motors benchmarks. "
+                                                                     "Reduced for bigger robots (default: %(default)s)")
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds of every fan out benchmark")
+    parser.add_argument("--rate", type=float, default=20, help="status messages per second of fan out benchmarks")
+    parser.add_argument("--skip-network", action="store_true", help="skip socket, websocket and REST benchmarks")
+    parser.add_argument("--output", help="JSON results path. Default is stdout")
+    args = parser.parse_args()
+    args.motors = [int(m) for m in args.motors.split(",")]
+    args.backends = args.backends.split(",")
+    args.clients = [int(c) for c in args.clients.split(",")]
+    return args
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    stdout = sys.stdout
+    sys.stdout = sys.stderr  # SDK messages must not mix with JSON results
+    output = json.dumps(run(arguments), indent=2)
+    if arguments.output:
+        with open(arguments.output, "w") as f:
+            f.write(output + "\n")
+        log("Results written to {}".format(arguments.output))
+    else:
+        stdout.write(output + "\n")
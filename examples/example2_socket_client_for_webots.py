@@ -1,5 +1,6 @@
 """Use this controller with Webots. Works with khr-2hv robot model"""
 import socket
+import struct
 import json
 from controller import Robot
 
@@ -7,30 +8,79 @@ SOCKET_HOST = "localhost"
 SOCKET_PORT = 65432
 MAX_SPEED = 6.28  # Max motor speed
 
+# Binary live status (see simplepybotsdk/binaryStatus.py)
+FRAME_HEADER = struct.Struct("<I")
+STATUS_HEADER = struct.Struct("<4sBBIdHH")
+
 # Create the Robot instance
 robot = Robot()
 
 
-def move_robot(motors):
-    for m in motors:
-        motor = robot.getDevice(m["id"])
-        motor.setPosition(6.28 / 360 * m["abs_current_angle"])
+def read_frames(conn, buffer):
+    """Read available data and return all the complete length-prefixed frames."""
+    try:
+        data = conn.recv(65536)
+        if len(data) == 0:
+            raise ConnectionError("Connection closed")
+        buffer.extend(data)
+    except socket.timeout:
+        pass
+    frames = []
+    while len(buffer) >= FRAME_HEADER.size:
+        size = FRAME_HEADER.unpack_from(buffer)[0]
+        if len(buffer) < FRAME_HEADER.size + size:
+            break
+        frames.append(bytes(buffer[FRAME_HEADER.size:FRAME_HEADER.size + size]))
+        del buffer[:FRAME_HEADER.size + size]
+    return frames
+
+
+def sync_frames(conn, buffer):
+    """Skip JSON messages sent before the binary encoding was active, until the first binary status frame."""
+    while True:
+        try:
+            data = conn.recv(65536)
+        except socket.timeout:
+            continue
+        if len(data) == 0:
+            raise ConnectionError("Connection closed")
+        buffer.extend(data)
+        index = buffer.find(b"SPBS")
+        if index >= FRAME_HEADER.size:
+            del buffer[:index - FRAME_HEADER.size]
+            return
+
+
+def move_robot(motors_id, payload):
+    _, _, _, seq, timestamp, motors, sensors = STATUS_HEADER.unpack_from(payload)
+    current_angles = struct.unpack_from("<{}f".format(motors), payload, STATUS_HEADER.size + motors * 4)
+    for motor_id, angle in zip(motors_id, current_angles):
+        motor = robot.getDevice(motor_id)
+        motor.setPosition(6.28 / 360 * angle)
         motor.setVelocity(1 * MAX_SPEED)
 
 
 if __name__ == "__main__":
     time_step = int(robot.getBasicTimeStep())
 
-    socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    socket.connect((SOCKET_HOST, SOCKET_PORT))
-    socket.settimeout(0.003)
-    socket.send('{"socket": {"format": "absolute"}}'.encode())
+    conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    conn.connect((SOCKET_HOST, SOCKET_PORT))
+    conn.settimeout(0.003)
+    conn.send('{"socket": {"format": "absolute", "encoding": "binary"}}'.encode())
+    buffer = bytearray()
+    sync_frames(conn, buffer)
+    # Motor values are sent in the configuration order: read the configuration to know motors id
+    conn.send('{"type": "C2R", "data": {"area": "config", "action": "get_configuration"}}'.encode())
+    motors_id = None
 
     while robot.step(time_step) != -1:
-        try:
-            data = socket.recv(8192).decode()
-            data = json.loads(data)
-            print(data)
-            move_robot(data["motors"])
-        except:
-            pass
+        status = None
+        for frame in read_frames(conn, buffer):
+            if frame.startswith(b"SPBS"):
+                status = frame  # Only the latest status is used
+            else:
+                message = json.loads(frame.decode())
+                if message["data"]["action"] == "get_configuration":
+                    motors_id = [m["id"] for m in message["data"]["value"]["motors"].values()]
+        if status is not None and motors_id is not None:
+            move_robot(motors_id, status)
@@ -10,5 +10,6 @@ setup(
     version=version,
     packages=['simplepybotsdk'],
     install_requires=['pyramid==1.10.5', 'SimpleWebSocketServer==0.1.1'],
+    extras_require={'numpy': ['numpy']},
     python_requires='>=3.5',
 )
@@ -1,8 +1,40 @@
+import sys
+
 from simplepybotsdk.configurations import VERSION as __version__
 from simplepybotsdk.configurations import LICENSE as __license__
 from simplepybotsdk.motor import Motor as Motor
 from simplepybotsdk.sensor import Sensor as Sensor
 from simplepybotsdk.robotSDK import RobotSDK as RobotSDK
-from simplepybotsdk.robotSocketSDK import RobotSocketSDK as RobotSocketSDK
-from simplepybotsdk.robotWebSocketSDK import RobotWebSocketSDK as RobotWebSocketSDK
-from simplepybotsdk.robotRestSDK import RobotRESTSDK as RobotRESTSDK
+
+# Transports are imported on first use (PEP 562): headless robots do not load asyncio, Pyramid or
+# SimpleWebSocketServer. See startupReport to measure import time and memory of every SDK class.
+_LAZY_CLASSES = {
+    "RobotSocketSDK": "simplepybotsdk.robotSocketSDK",
+    "RobotWebSocketSDK": "simplepybotsdk.robotWebSocketSDK",
+    "RobotRESTSDK": "simplepybotsdk.robotRestSDK",
+    "RobotFleet": "simplepybotsdk.robotFleet",
+    "StateReader": "simplepybotsdk.stateExport"
+}
+
+__all__ = ["Motor", "Sensor", "RobotSDK"] + list(_LAZY_CLASSES)
+
+
+def __getattr__(name):
+    if name in _LAZY_CLASSES:
+        import importlib
+        value = getattr(importlib.import_module(_LAZY_CLASSES[name]), name)
+        globals()[name] = value  # Next lookups do not call __getattr__
+        return value
+    raise AttributeError("module 'simplepybotsdk' has no attribute '{}'".format(name))
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_CLASSES))
+
+
+if sys.version_info < (3, 7):  # Module __getattr__ is not supported: import the transports now
+    from simplepybotsdk.robotSocketSDK import RobotSocketSDK as RobotSocketSDK
+    from simplepybotsdk.robotWebSocketSDK import RobotWebSocketSDK as RobotWebSocketSDK
+    from simplepybotsdk.robotRestSDK import RobotRESTSDK as RobotRESTSDK
+    from simplepybotsdk.robotFleet import RobotFleet as RobotFleet
+    from simplepybotsdk.stateExport import StateReader as StateReader
@@ -0,0 +1,133 @@
+import json
+import logging
+import threading
+import time
+
+import simplepybotsdk.configurations as configurations
+from simplepybotsdk.statusStream import ClientStream
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionControl:
+    """
+    Connection policy of a transport (socket or websocket) with accepted, rejected and evicted counters.
+    - max_connections: clients connected at the same time. 0 for no limit.
+    - max_send_per_second: max status messages per second sent to every client. None to use the transport rate.
+      Clients can ask a lower rate with the message: {"socket": {"rate": 5}}.
+    - idle_timeout: seconds without messages from a client before it is evicted. None to disable.
+    Values can be changed at runtime, or set in the configuration file with the transport prefix, example:
+    "socket_max_connections", "web_socket_max_send_per_second", "socket_idle_timeout".
+    """
+
+    def __init__(self, name: str, max_connections: int = None, max_send_per_second: float = None,
+                 idle_timeout: float = None):
+        """
+        :param name: name of the transport. Used in logs and stats.
+        :param max_connections: clients connected at the same time. Default is 0, no limit.
+        :param max_send_per_second: max status messages per second for every client.
+        :param idle_timeout: seconds without messages before a client is evicted.
+        """
+        self.name = name
+        self.max_connections = max_connections
+        if self.max_connections is None:
+            self.max_connections = 0
+        self.max_send_per_second = max_send_per_second
+        self.idle_timeout = idle_timeout
+        self.connections = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_configuration(cls, name: str, configuration: dict, prefix: str):
+        """
+        :param name: name of the transport.
+        :param configuration: robot configuration.
+        :param prefix: prefix of the configuration keys, example: "socket" or "web_socket".
+        :return: AdmissionControl instance. Without "<prefix>_max_connections" the limit is
+            configurations.SOCKET_MAX_CONNECTIONS or configurations.WEB_SOCKET_MAX_CONNECTIONS.
+        """
+        default_max_connections = {
+            "socket": configurations.SOCKET_MAX_CONNECTIONS,
+            "web_socket": configurations.WEB_SOCKET_MAX_CONNECTIONS
+        }.get(prefix)
+        return cls(name, configuration.get(prefix + "_max_connections", default_max_connections),
+                   configuration.get(prefix + "_max_send_per_second"), configuration.get(prefix + "_idle_timeout"))
+
+    def admit(self, addr) -> str:
+        """
+        Check if a new client can connect. If it is accepted, release() must be called when it disconnects.
+        :param addr: tuple with ip and socket of the client.
+        :return: None if the client is accepted, otherwise the reason of the rejection.
+        """
+        with self._lock:
+            if 0 < self.max_connections <= self.connections:
+                self.rejected += 1
+                reason = "Too many connections. Max connections: {}".format(self.max_connections)
+                logger.warning("[{}]: connection refused to {}. {}".format(self.name, addr, reason))
+                return reason
+            self.connections += 1
+            self.accepted += 1
+            return None
+
+    def release(self, addr, evicted: bool = False):
+        """
+        Call this when an accepted client disconnects.
+        :param addr: tuple with ip and socket of the client.
+        :param evicted: True if the server closed the connection because of this policy.
+        """
+        with self._lock:
+            self.connections -= 1
+            if evicted:
+                self.evicted += 1
+                logger.info("[{}]: evicted {}".format(self.name, addr))
+
+    def is_idle(self, last_activity: float) -> bool:
+        """
+        :param last_activity: time.monotonic() of the last message received from the client.
+        :return: True if the client must be evicted.
+        """
+        return bool(self.idle_timeout) and time.monotonic() - last_activity > self.idle_timeout
+
+    def create_stream(self) -> ClientStream:
+        """
+        :return: ClientStream for a new client, limited to max_send_per_second.
+        """
+        return ClientStream(rate_limit=self.max_send_per_second)
+
+    @staticmethod
+    def get_message(action: str, reason: str) -> bytes:
+        """
+        :param action: "rejected" or "evicted".
+        :param reason: reason for the client.
+        :return: JSON encoding of the R2C message sent before closing the connection.
+        """
+        return json.dumps({
+            "type": "R2C",
+            "data": {
+                "area": "connection",
+                "action": action,
+                "value": {"reason": reason}
+            }}).encode("utf-8")
+
+    def get_stats(self) -> dict:
+        """
+        :return: dict with policy and counters.
+        """
+        return {
+            "max_connections": self.max_connections,
+            "max_send_per_second": self.max_send_per_second,
+            "idle_timeout": self.idle_timeout,
+            "connections": self.connections,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "evicted": self.evicted
+        }
+
+    def __str__(self):
+        return "<AdmissionControl {} {}/{}>".format(self.name, self.connections, self.max_connections)
+
+    def __repr__(self):
+        return self.__str__()
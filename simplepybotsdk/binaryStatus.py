@@ -0,0 +1,87 @@
+import logging
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+# Binary live status format (little endian):
+# - header: magic "SPBS", version (uint8), flags (uint8), seq (uint32), timestamp (float64, unix time),
+#   number of motors (uint16), number of sensors (uint16).
+# - motors goal angles, motors current angles, sensors values: float32 arrays, in the configuration order.
+# - twist linear x, y, z and angular x, y, z: float32, only if FLAG_TWIST is set.
+# On raw TCP sockets every message (binary status or JSON) is prefixed by its length (uint32, little endian).
+MAGIC = b"SPBS"
+VERSION = 1
+FLAG_ABSOLUTE = 0x01
+FLAG_TWIST = 0x02
+HEADER = struct.Struct("<4sBBIdHH")
+FRAME_HEADER = struct.Struct("<I")
+
+
+class BinaryStatusEncoder:
+    """Encoder of the binary live status. Every call packs all the values with a single precompiled struct."""
+
+    def __init__(self, robot):
+        """
+        :param robot: RobotSDK instance.
+        """
+        self._robot = robot
+        self._structs = {}  # (motors, sensors, twist) -> struct.Struct
+        self.seq = 0
+
+    def _get_struct(self, motors: int, sensors: int, twist: bool) -> struct.Struct:
+        key = (motors, sensors, twist)
+        s = self._structs.get(key)
+        if s is None:
+            s = struct.Struct("<4sBBIdHH{}f".format(motors * 2 + sensors + (6 if twist else 0)))
+            self._structs[key] = s
+        return s
+
+    def encode(self, absolute: bool = False, snapshot=None) -> bytes:
+        """
+        :param absolute: angle absolute or relative.
+        :param snapshot: StateSnapshot to encode. Default is the last one of the robot.
+        :return: binary live status.
+        """
+        if snapshot is None:
+            snapshot = self._robot.get_state_snapshot()
+        goals, currents = snapshot.get_angles(absolute)
+        sensors = snapshot.sensors
+        twist = snapshot.twist
+        flags = (FLAG_ABSOLUTE if absolute else 0) | (FLAG_TWIST if twist is not None else 0)
+        values = goals + currents + list(sensors)
+        if twist is not None:
+            values += twist
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        return self._get_struct(len(goals), len(sensors), twist is not None).pack(
+            MAGIC, VERSION, flags, self.seq, time.time(), len(goals), len(sensors), *values)
+
+
+def pack_frame(payload: bytes) -> bytes:
+    """
+    :param payload: binary status or JSON message.
+    :return: payload prefixed by its length, as sent on raw TCP sockets.
+    """
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def decode_binary_status(payload: bytes) -> dict:
+    """
+    Decode a binary live status. Useful for Python clients.
+    :param payload: binary status, without the length prefix.
+    :return: dict with seq, timestamp, format, goal_angles, current_angles, sensors and twist (list or None).
+    """
+    magic, version, flags, seq, timestamp, motors, sensors = HEADER.unpack_from(payload)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a SimplePYBotSDK binary status version {}".format(VERSION))
+    count = motors * 2 + sensors + (6 if flags & FLAG_TWIST else 0)
+    values = struct.unpack_from("<{}f".format(count), payload, HEADER.size)
+    return {
+        "seq": seq,
+        "timestamp": timestamp,
+        "format": "absolute" if flags & FLAG_ABSOLUTE else "relative",
+        "goal_angles": list(values[:motors]),
+        "current_angles": list(values[motors:motors * 2]),
+        "sensors": list(values[motors * 2:motors * 2 + sensors]),
+        "twist": list(values[motors * 2 + sensors:]) if flags & FLAG_TWIST else None
+    }
@@ -0,0 +1,360 @@
+import hashlib
+import json
+import logging
+import marshal
+import os
+
+import simplepybotsdk.configurations as configurations
+from simplepybotsdk.exceptions import RobotSDKInitError
+
+logger = logging.getLogger(__name__)
+
+COMPILED_CONFIGURATION_FORMAT = 1
+STEP_TYPES = ("pose", "performance", "multiple-performance")
+
+
+def _is_number(value) -> bool:
+    return type(value) in (int, float)
+
+
+def validate_configuration(configuration: dict) -> (list, list):
+    """
+    Check a robot configuration and collect all the problems, instead of stopping at the first one.
+    :param configuration: robot configuration.
+    :return: list of errors and list of warnings.
+    """
+    errors = []
+    warnings = []
+    if type(configuration) != dict:
+        return ["configuration must be a JSON object"], warnings
+    for field in ("id", "version", "name"):
+        if field not in configuration:
+            errors.append("'{}' is required".format(field))
+
+    motors_type = configuration.get("motors_type")
+    if motors_type is None:
+        errors.append("no motors_type found")
+        motors_type = {}
+    elif type(motors_type) != dict:
+        errors.append("motors_type must be an object")
+        motors_type = {}
+    for key, t in motors_type.items():
+        if type(t) != dict or not _is_number(t.get("angle_speed")) or t["angle_speed"] <= 0:
+            errors.append("motors_type '{}': angle_speed must be a positive number".format(key))
+
+    motors = configuration.get("motors")
+    if motors is None:
+        errors.append("no motors found")
+        motors = {}
+    elif type(motors) != dict:
+        errors.append("motors must be an object")
+        motors = {}
+    ids = {}
+    for key, m in motors.items():
+        if type(m) != dict:
+            errors.append("motor '{}' must be an object".format(key))
+            continue
+        missing = [f for f in ("id", "offset", "type", "angle_limit", "orientation") if f not in m]
+        if len(missing) > 0:
+            errors.append("motor '{}': missing {}".format(key, ", ".join(missing)))
+        if "type" in m and m["type"] not in motors_type:
+            errors.append("motor '{}' type '{}' not in motors_type".format(key, m["type"]))
+        if "offset" in m and not _is_number(m["offset"]):
+            errors.append("motor '{}': offset must be a number".format(key))
+        if "angle_limit" in m:
+            limit = m["angle_limit"]
+            if type(limit) != list or len(limit) != 2 or not all(_is_number(v) for v in limit):
+                errors.append("motor '{}': angle_limit must be [min, max]".format(key))
+            elif limit[0] > limit[1]:
+                errors.append("motor '{}': angle_limit min is greater than max".format(key))
+        if "orientation" in m and m["orientation"] not in ("direct", "indirect"):
+            errors.append("motor '{}': orientation must be 'direct' or 'indirect'".format(key))
+        if "id" in m:
+            if m["id"] in ids:
+                warnings.append("motor '{}' has the same id of motor '{}'".format(key, ids[m["id"]]))
+            ids[m["id"]] = key
+
+    sensors = configuration.get("sensors", {})
+    if type(sensors) != dict:
+        errors.append("sensors must be an object")
+        sensors = {}
+    for key, s in sensors.items():
+        if type(s) != dict or "id" not in s or not _is_number(s.get("offset")):
+            errors.append("sensor '{}': id and a numeric offset are required".format(key))
+
+    _validate_poses(configuration.get("poses"), motors, "configuration", errors, warnings)
+    return errors, warnings
+
+
+def validate_motion_configuration(motion_configuration: dict, configuration: dict) -> (list, list):
+    """
+    Check a motion configuration (poses and performances) and collect all the problems.
+    References to missing motors, poses and performances are warnings: they fail only when they are used.
+    :param motion_configuration: motion configuration.
+    :param configuration: robot configuration.
+    :return: list of errors and list of warnings.
+    """
+    errors = []
+    warnings = []
+    if type(motion_configuration) != dict:
+        return ["motion configuration must be a JSON object"], warnings
+    motors = configuration.get("motors", {}) if type(configuration.get("motors")) == dict else {}
+    _validate_poses(motion_configuration.get("poses"), motors, "motion", errors, warnings)
+    poses = dict(configuration.get("poses") or {})
+    poses.update(motion_configuration.get("poses") or {})
+    performances = motion_configuration.get("performances", {})
+    if type(performances) != dict:
+        return errors + ["motion: performances must be an object"], warnings
+    for name, p in performances.items():
+        steps = p.get("steps", []) if type(p) == dict else None
+        if type(steps) != list:
+            errors.append("performance '{}': steps must be a list".format(name))
+            continue
+        for i, step in enumerate(steps):
+            if type(step) != dict or step.get("type") not in STEP_TYPES:
+                errors.append("performance '{}' step {}: type must be one of {}".format(name, i, ", ".join(STEP_TYPES)))
+                continue
+            for field in ("seconds", "delay"):
+                if field in step and (not _is_number(step[field]) or step[field] < 0):
+                    errors.append("performance '{}' step {}: {} must be a positive number".format(name, i, field))
+            targets = step.get("to")
+            if step["type"] == "multiple-performance":
+                if type(targets) != list:
+                    errors.append("performance '{}' step {}: 'to' must be a list".format(name, i))
+                    continue
+            else:
+                targets = [targets]
+            known = poses if step["type"] == "pose" else performances
+            for target in targets:
+                if type(target) != str or target not in known:
+                    warnings.append("performance '{}' step {}: {} '{}' not found".format(
+                        name, i, "pose" if step["type"] == "pose" else "performance", target))
+    return errors, warnings
+
+
+def _validate_poses(poses, motors: dict, source: str, errors: list, warnings: list):
+    if poses is None:
+        return
+    if type(poses) != dict:
+        errors.append("{}: poses must be an object".format(source))
+        return
+    for name, pose in poses.items():
+        if type(pose) != dict:
+            errors.append("{}: pose '{}' must be an object".format(source, name))
+            continue
+        for key, angle in pose.items():
+            if not _is_number(angle):
+                errors.append("{}: pose '{}': angle of motor '{}' must be a number".format(source, name, key))
+            elif key not in motors:
+                warnings.append("{}: pose '{}': motor '{}' not found".format(source, name, key))
+
+
+def _hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class CompiledConfiguration:
+    """
+    Validated and precomputed robot configuration: motors and sensors rows, motor type speeds and the motion file.
+    The compiled artifact is cached with marshal, keyed by the content hash of the configuration file,
+    so an unchanged configuration is loaded without parsing or validating the JSON again.
+    If the motion file changes, the configuration is compiled again.
+    """
+
+    def __init__(self, data: dict):
+        """
+        :param data: compiled data, see compile().
+        """
+        self._data = data
+        self.configuration = data["configuration"]
+        self.motion_configuration = data["motion_configuration"]
+        self.motion_path = data["motion_path"]
+        self.motors = data["motors"]  # Tuple of (key, id, offset, orientation, limit min, limit max, type, speed)
+        self.sensors = data["sensors"]  # Tuple of (key, id, offset)
+        self.warnings = data["warnings"]
+        self.source_hash = data["source_hash"]
+        self.from_cache = False
+
+    @classmethod
+    def compile(cls, config_path: str, config_data: bytes = None):
+        """
+        Read, validate and compile a configuration and its motion file.
+        :param config_path: SimplePYBotSDK json configuration file path.
+        :param config_data: content of the configuration file, if already read.
+        :return: CompiledConfiguration.
+        :raise RobotSDKInitError: with the list of all the problems found.
+        """
+        try:
+            if config_data is None:
+                with open(config_path, "rb") as f:
+                    config_data = f.read()
+            configuration = json.loads(config_data.decode("utf-8"))
+        except Exception as e:
+            raise RobotSDKInitError("Initialization configuration error: exception: {}".format(e))
+
+        errors, warnings = validate_configuration(configuration)
+        motion_configuration = None
+        motion_path = None
+        motion_hash = None
+        if type(configuration) == dict and "motion_file" in configuration:
+            motion_path = configuration["motion_file"]
+            try:
+                with open(motion_path, "rb") as f:
+                    motion_data = f.read()
+                motion_hash = _hash(motion_data)
+                motion_configuration = json.loads(motion_data.decode("utf-8"))
+                motion_errors, motion_warnings = validate_motion_configuration(motion_configuration, configuration)
+                errors += motion_errors
+                warnings += motion_warnings
+            except Exception as e:
+                errors.append("motion file '{}': {}".format(motion_path, e))
+        for w in warnings:
+            logger.warning("Configuration {}: {}".format(config_path, w))
+        if len(errors) > 0:
+            for e in errors:
+                logger.error("Configuration {}: {}".format(config_path, e))
+            raise RobotSDKInitError("Configuration error: {} problems found: {}".format(len(errors), "; ".join(errors)))
+
+        motors_type = configuration["motors_type"]
+        return cls({
+            "format": COMPILED_CONFIGURATION_FORMAT,
+            "sdk": configurations.VERSION,
+            "source_hash": _hash(config_data),
+            "motion_hash": motion_hash,
+            "configuration": configuration,
+            "motion_configuration": motion_configuration,
+            "motion_path": motion_path,
+            "motors": tuple((key, m["id"], float(m["offset"]), m["orientation"], float(m["angle_limit"][0]),
+                             float(m["angle_limit"][1]), m["type"], float(motors_type[m["type"]]["angle_speed"]))
+                            for key, m in configuration["motors"].items()),
+            "sensors": tuple((key, s["id"], float(s["offset"])) for key, s in configuration.get("sensors", {}).items()),
+            "warnings": tuple(warnings)
+        })
+
+    @classmethod
+    def load(cls, config_path: str, cache_dir=None):
+        """
+        Load a configuration from the cache if the configuration and motion files are unchanged, otherwise compile it
+        and update the cache.
+        :param config_path: SimplePYBotSDK json configuration file path.
+        :param cache_dir: directory of the compiled configurations. Default is configurations.CONFIGURATION_CACHE_DIR
+            (the cache is disabled if it is None). False to disable the cache.
+        :return: CompiledConfiguration.
+        :raise RobotSDKInitError: with the list of all the problems found.
+        """
+        if cache_dir is None:
+            cache_dir = configurations.CONFIGURATION_CACHE_DIR
+        try:
+            with open(config_path, "rb") as f:
+                config_data = f.read()
+        except Exception as e:
+            raise RobotSDKInitError("Initialization configuration error: exception: {}".format(e))
+        if cache_dir is None or cache_dir is False:
+            return cls.compile(config_path, config_data)
+
+        cache_dir = os.path.expanduser(cache_dir)
+        path_hash = _hash(os.path.abspath(config_path).encode("utf-8"))[:16]
+        cache_path = os.path.join(cache_dir, "{}-{}.spbc".format(path_hash, _hash(config_data)[:32]))
+        compiled = cls._read_cache(cache_path)
+        if compiled is not None:
+            try:
+                os.utime(cache_path)  # Recently used, see _evict_cache()
+            except OSError:
+                pass
+            return compiled
+        compiled = cls.compile(config_path, config_data)
+        compiled._write_cache(cache_dir, cache_path, path_hash)
+        return compiled
+
+    @classmethod
+    def _read_cache(cls, cache_path: str):
+        """
+        :param cache_path: compiled configuration path.
+        :return: CompiledConfiguration, None if not cached or stale.
+        """
+        try:
+            with open(cache_path, "rb") as f:
+                data = marshal.loads(f.read())  # Much faster than marshal.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Compiled configuration {} not readable: {}".format(cache_path, e))
+            return None
+        if data.get("format") != COMPILED_CONFIGURATION_FORMAT or data.get("sdk") != configurations.VERSION:
+            return None
+        if data["motion_path"] is not None:
+            try:
+                with open(data["motion_path"], "rb") as f:
+                    if _hash(f.read()) != data["motion_hash"]:
+                        return None
+            except OSError:
+                return None
+        compiled = cls(data)
+        compiled.from_cache = True
+        for w in compiled.warnings:
+            logger.warning("Configuration: {}".format(w))
+        logger.debug("Compiled configuration loaded from {}".format(cache_path))
+        return compiled
+
+    def _write_cache(self, cache_dir: str, cache_path: str, path_hash: str):
+        """
+        Write the compiled configuration atomically and remove the stale ones of the same configuration file. Then
+        remove the least recently used ones, up to configurations.CONFIGURATION_CACHE_MAX_BYTES.
+        :param cache_dir: directory of the compiled configurations.
+        :param cache_path: compiled configuration path.
+        :param path_hash: prefix of the compiled configurations of the same configuration file.
+        """
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+            with open(tmp_path, "wb") as f:
+                f.write(marshal.dumps(self._data))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, cache_path)
+            for name in os.listdir(cache_dir):
+                stale = os.path.join(cache_dir, name)
+                if name.startswith(path_hash) and name.endswith(".spbc") and stale != cache_path:
+                    os.remove(stale)
+            logger.debug("Compiled configuration saved to {}".format(cache_path))
+            self._evict_cache(cache_dir, cache_path)
+        except Exception as e:
+            logger.warning("Compiled configuration not saved to {}: {}".format(cache_path, e))
+
+    @staticmethod
+    def _evict_cache(cache_dir: str, cache_path: str):
+        """
+        Remove the least recently used compiled configurations when the cache is bigger than
+        configurations.CONFIGURATION_CACHE_MAX_BYTES. Loaded configurations are touched, so the modification time is
+        the last use.
+        :param cache_dir: directory of the compiled configurations.
+        :param cache_path: compiled configuration just written, never removed.
+        """
+        entries = []
+        for name in os.listdir(cache_dir):
+            if not name.endswith(".spbc"):
+                continue
+            path = os.path.join(cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue  # Removed by another process
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort(reverse=True)
+        total = 0
+        for _, size, path in entries:
+            total += size
+            if total > configurations.CONFIGURATION_CACHE_MAX_BYTES and path != cache_path:
+                total -= size
+                try:
+                    os.remove(path)
+                    logger.debug("Compiled configuration {} removed from the cache".format(path))
+                except OSError:
+                    pass
+
+    def __str__(self):
+        return "<CompiledConfiguration {} motors: {}{}>".format(self.configuration["id"], len(self.motors),
+                                                                " (cached)" if self.from_cache else "")
+
+    def __repr__(self):
+        return self.__str__()
@@ -4,5 +4,26 @@ MOTORS_CHECK_PER_SECOND = 20
 MOTORS_POINT_TO_POINT_CHECK_PER_SECOND = 10
 WEB_SOCKET_SEND_PER_SECOND = 10
 SOCKET_SEND_PER_SECOND = 20
+WEB_SOCKET_CLIENT_QUEUE_SIZE = 4  # Status frames waiting for a websocket client. When full the oldest is dropped
+WEB_SOCKET_CLIENT_MAX_PENDING_FRAMES = 2  # Frames handed to the websocket send buffer of a client at the same time
 SOCKET_INCOMING_LIMIT = 5
-SLEEP_AVOID_CPU_WASTE = 0.80
+SOCKET_MAX_CONNECTIONS = 0  # Socket clients connected at the same time. 0 for no limit
+WEB_SOCKET_MAX_CONNECTIONS = 5  # Websocket clients connected at the same time. 0 for no limit
+SOCKET_MODE = "thread"  # "thread" (one thread per client) or "asyncio" (one event loop for all the clients)
+SOCKET_MAX_BUFFERED_BYTES = 256 * 1024  # asyncio mode: clients with more bytes waiting to be sent are dropped
+STATUS_DELTA_KEYFRAME_INTERVAL = 100
+MOTORS_STORE_BACKEND = "array"  # "array" or "numpy"
+MOTION_PROFILE = "linear"  # Point to point interpolation: "linear", "cubic", "minimum_jerk" or "trapezoidal"
+TRAJECTORY_CACHE_SIZE = 256  # Compiled point to point movements and performances kept in memory
+POINT_TO_POINT_RECORDING_LIMIT = 10000  # Movements kept by an in memory recording. When full the oldest is dropped
+RECORDER_FSYNC_INTERVAL = 1.0  # Seconds between two fsync of a recording file
+RECORDER_MAX_BYTES = 64 * 1024 * 1024  # Recording files are rotated when bigger
+TELEMETRY_SECONDS = 10  # Seconds of robot state history kept by the telemetry ring buffer. 0 to disable
+STATE_EXPORT_PATH = None  # Memory mapped file with the live robot state for local readers. None to disable
+METRICS_HISTOGRAM_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+CONFIGURATION_CACHE_DIR = None  # Compiled configurations directory, example: "~/.cache/simplepybotsdk". None to disable
+CONFIGURATION_CACHE_MAX_BYTES = 32 * 1024 * 1024  # Least recently used compiled configurations are removed when bigger
+POSE_STORE_COMPACT_RECORDS = 1000  # Pose changes in the journal that trigger a rewrite of the motion file
+POSE_STORE_COMPACT_INTERVAL = 5.0  # Seconds without pose changes after which the journal is compacted
+FLEET_WORKERS = 0  # RobotFleet worker processes that step the motors in shared memory. 0 to step them in the fleet
+FLEET_WORKERS_START_METHOD = "spawn"  # multiprocessing start method of the RobotFleet workers
@@ -0,0 +1,181 @@
+"""
+Worker process of a RobotFleet: it steps groups of motors (shards) whose MotorsStore lives in shared memory.
+Only the motors state is shared: transports, motions and configuration stay in the fleet process, which reads the
+motors without copies or round trips.
+
+A shard is a range of rows of a robot MotorsStore. Every robot has a control block, a shared memory array of doubles:
+- CONTROL_ROBOT_SPEED, CONTROL_PER_SECOND: written by the fleet on every motors tick of the robot.
+- from CONTROL_HEADER, SHARD_STATS doubles for every shard: ticker stats written by the worker.
+"""
+import heapq
+import itertools
+import logging
+import time
+import traceback
+from array import array
+
+from simplepybotsdk.motorsStore import MotorsStore, load_shared_memory
+from simplepybotsdk.ticker import Ticker
+
+logger = logging.getLogger(__name__)
+
+CONTROL_ROBOT_SPEED = 0
+CONTROL_PER_SECOND = 1
+CONTROL_HEADER = 2
+SHARD_STATS = ("ticks", "overruns", "skipped_ticks", "jitter_total", "jitter_max")
+
+
+def get_control_size(shards: int) -> int:
+    """
+    :param shards: number of shards of the robot.
+    :return: number of doubles of the control block.
+    """
+    return CONTROL_HEADER + shards * len(SHARD_STATS)
+
+
+def get_shard_stats(control, shard: int) -> dict:
+    """
+    :param control: control block of the robot.
+    :param shard: shard index in the robot.
+    :return: ticker stats of the shard, like Ticker.get_stats().
+    """
+    ticks, overruns, skipped_ticks, jitter_total, jitter_max = control[
+        CONTROL_HEADER + shard * len(SHARD_STATS):CONTROL_HEADER + (shard + 1) * len(SHARD_STATS)]
+    return {
+        "per_second": round(control[CONTROL_PER_SECOND] * control[CONTROL_ROBOT_SPEED], 2),
+        "ticks": int(ticks),
+        "overruns": int(overruns),
+        "skipped_ticks": int(skipped_ticks),
+        "jitter_mean_ms": round(jitter_total / ticks * 1000, 3) if ticks > 0 else 0.0,
+        "jitter_max_ms": round(jitter_max * 1000, 3)
+    }
+
+
+class FleetWorker:
+    """
+    Loop of a worker process. Commands are received from the fleet on a multiprocessing Connection:
+    - ("add", shard_id, spec): start stepping the rows spec["start"]:spec["end"] of the store spec["store"], see
+      RobotFleet._add_shards().
+    - ("remove", shard_id): stop stepping a shard.
+    - ("stop",): end the process.
+    """
+
+    def __init__(self, connection, name: str):
+        """
+        :param connection: multiprocessing Connection with the fleet.
+        :param name: name of the worker. Used in logs.
+        """
+        self.connection = connection
+        self.name = name
+        self._shared_memory = load_shared_memory()
+        self._shards = {}  # shard id -> (store, start, end, control, stats offset, ticker)
+        self._controls = {}  # control block name -> [SharedMemory, view, shards using it]
+        self._schedule = []  # Heap of (deadline, sequence, shard id)
+        self._sequence = itertools.count()
+
+    def run(self):
+        logger.debug("[{}]: started".format(self.name))
+        while True:
+            delay = max(0.0, self._schedule[0][0] - time.monotonic()) if len(self._schedule) > 0 else None
+            if self.connection.poll(delay):
+                try:
+                    command = self.connection.recv()
+                except EOFError:
+                    command = ("stop",)  # Fleet process ended
+                if command[0] == "stop":
+                    break
+                self._handle_command(command)
+                continue
+            _, _, shard_id = heapq.heappop(self._schedule)
+            shard = self._shards.get(shard_id)
+            if shard is None:
+                continue  # Removed
+            store, start, end, control, offset, ticker = shard
+            ticker.tick()
+            try:
+                store.step(start, end)
+            except Exception as e:
+                logger.error(traceback.format_exc())
+                logger.error("[{}]: shard {} exception: {}".format(self.name, shard_id, e))
+            control[offset:offset + len(SHARD_STATS)] = self._pack_stats(ticker)
+            heapq.heappush(self._schedule, (time.monotonic() + ticker.next_delay(), next(self._sequence), shard_id))
+        for shard_id in list(self._shards):
+            self._remove_shard(shard_id)
+        logger.debug("[{}]: stopped".format(self.name))
+
+    @staticmethod
+    def _pack_stats(ticker: Ticker):
+        return array("d", (ticker.ticks, ticker.overruns, ticker.skipped_ticks, ticker._jitter_total,
+                           ticker.jitter_max))
+
+    def _handle_command(self, command: tuple):
+        try:
+            if command[0] == "add":
+                self._add_shard(command[1], command[2])
+            elif command[0] == "remove":
+                self._remove_shard(command[1])
+            else:
+                logger.warning("[{}]: unknown command {}".format(self.name, command[0]))
+        except FileNotFoundError:
+            logger.debug("[{}]: shard {} already removed by the fleet".format(self.name, command[1]))
+        except Exception as e:
+            logger.error(traceback.format_exc())
+            logger.error("[{}]: command {} exception: {}".format(self.name, command[0], e))
+
+    def _add_shard(self, shard_id, spec: dict):
+        control = self._attach_control(spec["control"], spec["shards"])
+        try:
+            store = MotorsStore.attach_shared(spec["store"], spec["capacity"], spec["size"], spec["backend"])
+        except BaseException:
+            self._detach_control(spec["control"])
+            raise
+        view = control[1]
+        ticker = Ticker("{}_{}".format(self.name, shard_id), lambda: view[CONTROL_PER_SECOND],
+                        lambda: view[CONTROL_ROBOT_SPEED])
+        offset = CONTROL_HEADER + spec["shard"] * len(SHARD_STATS)
+        self._shards[shard_id] = (store, spec["start"], spec["end"], view, offset, ticker)
+        heapq.heappush(self._schedule, (time.monotonic(), next(self._sequence), shard_id))
+        logger.debug("[{}]: shard {} added, rows {}:{}".format(self.name, shard_id, spec["start"], spec["end"]))
+
+    def _remove_shard(self, shard_id):
+        shard = self._shards.pop(shard_id, None)
+        if shard is None:
+            return
+        shard[0].close()
+        for name, control in list(self._controls.items()):
+            if control[1] is shard[3]:
+                self._detach_control(name)
+        logger.debug("[{}]: shard {} removed".format(self.name, shard_id))
+
+    def _attach_control(self, name: str, shards: int) -> list:
+        control = self._controls.get(name)
+        if control is None:
+            try:
+                block = self._shared_memory.SharedMemory(name=name, track=False)
+            except TypeError:
+                block = self._shared_memory.SharedMemory(name=name)
+            control = [block, block.buf[:get_control_size(shards) * 8].cast("d"), 0]
+            self._controls[name] = control
+        control[2] += 1
+        return control
+
+    def _detach_control(self, name: str):
+        control = self._controls[name]
+        control[2] -= 1
+        if control[2] > 0:
+            return
+        del self._controls[name]
+        control[1].release()
+        control[0].close()
+
+
+def fleet_worker_main(connection, name: str):
+    """
+    Entry point of a worker process.
+    :param connection: multiprocessing Connection with the fleet.
+    :param name: name of the worker.
+    """
+    try:
+        FleetWorker(connection, name).run()
+    except KeyboardInterrupt:
+        pass
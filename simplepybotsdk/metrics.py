@@ -0,0 +1,189 @@
+import logging
+import threading
+from bisect import bisect_left
+
+import simplepybotsdk.configurations as configurations
+
+logger = logging.getLogger(__name__)
+
+METRICS_PREFIX = "simplepybotsdk_"
+
+
+class Counter:
+    """
+    Monotonic counter, example: bytes sent.
+    """
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        """
+        :param amount: value to add.
+        """
+        with self._lock:
+            self.value += amount
+
+    def get_dict(self) -> dict:
+        return {"value": self.value}
+
+
+class Histogram:
+    """
+    Distribution of observed values (durations in seconds) in fixed buckets, like a Prometheus histogram.
+    observe() does not allocate: the bucket is found with a binary search and its count incremented.
+    """
+
+    def __init__(self, buckets: tuple = None):
+        """
+        :param buckets: upper bounds of the buckets. Default is configurations.METRICS_HISTOGRAM_BUCKETS.
+        """
+        self.buckets = tuple(sorted(buckets if buckets is not None else configurations.METRICS_HISTOGRAM_BUCKETS))
+        self.counts = [0] * (len(self.buckets) + 1)  # Last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """
+        :param value: value to add, in seconds for durations.
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def get_dict(self) -> dict:
+        """
+        :return: dict with count, sum, mean, max and cumulative counts by bucket upper bound.
+        """
+        cumulative = []
+        total = 0
+        for upper, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            cumulative.append((upper, total))
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count > 0 else 0.0,
+            "max": self.max,
+            "buckets": cumulative
+        }
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms of the SDK hot paths, published in Prometheus text format by get_prometheus().
+    Metrics are identified by name and labels, and created on first use. Keep the returned object in the loop
+    to avoid the lookup. Collectors add values computed at export time, like loop stats of the tickers.
+    """
+
+    def __init__(self):
+        self._families = {}  # name -> (type, help, {labels tuple: metric})
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get(self, metric_type: str, factory, name: str, help_text: str, labels: dict):
+        key = tuple(sorted(labels.items()))
+        family = self._families.get(name)
+        if family is not None:
+            metric = family[2].get(key)
+            if metric is not None:
+                return metric
+        with self._lock:
+            family = self._families.setdefault(name, (metric_type, help_text, {}))
+            if family[0] != metric_type:
+                raise ValueError("Metric '{}' is a {}, not a {}".format(name, family[0], metric_type))
+            return family[2].setdefault(key, factory())
+
+    def counter(self, name: str, help_text: str = "", **labels) -> Counter:
+        """
+        :param name: metric name, without prefix. Counters end with _total.
+        :param help_text: description of the metric.
+        :param labels: labels of the metric, example: transport="socket".
+        :return: the Counter.
+        """
+        return self._get("counter", Counter, name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str = "", buckets: tuple = None, **labels) -> Histogram:
+        """
+        :param name: metric name, without prefix. Durations end with _seconds.
+        :param help_text: description of the metric.
+        :param buckets: upper bounds of the buckets, used only when the histogram is created.
+        :param labels: labels of the metric, example: transport="socket".
+        :return: the Histogram.
+        """
+        return self._get("histogram", lambda: Histogram(buckets), name, help_text, labels)
+
+    def add_collector(self, collector):
+        """
+        :param collector: callable that returns a list of (name, type, help, labels dict, value).
+            Type is "counter" or "gauge".
+        """
+        self._collectors.append(collector)
+
+    def _collect(self) -> list:
+        samples = []
+        for collector in self._collectors:
+            try:
+                samples.extend(collector())
+            except Exception as e:
+                logger.error("Metrics: collector {} failed: {}".format(collector, e))
+        return samples
+
+    def get_dict(self) -> dict:
+        """
+        :return: dict of {name: [{"labels": labels, ...metric values}]}.
+        """
+        metrics = {}
+        for name, (_, _, children) in sorted(list(self._families.items())):
+            metrics[name] = [dict(metric.get_dict(), labels=dict(key)) for key, metric in list(children.items())]
+        for name, _, _, labels, value in self._collect():
+            metrics.setdefault(name, []).append({"labels": labels, "value": value})
+        return metrics
+
+    def get_prometheus(self) -> str:
+        """
+        :return: all the metrics in Prometheus text exposition format.
+        """
+        lines = []
+        for name, (metric_type, help_text, children) in sorted(list(self._families.items())):
+            name = METRICS_PREFIX + name
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, metric_type))
+            for key, metric in list(children.items()):
+                if metric_type == "counter":
+                    lines.append("{}{} {}".format(name, _format_labels(key), metric.value))
+                    continue
+                values = metric.get_dict()
+                for upper, count in values["buckets"]:
+                    lines.append("{}_bucket{} {}".format(name, _format_labels(key + (("le", str(upper)),)), count))
+                lines.append("{}_sum{} {}".format(name, _format_labels(key), values["sum"]))
+                lines.append("{}_count{} {}".format(name, _format_labels(key), values["count"]))
+        collected = {}  # Samples of the same metric must be grouped
+        for name, metric_type, help_text, labels, value in self._collect():
+            collected.setdefault(name, (metric_type, help_text, []))[2].append((labels, value))
+        for name, (metric_type, help_text, samples) in collected.items():
+            name = METRICS_PREFIX + name
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, metric_type))
+            for labels, value in samples:
+                lines.append("{}{} {}".format(name, _format_labels(tuple(sorted(labels.items()))), value))
+        return "\n".join(lines) + "\n"
+
+    def __str__(self):
+        return "<MetricsRegistry {} metrics>".format(len(self._families))
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def _format_labels(key: tuple) -> str:
+    if len(key) == 0:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in key) + "}"
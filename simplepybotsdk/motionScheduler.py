@@ -0,0 +1,314 @@
+import logging
+import threading
+import time
+import traceback
+from collections import deque
+
+from simplepybotsdk.trajectoryCompiler import Trajectory
+
+logger = logging.getLogger(__name__)
+
+
+class MotionHandle:
+    """Handle of a point to point movement or performance submitted to the MotionScheduler."""
+
+    def __init__(self, trajectory: Trajectory):
+        """
+        :param trajectory: compiled movement to play. Every scheduler tick streams one row into the motors.
+        """
+        self.trajectory = trajectory
+        self.columns = list(enumerate(trajectory.motors))  # (column, motor) still controlled by this movement
+        self.number_of_steps = trajectory.number_of_steps
+        self.step = 0
+        self.cancelled = False
+        self.superseded = False  # True if newer movements took all the motors of this movement
+        self._done = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        """
+        :return: True if the movement is completed, cancelled or superseded.
+        """
+        return self._done.is_set()
+
+    def cancel(self):
+        """
+        Stop the movement. Motors keep the last goal angle reached.
+        """
+        self.cancelled = True
+        self._done.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Wait until the movement is done.
+        :param timeout: max seconds to wait. None to wait forever.
+        :return: True if the movement is done, False on timeout.
+        """
+        return self._done.wait(timeout)
+
+    def _play(self) -> bool:
+        """
+        Called by the scheduler on every tick: write the next row into the motors.
+        :return: True if the movement is not completed.
+        """
+        self._write_rows(self.step, self.step - 1)
+        self.step += 1
+        return self.step < self.number_of_steps
+
+    def _write_rows(self, row: int, previous_row: int):
+        """
+        Write the goal angles of a row into the motors store. If rows were skipped (previous_row < row - 1),
+        every motor gets its last sample after previous_row, so goals reached in skipped rows are not lost.
+        :param row: row to write.
+        :param previous_row: last row already written, -1 if none.
+        """
+        samples = self.trajectory.samples
+        n = len(self.trajectory.motors)
+        columns = self.columns
+        if len(columns) == 0:
+            return
+        with columns[0][1]._store.lock:  # The row is a single update for the readers
+            for column, m in columns:
+                r = row
+                angle = samples[r * n + column]
+                while angle != angle and r > previous_row + 1:  # NaN: motor not controlled on this row
+                    r -= 1
+                    angle = samples[r * n + column]
+                if angle == angle:
+                    m._store.goal[m._index] = angle
+                    if m.instant_mode:
+                        m._store.current[m._index] = angle
+
+    def _release(self, motor):
+        """
+        Remove a motor from this movement because a newer movement is controlling it.
+        :param motor: the motor to release.
+        """
+        self.columns = [c for c in self.columns if c[1] is not motor]
+        if len(self.columns) == 0:
+            self.superseded = True
+            self._done.set()
+
+    def __str__(self):
+        return "<MotionHandle step {}/{} motors: {}>".format(self.step, self.number_of_steps,
+                                                            [m.key for _, m in self.columns])
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class PlaybackHandle(MotionHandle):
+    """
+    Handle of a performance or recording playback. The row to play is computed from time.monotonic() on every tick,
+    so the timeline does not drift when ticks are late or skipped. Supports pause, seek, loop and speed changes.
+    """
+
+    def __init__(self, trajectory: Trajectory, name: str, robot_speed=None, loop: bool = False, speed: float = 1.0):
+        """
+        :param trajectory: compiled performance or recording.
+        :param name: name of the playback. Used in the status.
+        :param robot_speed: callable that returns the robot speed. Example: lambda: robot.robot_speed.
+        :param loop: if True restart from the beginning when the end is reached.
+        :param speed: playback speed, multiplied by the robot speed.
+        """
+        super().__init__(trajectory)
+        self.name = name
+        self.loop = loop
+        self.speed = speed
+        self.loops = 0
+        self._robot_speed = robot_speed
+        self._position = 0.0  # Seconds of the timeline already played
+        self._last_time = None
+        self._last_row = -1
+        self._paused = False
+        self._lock = threading.Lock()
+
+    @property
+    def duration(self) -> float:
+        """
+        :return: duration of the timeline in seconds, at speed 1.
+        """
+        return self.trajectory.duration
+
+    @property
+    def position(self) -> float:
+        """
+        :return: current position in the timeline, in seconds.
+        """
+        return self._position
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    def pause(self):
+        """
+        Pause the playback. Motors keep the last goal angle reached.
+        """
+        with self._lock:
+            self._paused = True
+            self._last_time = None
+
+    def resume(self):
+        """
+        Resume a paused playback.
+        """
+        with self._lock:
+            self._paused = False
+
+    def seek(self, seconds: float):
+        """
+        Move the playback to a position of the timeline. Motors jump to the goal angles of that position.
+        :param seconds: new position in seconds, from 0 to duration.
+        """
+        with self._lock:
+            self._position = min(max(0.0, seconds), self.duration)
+            self._last_row = -1  # Write the last sample of every motor up to the new position
+
+    def _play(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self._paused:
+                return True
+            if self._last_time is not None:
+                speed = self.speed * (self._robot_speed() if self._robot_speed is not None else 1)
+                self._position += (now - self._last_time) * speed
+            self._last_time = now
+            while self.loop and self._position >= self.duration > 0:
+                self._write_rows(self.number_of_steps - 1, self._last_row)  # Complete the previous loop
+                self._position -= self.duration
+                self._last_row = -1
+                self.loops += 1
+            row = min(int(self._position * self.trajectory.rate), self.number_of_steps - 1)
+            self._write_rows(row, self._last_row)
+            self._last_row = row
+            self.step = row + 1
+            return self.loop or self.step < self.number_of_steps
+
+    def get_status(self) -> dict:
+        """
+        :return: dict with name, position, duration and state of the playback.
+        """
+        return {
+            "name": self.name,
+            "position": round(self._position, 3),
+            "duration": round(self.duration, 3),
+            "speed": self.speed,
+            "loop": self.loop,
+            "loops": self.loops,
+            "paused": self._paused,
+            "done": self.done,
+            "cancelled": self.cancelled,
+            "superseded": self.superseded
+        }
+
+    def __str__(self):
+        return "<PlaybackHandle {} {:.2f}/{:.2f}s>".format(self.name, self._position, self.duration)
+
+
+class MotionScheduler:
+    """
+    Single thread that advances all the active point to point movements of a robot on the same tick.
+    When two movements want to control the same motor, the newest movement wins.
+    """
+
+    def __init__(self, robot, wake_up=None):
+        """
+        :param robot: RobotSDK instance. Used to read point to point check per second and robot_speed.
+        :param wake_up: callable called when a movement is submitted, for schedulers ticked by a RobotFleet.
+            None to tick the scheduler with its own thread.
+        """
+        self._robot = robot
+        self._external_wake_up = wake_up
+        self._pending = deque()  # Movements submitted but not yet seen by the scheduler thread
+        self._active = []
+        self._owners = {}  # Motor -> MotionHandle that is currently controlling it
+        self._wake_up = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def submit(self, handle: MotionHandle) -> MotionHandle:
+        """
+        Add a movement to the scheduler queue. O(1), the movement will start on the next tick.
+        :param handle: the movement to execute.
+        :return: the same handle, to cancel or wait the movement.
+        """
+        self._pending.append(handle)
+        if self._external_wake_up is not None:
+            self._external_wake_up()
+            return handle
+        self._wake_up.set()
+        if self._thread is None:
+            with self._thread_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(name="motion_scheduler_thread", target=self._thread_handler,
+                                                    args=())
+                    self._thread.daemon = True
+                    self._thread.start()
+        return handle
+
+    def get_active_movements(self) -> list:
+        """
+        :return: list of MotionHandle not yet completed.
+        """
+        return [h for h in self._active if not h.done] + [h for h in list(self._pending) if not h.done]
+
+    @property
+    def idle(self) -> bool:
+        """
+        :return: True if there are no movements to advance.
+        """
+        return len(self._active) == 0 and len(self._pending) == 0
+
+    def _thread_handler(self):
+        """
+        Dedicated thread that advances all the active movements. Sleeps while there is nothing to move.
+        """
+        logger.debug("[motion_scheduler_thread]: started")
+        ticker = self._robot.create_ticker("motion_scheduler_thread",
+                                           lambda: self._robot._motors_point_to_point_check_per_second,
+                                           lambda: self._robot.robot_speed)
+        while True:
+            if self.idle:
+                self._wake_up.wait()
+                self._wake_up.clear()
+                ticker.reset()
+                continue
+            ticker.sleep()
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(traceback.format_exc())
+                logger.error("[motion_scheduler_thread]: exception: {}".format(e))
+
+    def tick(self):
+        """
+        Advance all the active movements by one step.
+        """
+        while len(self._pending) > 0:
+            handle = self._pending.popleft()
+            if handle.done:
+                continue
+            for _, m in list(handle.columns):
+                previous = self._owners.get(m)
+                if previous is not None and previous is not handle:
+                    previous._release(m)
+                self._owners[m] = handle
+            self._active.append(handle)
+
+        still_active = []
+        for handle in self._active:
+            if not handle.done:
+                try:
+                    if handle._play():
+                        still_active.append(handle)
+                        continue
+                    handle._done.set()
+                except Exception as e:  # Drop only the failing movement, the others keep playing
+                    logger.error(traceback.format_exc())
+                    logger.error("[motion_scheduler_thread]: {} cancelled, exception: {}".format(handle, e))
+                    handle.cancel()
+            for _, m in handle.columns:
+                if self._owners.get(m) is handle:
+                    del self._owners[m]
+        self._active = still_active
@@ -1,11 +1,17 @@
 import logging
 from time import sleep
 
+from simplepybotsdk.motorsStore import MotorsStore
+
 logger = logging.getLogger(__name__)
 
 
 class Motor:
-    """Base Motor class."""
+    """
+    Base Motor class.
+    Angles, offset, orientation and limits are stored in a MotorsStore row: a standalone motor owns a single row store,
+    a robot moves the row of its motors in its own store (see RobotSDK.add_motor()).
+    """
 
     def __init__(self, identifier: str, key: str, offset: int, angle_limit: tuple, orientation: str, motor_type: str,
                  instant_mode: bool = False):
@@ -21,17 +27,64 @@ class Motor:
         """
         self.id = identifier
         self.key = key
-        self.offset = offset
-        self.angle_limit = angle_limit
-        self.orientation = 1 if orientation == "indirect" else 0
+        self._store = MotorsStore("array")
+        self._index = self._store.add(offset, -1 if orientation == "indirect" else 1, angle_limit[0], angle_limit[1])
+        self._angle_limit = angle_limit
         self.motor_type = motor_type
-        self.abs_goal_angle = 0.0
-        self.abs_current_angle = 0.0
         logger.debug("{}: initialization".format(self.key))
         self.instant_mode = True
         self.set_goal_angle(0)
         self.instant_mode = instant_mode
 
+    @property
+    def abs_goal_angle(self) -> float:
+        return float(self._store.goal[self._index])
+
+    @abs_goal_angle.setter
+    def abs_goal_angle(self, value: float):
+        self._store.goal[self._index] = value
+        self._store.changes += 1
+
+    @property
+    def abs_current_angle(self) -> float:
+        return float(self._store.current[self._index])
+
+    @abs_current_angle.setter
+    def abs_current_angle(self, value: float):
+        self._store.current[self._index] = value
+        self._store.changes += 1
+
+    @property
+    def offset(self) -> float:
+        return float(self._store.offset[self._index])
+
+    @offset.setter
+    def offset(self, value: float):
+        self._store.offset[self._index] = value
+        self._store.changes += 1
+
+    @property
+    def orientation(self) -> int:
+        """
+        :return: 0 if direct, 1 if indirect.
+        """
+        return 1 if self._store.sign[self._index] < 0 else 0
+
+    @orientation.setter
+    def orientation(self, value):
+        self._store.sign[self._index] = -1 if value in (1, "indirect") else 1
+        self._store.changes += 1
+
+    @property
+    def angle_limit(self):
+        return self._angle_limit
+
+    @angle_limit.setter
+    def angle_limit(self, value):
+        self._angle_limit = value
+        self._store.limit_min[self._index] = value[0]
+        self._store.limit_max[self._index] = value[1]
+
     def get_current_angle(self) -> float:
         """
         :return: relative current angle position of the motor.
@@ -52,7 +105,8 @@ class Motor:
         if self.angle_limit[0] <= angle <= self.angle_limit[1]:
             future_angle = angle + self.offset
             self.abs_goal_angle = future_angle if self.orientation == 0 else -future_angle
-            logger.debug("{}: set_goal_angle: {:.2f} [{:.2f}]".format(self.key, angle, self.abs_goal_angle))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("{}: set_goal_angle: {:.2f} [{:.2f}]".format(self.key, angle, self.abs_goal_angle))
 
         elif self.angle_limit[0] > angle:
             future_angle = self.angle_limit[0] + self.offset
@@ -100,7 +154,8 @@ class Motor:
             return angle + self.offset
 
     def __iter__(self):
-        for key in self.__dict__:
+        for key in ("id", "key", "offset", "angle_limit", "orientation", "motor_type", "abs_goal_angle",
+                    "abs_current_angle", "instant_mode"):
             yield key, getattr(self, key)
         yield "goal_angle", self.to_relative_angle(self.abs_goal_angle)
         yield "current_angle", self.to_relative_angle(self.abs_current_angle)
@@ -0,0 +1,349 @@
+import atexit
+import logging
+import threading
+from array import array
+
+import simplepybotsdk.configurations as configurations
+from simplepybotsdk.exceptions import RobotSDKInitError
+
+logger = logging.getLogger(__name__)
+
+numpy = None  # numpy backend is optional: numpy is imported only when it is used, see load_numpy()
+
+
+def load_numpy():
+    """
+    Import numpy on first use, so robots with the array backend do not pay its import time and memory.
+    :return: numpy module, or None if numpy is not installed.
+    """
+    global numpy
+    if numpy is None:
+        try:
+            import numpy as module
+        except ImportError:
+            return None
+        numpy = module
+    return numpy
+
+
+def load_shared_memory():
+    """
+    :return: multiprocessing.shared_memory module.
+    """
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        raise RobotSDKInitError("MotorsStore: shared memory requires Python 3.8 or newer")
+    return shared_memory
+
+
+class MotorsStore:
+    """
+    Struct of arrays with the state of many motors.
+    Every motor is a row: goal and current absolute angles, offset, orientation sign, angle limits and the max step
+    for every motors thread iteration. Motor objects are views over one row of a store.
+    The "array" backend uses only the standard library, the "numpy" backend runs step() and the angles conversion
+    as vectorized operations.
+    A store can live in shared memory (see create_shared() and attach_shared()), so other processes can step the
+    motors or read their state without copies. Shared stores have a fixed capacity.
+    Batch writes (step(), set_goals()) hold the lock, so readers of many rows (copy_columns()) see whole updates.
+    Worker processes of a shared store do not share the lock.
+    """
+
+    FIELDS = ("goal", "current", "offset", "sign", "limit_min", "limit_max", "max_step")
+
+    def __init__(self, backend: str = None):
+        """
+        :param backend: "array" or "numpy". Default is configurations.MOTORS_STORE_BACKEND.
+        """
+        if backend is None:
+            backend = configurations.MOTORS_STORE_BACKEND
+        if backend not in ("array", "numpy"):
+            raise RobotSDKInitError("MotorsStore: unknown backend '{}'. Use 'array' or 'numpy'".format(backend))
+        if backend == "numpy" and load_numpy() is None:
+            raise RobotSDKInitError("MotorsStore: numpy backend requested but numpy is not installed")
+        self.backend = backend
+        self.size = 0
+        self._capacity = 0
+        self.lock = threading.Lock()  # Held by batch writes and by readers of many rows
+        self.changes = 0  # Writes outside step() (goals, sensors of the robot), see RobotSDK.get_state_snapshot()
+        self.shared_memory = None  # SharedMemory of a shared store
+        self._shared_fields = None  # Field name -> view of all the rows of a shared store
+        self._unlinked = False
+        for field in self.FIELDS:
+            setattr(self, field, array("d") if backend == "array" else numpy.zeros(0))
+
+    @classmethod
+    def create_shared(cls, capacity: int, backend: str = None):
+        """
+        :param capacity: max number of motors.
+        :param backend: "array" or "numpy". Default is configurations.MOTORS_STORE_BACKEND.
+        :return: empty MotorsStore in a new shared memory block. The creator must call unlink() when done.
+        """
+        shared_memory = load_shared_memory()
+        store = cls(backend)
+        store._map_shared(shared_memory.SharedMemory(create=True, size=max(1, capacity * 8 * len(cls.FIELDS))),
+                          capacity, 0)
+        return store
+
+    @classmethod
+    def attach_shared(cls, name: str, capacity: int, size: int, backend: str = None):
+        """
+        :param name: name of the shared memory block, see shared_memory.name.
+        :param capacity: capacity of the store.
+        :param size: number of motors in the store.
+        :param backend: "array" or "numpy". Default is configurations.MOTORS_STORE_BACKEND.
+        :return: MotorsStore over the rows of a store created by create_shared() in another process.
+        """
+        shared_memory = load_shared_memory()
+        try:
+            block = shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+: the creator owns the block
+        except TypeError:
+            # Child processes share the resource tracker of the creator: registering the block again is a no-op
+            block = shared_memory.SharedMemory(name=name)
+        store = cls(backend)
+        store._map_shared(block, capacity, size)
+        return store
+
+    def _map_shared(self, block, capacity: int, size: int):
+        """
+        Use a shared memory block for the fields: one column of capacity doubles for every field.
+        :param block: SharedMemory.
+        :param capacity: max number of motors.
+        :param size: number of motors already in the block.
+        """
+        self.shared_memory = block
+        self._capacity = capacity
+        self.size = size
+        self._shared_fields = {}
+        for column, field in enumerate(self.FIELDS):
+            start = column * capacity * 8
+            if self.backend == "numpy":
+                view = numpy.ndarray((capacity,), dtype=numpy.float64, buffer=block.buf, offset=start)
+            else:
+                view = block.buf[start:start + capacity * 8].cast("d")
+            self._shared_fields[field] = view
+        self._slice_shared_fields()
+        atexit.register(self.close)  # Views must be released before the block is garbage collected
+
+    def _slice_shared_fields(self):
+        """The array backend works on fields of exactly size rows, like array("d")."""
+        for field, view in self._shared_fields.items():
+            setattr(self, field, view if self.backend == "numpy" else view[:self.size])
+
+    def close(self):
+        """
+        Release the shared memory of a shared store. The store can not be used anymore.
+        """
+        if self.shared_memory is None:
+            return
+        for field in self.FIELDS:
+            setattr(self, field, None)
+        for view in self._shared_fields.values():
+            if self.backend == "array":
+                view.release()
+        self._shared_fields = None
+        atexit.unregister(self.close)
+        try:
+            self.shared_memory.close()
+        except BufferError as e:  # Views still used by numpy arrays of other objects
+            logger.debug("MotorsStore: shared memory {} not closed: {}".format(self.shared_memory.name, e))
+
+    def unlink(self):
+        """
+        Destroy the name of the shared memory block, so it is freed when every process has closed it. Views already
+        mapped are still valid. Only the process that created the block should call this.
+        """
+        if self.shared_memory is None or self._unlinked:
+            return
+        self._unlinked = True
+        self.shared_memory.unlink()
+
+    def add(self, offset: float, sign: float, limit_min: float, limit_max: float, max_step: float = 0.0,
+            goal: float = 0.0, current: float = 0.0) -> int:
+        """
+        Add a motor row.
+        :param offset: motor offset.
+        :param sign: 1 for direct motors, -1 for indirect motors.
+        :param limit_min: min relative angle.
+        :param limit_max: max relative angle.
+        :param max_step: max absolute angle change for every step() call.
+        :param goal: absolute goal angle.
+        :param current: absolute current angle.
+        :return: index of the new row.
+        """
+        values = (goal, current, offset, sign, limit_min, limit_max, max_step)
+        index = self.size
+        if self.shared_memory is not None:
+            if index >= self._capacity:
+                raise RobotSDKInitError("MotorsStore: shared store is full ({} motors)".format(self._capacity))
+            for field, value in zip(self.FIELDS, values):
+                self._shared_fields[field][index] = value
+            self.size = index + 1
+            self._slice_shared_fields()
+            return index
+        if self.backend == "array":
+            for field, value in zip(self.FIELDS, values):
+                getattr(self, field).append(value)
+        else:
+            if index >= self._capacity:  # Grow by doubling, so adding motors is amortized O(1)
+                self._capacity = max(8, self._capacity * 2)
+                for field in self.FIELDS:
+                    grown = numpy.zeros(self._capacity)
+                    grown[:index] = getattr(self, field)[:index]
+                    setattr(self, field, grown)
+            for field, value in zip(self.FIELDS, values):
+                getattr(self, field)[index] = value
+        self.size = index + 1
+        return index
+
+    def adopt(self, motor, max_step: float) -> int:
+        """
+        Move a motor row from its current store to this store. The motor becomes a view over the new row.
+        :param motor: Motor instance.
+        :param max_step: max absolute angle change for every step() call.
+        :return: index of the new row.
+        """
+        old_store, old_index = motor._store, motor._index
+        index = self.add(old_store.offset[old_index], old_store.sign[old_index], old_store.limit_min[old_index],
+                         old_store.limit_max[old_index], max_step, old_store.goal[old_index],
+                         old_store.current[old_index])
+        motor._store = self
+        motor._index = index
+        return index
+
+    def step(self, start: int = 0, end: int = None) -> int:
+        """
+        Move every current angle towards its goal angle, by max_step at most.
+        :param start: first row to move.
+        :param end: last row to move, excluded. None for all the rows. A range is a motors group of the robot
+            stepped by a RobotFleet worker.
+        :return: number of motors that were not in the goal position.
+        """
+        n = self.size if end is None else min(end, self.size)
+        with self.lock:
+            return self._step(start, n)
+
+    def _step(self, start: int, n: int) -> int:
+        if self.backend == "numpy":
+            goal = self.goal[start:n]
+            current = self.current[start:n]
+            max_step = self.max_step[start:n]
+            moving = int(numpy.count_nonzero(goal != current))
+            if moving > 0:
+                numpy.clip(goal, current - max_step, current + max_step, out=current)
+            return moving
+
+        goal = self.goal
+        current = self.current
+        max_step = self.max_step
+        moving = 0
+        for i in range(start, n):
+            g = goal[i]
+            c = current[i]
+            if g != c:
+                s = max_step[i]
+                if g - c > s:
+                    current[i] = c + s
+                elif c - g > s:
+                    current[i] = c - s
+                else:
+                    current[i] = g
+                moving += 1
+        return moving
+
+    def set_goals(self, rows, angles, instant_rows=()) -> list:
+        """
+        Set the goal angles of many rows as a single update: angle limits are applied in bulk and readers that use
+        copy_columns() never see a part of the update.
+        :param rows: row indexes.
+        :param angles: relative goal angles, one for every row.
+        :param instant_rows: rows whose current angle is set too (motors in instant mode).
+        :return: relative goal angles after the angle limits, one for every row.
+        """
+        if self.backend == "numpy":
+            rows = numpy.asarray(rows, dtype=numpy.intp)
+            clamped = numpy.clip(numpy.asarray(angles, dtype=float), self.limit_min[rows], self.limit_max[rows])
+            goals = (clamped + self.offset[rows]) * self.sign[rows]
+            with self.lock:
+                self.goal[rows] = goals
+                if len(instant_rows) > 0:
+                    self.current[instant_rows] = self.goal[instant_rows]
+                self.changes += 1
+            return clamped.tolist()
+
+        limit_min, limit_max, offset, sign = self.limit_min, self.limit_max, self.offset, self.sign
+        clamped = []
+        goals = []
+        for r, a in zip(rows, angles):
+            low, high = limit_min[r], limit_max[r]
+            a = low if a < low else high if a > high else a
+            clamped.append(a)
+            goals.append((a + offset[r]) * sign[r])
+        with self.lock:
+            goal = self.goal
+            for r, g in zip(rows, goals):
+                goal[r] = g
+            current = self.current
+            for r in instant_rows:
+                current[r] = goal[r]
+            self.changes += 1
+        return clamped
+
+    def copy_columns(self) -> tuple:
+        """
+        :return: copies of the goal, current, offset and sign columns, from the same update. Used by the state
+            snapshots, see StateSnapshot.
+        """
+        n = self.size
+        with self.lock:
+            if self.backend == "numpy":
+                return self.goal[:n].copy(), self.current[:n].copy(), self.offset[:n].copy(), self.sign[:n].copy()
+            columns = (array("d"), array("d"), array("d"), array("d"))
+            for column, values in zip(columns, (self.goal, self.current, self.offset, self.sign)):
+                column.frombytes(memoryview(values).cast("B"))  # Single copy, also from a shared store
+            return columns
+
+    def to_relative(self, values) -> list:
+        """
+        Batched absolute to relative angles conversion.
+        :param values: absolute angles of all the rows. Use self.goal or self.current.
+        :return: list of relative angles.
+        """
+        n = self.size
+        if self.backend == "numpy":
+            return (values[:n] * self.sign[:n] - self.offset[:n]).tolist()
+        return [v * s - o for v, s, o in zip(values, self.sign, self.offset)]
+
+    def to_absolute(self, values) -> list:
+        """
+        Batched relative to absolute angles conversion.
+        :param values: relative angles of all the rows.
+        :return: list of absolute angles.
+        """
+        n = self.size
+        if self.backend == "numpy":
+            return ((numpy.asarray(values, dtype=float) + self.offset[:n]) * self.sign[:n]).tolist()
+        return [(v + o) * s for v, s, o in zip(values, self.sign, self.offset)]
+
+    def get_abs_goal_angles(self) -> list:
+        """
+        :return: list of absolute goal angles.
+        """
+        return self.goal[:self.size].tolist()
+
+    def get_abs_current_angles(self) -> list:
+        """
+        :return: list of absolute current angles.
+        """
+        return self.current[:self.size].tolist()
+
+    def __len__(self):
+        return self.size
+
+    def __str__(self):
+        return "<MotorsStore {} motors: {}{}>".format(self.backend, self.size,
+                                                      " shared" if self.shared_memory is not None else "")
+
+    def __repr__(self):
+        return self.__str__()
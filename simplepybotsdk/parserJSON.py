@@ -1,3 +1,4 @@
+import time
 from abc import ABC, abstractmethod
 
 from simplepybotsdk import RobotSDK
@@ -12,8 +13,11 @@ class ParserJSON(ABC):
 
     def __call__(self, message):
         # Code to be executed for each request/response before the action is performed.
+        start = time.perf_counter()
         response = self.parse(message)
         # Code to be executed for each request/response after the action is performed.
+        self.robot.metrics.histogram("parser_seconds", "Duration of a message parser dispatch",
+                                     parser=type(self).__name__).observe(time.perf_counter() - start)
         return response
 
     @abstractmethod
@@ -39,7 +39,7 @@ class ParserJSONCommands(ParserJSON):
                     "data": {
                         "area": "config",
                         "action": "get_configuration_motion",
-                        "value": self.robot.motion_configuration
+                        "value": self.robot.get_motion_configuration()
                     }
                 }
 
@@ -51,20 +51,59 @@ class ParserJSONCommands(ParserJSON):
                     "data": {
                         "area": "status",
                         "action": "live_status",
-                        "value": self.robot.get_robot_dict_status(absolute=is_absolute)
+                        "value": self.robot.status_cache.get_dict(absolute=is_absolute)
                     }
                 }
 
-            # Move one or more motors
+            # Get robot state history
+            if data["area"] == "status" and "action" in data and data["action"] == "history":
+                try:
+                    value = self.robot.get_telemetry_history(data.get("seconds"), data.get("max_points"),
+                                                             data.get("keys"), data.get("format") == "absolute")
+                    return {
+                        "type": "R2C",
+                        "data": {
+                            "area": "status",
+                            "action": "history",
+                            "value": value
+                        }
+                    }
+                except Exception as e:
+                    logger.warning("Error parsing the C2R status history message {} {}".format(message, e))
+                return None
+
+            # Get SDK metrics
+            if data["area"] == "status" and "action" in data and data["action"] == "metrics":
+                return {
+                    "type": "R2C",
+                    "data": {
+                        "area": "status",
+                        "action": "metrics",
+                        "value": self.robot.get_metrics()
+                    }
+                }
+
+            # Move many motors in a single update: "goal_angles" is {"key": goal_angle} or a list of goal angles in
+            # configuration order (null to leave a motor unchanged)
+            if data["area"] == "motors" and "action" in data and data["action"] == "set_goal_angles":
+                try:
+                    self.robot.set_goal_angles(data["goal_angles"])
+                except Exception as e:
+                    logger.warning("Error parsing the C2R motors set_goal_angles message {} {}".format(message, e))
+                return None
+
+            # Move one or more motors. All the set_goal_angle commands are applied in a single update
             if data["area"] == "motors" and "commands" in data and type(data["commands"]) == list:
                 try:
+                    goal_angles = {}
                     for c in data["commands"]:
-                        m = self.robot.get_motor(c["key"])
-                        if m is None:
+                        if self.robot.get_motor(c["key"]) is None:
                             logger.warning("motor with key '{}' not found".format(c["key"]))
                             continue
                         if c["action"] == "set_goal_angle":
-                            m.set_goal_angle(c["goal_angle"])
+                            goal_angles.pop(c["key"], None)  # Last command wins
+                            goal_angles[c["key"]] = c["goal_angle"]
+                    self.robot.set_goal_angles(goal_angles)
                 except Exception as e:
                     logger.warning("Error parsing the C2R motors message {} {}".format(message, e))
                 return None
@@ -73,14 +112,39 @@ class ParserJSONCommands(ParserJSON):
             if data["area"] == "motion" and "action" in data:
                 if data["action"] == "ptp" and "command" in data and type(data["command"]) == dict:
                     try:
-                        ptp = data["command"]
-                        seconds = ptp["seconds"] if "seconds" in ptp else 0
-                        blocking = ptp["blocking"] if "blocking" in ptp else False
-                        self.robot.move_point_to_point(ptp, seconds, blocking)
+                        ptp = dict(data["command"])
+                        seconds = ptp.pop("seconds", 0)
+                        blocking = ptp.pop("blocking", False)
+                        profile = ptp.pop("profile", None)
+                        self.robot.move_point_to_point(ptp, seconds, blocking, profile)
                     except Exception as e:
                         logger.warning("Error parsing the C2R motion ptp message {} {}".format(message, e))
                     return None
 
+                # Play a performance or control the current playback
+                if data["action"] in ("play_performance", "playback"):
+                    try:
+                        command = data["command"] if "command" in data and type(data["command"]) == dict else {}
+                        if data["action"] == "play_performance":
+                            status = self.robot.play_performance(
+                                command["name"], profile=command.get("profile"), loop=command.get("loop", False),
+                                speed=command.get("speed", 1.0)).get_status()
+                        else:
+                            status = self.robot.control_playback(command.get("action"), command.get("seek"),
+                                                                 command.get("speed"), command.get("loop"))
+                        return {
+                            "type": "R2C",
+                            "data": {
+                                "area": "motion",
+                                "action": "playback",
+                                "value": status
+                            }
+                        }
+                    except Exception as e:
+                        logger.warning("Error parsing the C2R motion {} message {} {}"
+                                       .format(data["action"], message, e))
+                    return None
+
             # Move twist
             if data["area"] == "twist" and "go" in data:
                 go = data["go"]
@@ -0,0 +1,347 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import MutableMapping
+
+import simplepybotsdk.configurations as configurations
+
+logger = logging.getLogger(__name__)
+
+# Journal format: one change record per line, appended to "<motion file>.journal":
+# - "set\t<pose name as JSON string>\t<pose as JSON object>": pose created or overwritten.
+# - "del\t<pose name as JSON string>": pose deleted.
+# JSON escapes tabs and new lines, so the fields are split without decoding the pose. A last line without "\n"
+# is a record interrupted by a crash and it is removed. The journal is replayed over the motion file when the
+# store is opened, and emptied when the poses are compacted in the motion file.
+JOURNAL_SUFFIX = ".journal"
+
+
+def write_json_atomic(path: str, data, indent: int = None):
+    """
+    Write a JSON file atomically: the data is written to a temporary file, flushed to disk and then renamed over
+    path. A crash leaves the old file or the new one, never a truncated file.
+    :param path: file path.
+    :param data: JSON serializable data.
+    :param indent: JSON indentation.
+    """
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _fsync_directory(os.path.dirname(os.path.abspath(path)))
+
+
+def _fsync_directory(directory: str):
+    """Flush the rename to disk. Not supported on every platform."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class PoseStore(MutableMapping):
+    """
+    Poses of the robot, used like a dict of {pose name: {"motor key": goal angle}}.
+    Lookups are plain dict lookups on the index, so motion threads never wait for the disk. Poses read from the
+    journal are kept encoded and decoded on first access.
+    Changes are queued to the pose_store_thread, that appends them to the journal and compacts the journal in the
+    motion file (atomic rewrite) when it has compact_records records or when no change arrives for compact_interval
+    seconds.
+    """
+
+    def __init__(self, path: str = None, poses: dict = None, document: dict = None, compact_records: int = None,
+                 compact_interval: float = None):
+        """
+        :param path: motion file path. None to keep the poses only in memory.
+        :param poses: poses read from the motion file. The dict is used as index, it is not copied.
+        :param document: motion configuration written with the poses on compaction, example: performances.
+        :param compact_records: journal records that trigger a compaction.
+            Default is configurations.POSE_STORE_COMPACT_RECORDS.
+        :param compact_interval: seconds without changes after which the journal is compacted.
+            Default is configurations.POSE_STORE_COMPACT_INTERVAL.
+        """
+        self.path = path
+        self.journal_path = path + JOURNAL_SUFFIX if path is not None else None
+        self.document = document if document is not None else {}
+        self.compact_records = compact_records
+        if self.compact_records is None:
+            self.compact_records = configurations.POSE_STORE_COMPACT_RECORDS
+        self.compact_interval = compact_interval
+        if self.compact_interval is None:
+            self.compact_interval = configurations.POSE_STORE_COMPACT_INTERVAL
+        self._poses = poses if poses is not None else {}  # name -> pose dict, or pose JSON text not decoded yet
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._pending = []  # Journal records waiting for the pose_store_thread
+        self._queued = 0  # Records queued since creation
+        self._written = 0  # Records appended to the journal since creation
+        self._compact_requested = 0
+        self._compacted = 0
+        self._write_failed = 0  # Records of the last journal append that failed
+        self._compact_failed = 0  # Compaction requests of the last compaction that failed
+        self._closed = False
+        self._thread = None
+        self.journal_records = 0  # Records in the journal file
+        self.compactions = 0
+        self.last_compaction_seconds = 0.0
+        self.errors = 0
+        self.last_error = None
+        if self.journal_path is not None:
+            self._replay_journal()
+
+    def _replay_journal(self):
+        """Apply the change records of the journal left by a previous session."""
+        try:
+            with open(self.journal_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            logger.warning("PoseStore: {} interrupted record removed".format(self.journal_path))
+            with open(self.journal_path, "r+b") as f:  # Next records must not be appended to it
+                f.truncate(complete)
+        for number, line in enumerate(data[:complete].decode("utf-8").splitlines()):
+            fields = line.split("\t", 2)
+            try:
+                if fields[0] == "set" and len(fields) == 3:
+                    self._poses[json.loads(fields[1])] = fields[2]
+                elif fields[0] == "del" and len(fields) == 2:
+                    self._poses.pop(json.loads(fields[1]), None)
+                else:
+                    raise ValueError("unknown record")
+            except ValueError as e:
+                logger.warning("PoseStore: {} line {} ignored: {}".format(self.journal_path, number + 1, e))
+                continue
+            self.journal_records += 1
+        logger.debug("PoseStore: {} records replayed from {}".format(self.journal_records, self.journal_path))
+
+    def __getitem__(self, name: str) -> dict:
+        pose = self._poses[name]
+        if type(pose) is str:
+            with self._lock:
+                if self._poses.get(name) is pose:  # Not changed in the meantime
+                    self._poses[name] = json.loads(pose)
+                pose = self._poses[name]
+        return pose
+
+    def __setitem__(self, name: str, pose: dict):
+        self.set(name, pose)
+
+    def __delitem__(self, name: str):
+        self.delete(name)
+
+    def __contains__(self, name) -> bool:
+        return name in self._poses
+
+    def __iter__(self):
+        return iter(list(self._poses))
+
+    def __len__(self) -> int:
+        return len(self._poses)
+
+    def set(self, name: str, pose: dict, persist: bool = True):
+        """
+        Create or overwrite a pose. It does not wait for the disk.
+        :param name: pose name.
+        :param pose: dict of {"motor key": goal angle}.
+        :param persist: if True the change is appended to the journal, else it is saved by the next compaction.
+        """
+        pose = dict(pose)
+        record = "set\t{}\t{}\n".format(json.dumps(name), json.dumps(pose)) if persist else None
+        with self._lock:
+            self._poses[name] = pose
+            self._enqueue(record)
+
+    def delete(self, name: str, persist: bool = True):
+        """
+        Delete a pose. It does not wait for the disk.
+        :param name: pose name.
+        :param persist: if True the change is appended to the journal, else it is saved by the next compaction.
+        """
+        with self._lock:
+            del self._poses[name]
+            self._enqueue("del\t{}\n".format(json.dumps(name)) if persist else None)
+
+    def _enqueue(self, record: str):
+        """Queue a journal record. Called with the lock held."""
+        if record is None or self.path is None:
+            return
+        self._pending.append(record)
+        self._queued += 1
+        self._start_thread()
+        self._condition.notify_all()
+
+    def _start_thread(self):
+        if self._thread is not None or self._closed:
+            return
+        self._thread = threading.Thread(name="pose_store_thread", target=self._pose_store_thread_handler, args=())
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.close)
+
+    def to_dict(self) -> dict:
+        """
+        :return: copy of all the poses, decoded.
+        """
+        with self._lock:
+            poses = dict(self._poses)
+        return {name: json.loads(pose) if type(pose) is str else dict(pose) for name, pose in poses.items()}
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until the queued changes are in the journal.
+        :param timeout: max seconds to wait. None to wait forever.
+        :return: True if all the changes queued before the call have been written.
+        :raise OSError: if the journal can not be written. The changes are retried in background.
+        """
+        with self._lock:
+            target = self._queued
+            errors = self.errors
+            failed = lambda: self.errors > errors and self._write_failed >= target  # Failed after the call
+            done = self._condition.wait_for(lambda: self._written >= target or failed() or self._thread is None,
+                                            timeout)
+            if self._written < target and failed():
+                raise OSError("PoseStore: {} not written: {}".format(self.journal_path, self.last_error)) \
+                    from self.last_error
+            return done
+
+    def compact(self, wait: bool = True, timeout: float = None) -> bool:
+        """
+        Write all the poses in the motion file and empty the journal, in the pose_store_thread.
+        :param wait: if True wait until the motion file has been written.
+        :param timeout: max seconds to wait. None to wait forever.
+        :return: True if the compaction is done (always False if wait is False).
+        :raise OSError: if the motion file or the journal can not be written. The compaction is retried in background.
+        """
+        if self.path is None:
+            return False
+        with self._lock:
+            self._compact_requested += 1
+            target = self._compact_requested
+            self._start_thread()
+            self._condition.notify_all()
+            if not wait:
+                return False
+            errors = self.errors
+            failed = lambda: self.errors > errors and self._compact_failed >= target  # Failed after the call
+            done = self._condition.wait_for(lambda: self._compacted >= target or failed() or self._closed, timeout)
+            if self._compacted < target and failed():
+                raise OSError("PoseStore: {} not compacted: {}".format(self.path, self.last_error)) \
+                    from self.last_error
+            return done
+
+    def close(self, timeout: float = 5.0):
+        """
+        Write the queued changes, compact the journal and stop the pose_store_thread.
+        :param timeout: max seconds to wait.
+        """
+        if self._thread is None or self._closed:
+            return
+        try:
+            self.compact(True, timeout)
+        except OSError as e:
+            logger.error("PoseStore: close: {}".format(e))
+        with self._lock:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+    def _pose_store_thread_handler(self):
+        logger.debug("[pose_store_thread]: started for {}".format(self.journal_path))
+        while True:
+            with self._lock:
+                woken = self._condition.wait_for(
+                    lambda: self._pending or self._compact_requested > self._compacted or self._closed,
+                    self.compact_interval)
+                if self._closed and not self._pending:
+                    return
+                records = self._pending
+                self._pending = []
+                compact_target = self._compact_requested
+            written = 0
+            failed = False
+            try:
+                if records:
+                    self._append(records)
+                    written = len(records)
+                idle = not woken and self.journal_records > 0
+                if compact_target > self._compacted or idle or self.journal_records >= self.compact_records:
+                    self._compact()
+                compacted = compact_target
+            except Exception as e:
+                self.last_error = e
+                failed = True
+                compacted = self._compacted
+                logger.error("[pose_store_thread]: {}".format(e))
+            with self._lock:
+                if failed:  # Wake the waiters with the error, the changes are retried on the next loop
+                    self.errors += 1
+                    if written == 0 and records:
+                        self._pending = records + self._pending
+                        self._write_failed = self._written + len(records)
+                    self._compact_failed = compact_target
+                self._written += written
+                self._compacted = max(self._compacted, compacted)
+                self._condition.notify_all()
+            if failed:
+                time.sleep(self.compact_interval)
+
+    def _append(self, records: list):
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write("".join(records))
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_records += len(records)
+
+    def _compact(self):
+        """
+        Write the motion file with all the poses and empty the journal. Every journal record is already in the index,
+        so a crash after the rename replays changes that are in the motion file: the result is the same.
+        """
+        start = time.perf_counter()
+        poses = self.to_dict()
+        write_json_atomic(self.path, dict(self.document, poses=poses), indent=2)
+        with open(self.journal_path, "w", encoding="utf-8") as f:
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_records = 0
+        self.compactions += 1
+        self.last_compaction_seconds = time.perf_counter() - start
+        logger.debug("[pose_store_thread]: {} poses compacted in {} in {:.3f} seconds".format(
+            len(poses), self.path, self.last_compaction_seconds))
+
+    def get_stats(self) -> dict:
+        """
+        :return: dict with poses, pending, journal_records, compactions, last_compaction_seconds and errors.
+        """
+        return {
+            "poses": len(self._poses),
+            "pending": len(self._pending),
+            "journal_records": self.journal_records,
+            "compactions": self.compactions,
+            "last_compaction_seconds": self.last_compaction_seconds,
+            "errors": self.errors
+        }
+
+    def __str__(self):
+        return "<PoseStore {} poses, journal: {} records>".format(len(self._poses), self.journal_records)
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,242 @@
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+
+import simplepybotsdk.configurations as configurations
+
+logger = logging.getLogger(__name__)
+
+# Recording format: JSON Lines, one entry per line. Every file starts with a header:
+# {"type": "header", "version": 1, "robot": robot id, "started": unix time, "part": n, "motors": [motor keys]}
+# - {"type": "ptp", "t": seconds since start, "goal": {"key": relative goal angle}, "seconds": duration,
+#   "profile": profile or null}: move_point_to_point() input.
+# - {"type": "sample", "t": seconds since start, "goal": [relative goal angles], "current": [relative current angles]}:
+#   motors state sampled at a fixed rate, in the header motors order.
+# When a file is rotated the recording continues in path.1, path.2... and "t" is still relative to the first file.
+RECORDING_VERSION = 1
+
+
+class Recorder:
+    """
+    Streaming recorder of point to point movements and sampled motors trajectories.
+    Entries are appended to a JSON Lines file, flushed to disk every fsync_interval seconds,
+    and the file is rotated when it reaches max_bytes or max_seconds. Memory usage does not grow with the recording.
+    """
+
+    def __init__(self, robot, path: str, sample_per_second: float = 0, fsync_interval: float = None,
+                 max_bytes: int = None, max_seconds: float = None):
+        """
+        :param robot: RobotSDK instance.
+        :param path: path of the first recording file.
+        :param sample_per_second: motors state samples per second. 0 to record only point to point movements.
+        :param fsync_interval: seconds between two fsync. Default is configurations.RECORDER_FSYNC_INTERVAL.
+        :param max_bytes: rotate the file when it is bigger. Default is configurations.RECORDER_MAX_BYTES.
+        :param max_seconds: rotate the file when it is older. None to disable.
+        """
+        self._robot = robot
+        self.path = path
+        self.sample_per_second = sample_per_second
+        self.fsync_interval = fsync_interval
+        if self.fsync_interval is None:
+            self.fsync_interval = configurations.RECORDER_FSYNC_INTERVAL
+        self.max_bytes = max_bytes
+        if self.max_bytes is None:
+            self.max_bytes = configurations.RECORDER_MAX_BYTES
+        self.max_seconds = max_seconds
+        self.paths = []  # Files written, in order
+        self.entries = 0
+        self._motors = list(robot.motors)
+        self._lock = threading.Lock()
+        self._file = None
+        self._file_started = None
+        self._last_fsync = None
+        self._started = time.monotonic()
+        self._started_unix = time.time()
+        self._open_next_file()
+        self._thread_sampler = None
+        if self.sample_per_second > 0:
+            self._thread_sampler = threading.Thread(name="recorder_thread", target=self._sampler_thread_handler,
+                                                    args=())
+            self._thread_sampler.daemon = True
+            self._thread_sampler.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._file is None
+
+    def _open_next_file(self):
+        part = len(self.paths)
+        path = self.path if part == 0 else "{}.{}".format(self.path, part)
+        self._file = open(path, "w", encoding="utf-8")
+        self._file_started = time.monotonic()
+        self._last_fsync = self._file_started
+        self.paths.append(path)
+        self._file.write(json.dumps({
+            "type": "header",
+            "version": RECORDING_VERSION,
+            "robot": self._robot.configuration["id"],
+            "started": self._started_unix,
+            "part": part,
+            "motors": [m.key for m in self._motors]
+        }) + "\n")
+        logger.info("Recorder: writing {}".format(path))
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+
+    def _write(self, entry: dict):
+        """
+        Append an entry, then fsync or rotate the file if needed.
+        :param entry: entry to write. "t" is added.
+        """
+        now = time.monotonic()
+        entry["t"] = round(now - self._started, 4)
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            self.entries += 1
+            if now - self._last_fsync >= self.fsync_interval:
+                self._sync()
+            if self._file.tell() >= self.max_bytes or \
+                    (self.max_seconds and now - self._file_started >= self.max_seconds):
+                self._sync()
+                self._file.close()
+                self._open_next_file()
+
+    def write_point_to_point(self, motors_goal: dict, seconds: float, profile: str = None):
+        """
+        :param motors_goal: dict of {"key": goal_angle}.
+        :param seconds: duration in seconds of the movement.
+        :param profile: interpolation profile.
+        """
+        self._write({"type": "ptp", "goal": motors_goal, "seconds": seconds, "profile": profile})
+
+    def write_sample(self):
+        """
+        Append the current goal and current relative angles of all the motors.
+        """
+        goals, currents = self._robot.get_state_snapshot().get_columns()
+        self._write({
+            "type": "sample",
+            "goal": [round(goals[m._index], 3) for m in self._motors],
+            "current": [round(currents[m._index], 3) for m in self._motors]
+        })
+
+    def _sampler_thread_handler(self):
+        ticker = self._robot.create_ticker("recorder_thread", self.sample_per_second)
+        try:
+            while not self.closed:
+                ticker.sleep()
+                self.write_sample()
+        except Exception as e:
+            logger.error("[recorder_thread]: exception: {}".format(e))
+        finally:
+            self._robot.remove_ticker("recorder_thread", ticker)  # Not the one of a restarted recording
+
+    def close(self):
+        """
+        Flush and close the recording.
+        """
+        with self._lock:
+            if self._file is None:
+                return
+            self._sync()
+            self._file.close()
+            self._file = None
+        logger.info("Recorder: closed after {} entries in {}".format(self.entries, self.paths))
+
+    def __str__(self):
+        return "<Recorder {} entries: {}>".format(self.path, self.entries)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class RecordingReader:
+    """
+    Memory mapped reader of a recording written by Recorder. Lines are decoded only when accessed.
+    """
+
+    def __init__(self, paths):
+        """
+        :param paths: path of a recording file, or list of paths of a rotated recording (Recorder.paths).
+        """
+        self.paths = [paths] if type(paths) == str else list(paths)
+        self._maps = []
+        self._lines = []  # (map index, start, end) of every entry
+        self.header = None
+        for path in self.paths:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    continue
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps.append(data)
+            start = 0
+            while start < len(data):
+                end = data.find(b"\n", start)
+                if end < 0:
+                    end = len(data)  # Last line not terminated: the recording was interrupted
+                if end > start:
+                    if data[start:start + 18] == b'{"type": "header",':
+                        if self.header is None:
+                            self.header = json.loads(data[start:end])
+                    else:
+                        self._lines.append((len(self._maps) - 1, start, end))
+                start = end + 1
+        if self.header is None:
+            raise ValueError("RecordingReader: header not found in {}".format(self.paths))
+
+    @property
+    def motors(self) -> list:
+        """
+        :return: motor keys of the samples.
+        """
+        return self.header["motors"]
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __getitem__(self, index: int) -> dict:
+        m, start, end = self._lines[index]
+        try:
+            return json.loads(self._maps[m][start:end])
+        except ValueError:
+            return {"type": "invalid"}  # Partial line of an interrupted recording
+
+    def __iter__(self):
+        for index in range(len(self._lines)):
+            yield self[index]
+
+    def get_point_to_point(self, samples: bool = False) -> list:
+        """
+        :param samples: if True motors samples are converted to movements too.
+        :return: list of (motors_goal, duration in second, time_since_start), see point_to_point_play_recorded().
+        """
+        animation = []
+        previous_sample = None
+        for entry in self:
+            if entry["type"] == "ptp":
+                animation.append((entry["goal"], entry["seconds"], entry["t"]))
+            elif entry["type"] == "sample" and samples:
+                seconds = entry["t"] - previous_sample if previous_sample is not None else 0
+                animation.append((dict(zip(self.motors, entry["goal"])), seconds, entry["t"] - seconds))
+                previous_sample = entry["t"]
+        return animation
+
+    def close(self):
+        for m in self._maps:
+            m.close()
+        self._maps = []
+
+    def __str__(self):
+        return "<RecordingReader {} entries: {}>".format(self.paths, len(self._lines))
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,691 @@
+import asyncio
+import atexit
+import heapq
+import itertools
+import json
+import logging
+import multiprocessing
+import threading
+import time
+import traceback
+from collections import deque
+from urllib.parse import unquote
+
+from pyramid.config import Configurator
+from pyramid.response import Response
+from pyramid.events import NewRequest
+from wsgiref.simple_server import make_server
+from SimpleWebSocketServer import SimpleWebSocketServer
+
+import simplepybotsdk.configurations as configurations
+from simplepybotsdk.exceptions import RobotKeyError, RobotSDKInitError
+from simplepybotsdk.fleetWorker import fleet_worker_main, get_control_size, get_shard_stats, CONTROL_PER_SECOND, \
+    CONTROL_ROBOT_SPEED
+from simplepybotsdk.motionScheduler import MotionScheduler
+from simplepybotsdk.motorsStore import MotorsStore, load_shared_memory
+from simplepybotsdk.ticker import Ticker
+from simplepybotsdk.admissionControl import AdmissionControl
+from simplepybotsdk.binaryStatus import pack_frame
+from simplepybotsdk.robotRestSDK import RobotRESTSDK, add_rest_routes, add_cors_headers_response_callback
+from simplepybotsdk.robotSocketSDK import RobotSocketSDK
+from simplepybotsdk.robotWebSocketSDK import RobotWebSocketSDK
+
+logger = logging.getLogger(__name__)
+
+
+class FleetRobot(RobotRESTSDK):
+    """
+    Robot hosted by a RobotFleet. It has no threads: motors and point to point movements are ticked by the fleet
+    thread, and the fleet socket, websocket and REST servers route the clients to the robot by its id.
+    With shards the motors are in shared memory and they are stepped by the fleet worker processes: the fleet thread
+    only publishes robot_speed and writes the telemetry.
+    """
+
+    def __init__(self, fleet, robot_id: str, config_path: str, robot_speed: float = 1.0, shards: int = 0):
+        """
+        :param fleet: RobotFleet hosting the robot.
+        :param robot_id: id of the robot in the fleet. Used in the REST urls and to select the robot.
+        :param config_path: SimplePYBotSDK json configuration file path.
+        :param robot_speed: robot speed. Use this to make robot move slower or faster. Default is 1.
+        :param shards: motors groups stepped by the fleet workers. 0 to step the motors in the fleet thread.
+        """
+        self.fleet = fleet
+        self.shards = shards
+        self.motors_control = None  # Shared control block of the shards, see fleetWorker
+        super().__init__(config_path, None, None, None, None, robot_speed, fleet.motors_check_per_second,
+                         fleet.motors_point_to_point_check_per_second, fleet.web_socket_send_per_second)
+        self.fleet_id = robot_id
+        self.rest_base_url = fleet.rest_base_url + "/" + robot_id
+        self._motion_scheduler = MotionScheduler(self, wake_up=lambda: fleet._wake_up_motion(self))
+        self.socket_admission = AdmissionControl.from_configuration("fleet_socket_thread", self.configuration,
+                                                                    "socket")
+        self._socket_send_seconds = self.metrics.histogram(
+            "send_seconds", "Time to hand a message to a client transport", transport="socket")
+        self._socket_bytes_sent = self.metrics.counter("bytes_sent_total", "Bytes sent to clients", transport="socket")
+        self._motors_tick_seconds = self.metrics.histogram("motors_tick_seconds", "Duration of a motors thread tick")
+
+    def _create_motors_store(self) -> MotorsStore:
+        if self.shards <= 0 or self._motors_check_per_second <= 0:
+            self.shards = 0
+            return super()._create_motors_store()
+        return MotorsStore.create_shared(len(self.compiled_configuration.motors),
+                                         self.configuration.get("motors_store_backend"))
+
+    def _start_motors_thread(self):
+        pass  # Ticked by the fleet thread
+
+    def _motors_tick(self):
+        if self.motors_control is None:
+            super()._motors_tick()
+            return
+        if self._indexed_components[0] != len(self.motors):
+            self._check_components_index()
+        self.motors_control[CONTROL_ROBOT_SPEED] = self.robot_speed
+        self.motors_control[CONTROL_PER_SECOND] = self._motors_check_per_second
+        if self.telemetry is not None:
+            self.telemetry.write()
+        self._motors_ticks += 1
+        self.commit_state_snapshot()
+        if self.state_export is not None:
+            self.state_export.write()
+
+    def get_loops_stats(self) -> dict:
+        """
+        :return: dict of {loop name: ticker stats}, with the motors shards stepped by the fleet workers.
+        """
+        stats = super().get_loops_stats()
+        if self.motors_control is not None:
+            for shard in range(self.shards):
+                stats["motors_shard_{}".format(shard)] = get_shard_stats(self.motors_control, shard)
+        return stats
+
+    def _start_web_socket_thread(self):
+        pass  # Clients are served by the fleet websocket server
+
+    def get_connections_stats(self) -> dict:
+        """
+        :return: dict of {transport name: admission control stats}.
+        """
+        stats = super().get_connections_stats()
+        stats["socket"] = self.socket_admission.get_stats()
+        return stats
+
+    def socket_recv_callback(self, message: dict, addr: tuple, socket_conn):
+        """
+        Method called when a message is received from a fleet socket client. Override this to parse message.
+        :param message: json message received.
+        :param addr: tuple with ip and socket of the client that send the message.
+        :param socket_conn: the asyncio StreamWriter of the client.
+        """
+        pass
+
+    def __str__(self):
+        return "<FleetRobot {} {}>".format(self.fleet_id, self.configuration["name"])
+
+
+class RobotFleet:
+    """
+    Host of many robots in the same process, with shared loops:
+    - fleet_thread: motors and point to point movements of every robot. Every robot keeps its own Ticker (rate and
+      robot_speed), the next deadlines are kept in a heap so a tick costs O(log robots).
+    - fleet_socket_thread: one asyncio socket server. Clients select the robot with the message {"robot": "id"}.
+    - fleet_websocket_thread: one websocket server. Clients select the robot with the url: ws://host:port/id
+    - rest_thread: one REST server. Routes of every robot are under rest_base_url/id/, example:
+      /api/v1/robot/id/status/. rest_base_url/ lists the robots.
+    Robots do not start threads, so the overhead of a robot does not depend on how many robots are hosted.
+    With workers, the motors of the robots are split in shards (ranges of motors) stepped by worker processes. The
+    motors state is in shared memory, so the servers read it without copies and the APIs do not change.
+    """
+
+    def __init__(self, motors_check_per_second: int = None, motors_point_to_point_check_per_second: int = None,
+                 socket_host: str = None, socket_port: int = None, web_socket_host: str = None,
+                 web_socket_port: int = None, rest_host: str = None, rest_port: int = None,
+                 socket_send_per_second: int = None, web_socket_send_per_second: int = None, workers: int = None):
+        """
+        :param motors_check_per_second: numbers of motor's check per second of every robot.
+        :param motors_point_to_point_check_per_second: numbers of motor's movement in a second during point to point.
+        :param socket_host: socket host to listen.
+        :param socket_port: socket port to listen. None to disable the socket server.
+        :param web_socket_host: websocket host to listen.
+        :param web_socket_port: websocket port to listen. None to disable the websocket server.
+        :param rest_host: web server host to listen.
+        :param rest_port: web server port to listen. None to disable the REST server.
+        :param socket_send_per_second: numbers of dump send to the socket clients in 1 second.
+        :param web_socket_send_per_second: numbers of dump send to the websocket clients in 1 second.
+        :param workers: worker processes that step the motors. Default is configurations.FLEET_WORKERS.
+            Requires Python 3.8 or newer.
+        """
+        self.motors_check_per_second = motors_check_per_second
+        if self.motors_check_per_second is None:
+            self.motors_check_per_second = configurations.MOTORS_CHECK_PER_SECOND
+        self.motors_point_to_point_check_per_second = motors_point_to_point_check_per_second
+        if self.motors_point_to_point_check_per_second is None:
+            self.motors_point_to_point_check_per_second = configurations.MOTORS_POINT_TO_POINT_CHECK_PER_SECOND
+        self.socket_send_per_second = socket_send_per_second
+        if self.socket_send_per_second is None:
+            self.socket_send_per_second = configurations.SOCKET_SEND_PER_SECOND
+        self.web_socket_send_per_second = web_socket_send_per_second
+        if self.web_socket_send_per_second is None:
+            self.web_socket_send_per_second = configurations.WEB_SOCKET_SEND_PER_SECOND
+        self._socket_host = socket_host
+        self._socket_port = socket_port
+        self._web_socket_host = web_socket_host
+        self._web_socket_port = web_socket_port
+        self._rest_host = rest_host
+        self._rest_port = rest_port
+        self.workers = workers
+        if self.workers is None:
+            self.workers = configurations.FLEET_WORKERS
+        if self.workers > 0:
+            load_shared_memory()
+        self.rest_base_url = "/api/v1/robot"
+        self.rest_enable_cors = True
+        self.show_log_message = True
+        self.robots = {}  # robot id -> FleetRobot
+        self._tickers = {}  # Loops of the fleet servers, see get_loops_stats()
+        self._schedule = []  # Heap of (deadline, sequence, robot, ticker, kind) of the fleet thread
+        self._sequence = itertools.count()  # Tie breaker of the heap
+        self._woken = deque()  # (robot, kind) to add to the heap, filled by other threads
+        self._motion_scheduled = set()  # Robots with point to point movements in the heap
+        self._wake_up = threading.Event()
+        self._removed = deque()  # Robots removed, their websocket clients are closed by the websocket thread
+        self._socket_clients = {}  # asyncio StreamWriter -> [FleetRobot or None, ClientStream, addr, last activity]
+        self._socket_loop = None
+        self._rest_server = None
+        self._threads = []
+        self._workers = []  # [process, connection, rows] of the worker processes, see _start_workers()
+        self._workers_lock = threading.Lock()
+        self._robot_shards = {}  # FleetRobot -> (control SharedMemory, [(worker, shard id)])
+        self._shard_ids = itertools.count()
+
+    def add_robot(self, config_path: str, robot_id: str = None, robot_speed: float = 1.0,
+                  shards: int = None) -> FleetRobot:
+        """
+        Create a robot and start ticking it.
+        :param config_path: SimplePYBotSDK json configuration file path.
+        :param robot_id: id of the robot in the fleet. Default is the id of the configuration.
+        :param robot_speed: robot speed. Use this to make robot move slower or faster. Default is 1.
+        :param shards: number of motors groups, each one stepped by a worker process. Default is 1 if the fleet has
+            workers, else 0 (motors stepped by the fleet thread).
+        :return: the FleetRobot.
+        """
+        if shards is None:
+            shards = 1 if self.workers > 0 else 0
+        if shards > 0 and self.workers <= 0:
+            raise RobotSDKInitError("add_robot: shards require a RobotFleet with workers")
+        robot = FleetRobot(self, robot_id if robot_id is not None else "", config_path, robot_speed, shards)
+        if robot_id is None:
+            robot.fleet_id = str(robot.configuration["id"])
+            robot.rest_base_url = self.rest_base_url + "/" + robot.fleet_id
+        if robot.fleet_id in self.robots or "/" in robot.fleet_id or robot.fleet_id == "":
+            robot.motors_store.unlink()
+            raise RobotKeyError("add_robot: robot id '{}' not valid or already in the fleet".format(robot.fleet_id))
+        robot.show_log_message = self.show_log_message
+        if robot.shards > 0:
+            self._add_shards(robot)
+        self.robots[robot.fleet_id] = robot
+        if robot._motors_check_per_second > 0:
+            self._woken.append((robot, "motors"))
+            self._wake_up.set()
+        logger.info("RobotFleet: robot '{}' added. Total robots: {}".format(robot.fleet_id, len(self.robots)))
+        return robot
+
+    def remove_robot(self, robot_id: str):
+        """
+        Stop ticking a robot. Its clients are disconnected on the next broadcast.
+        :param robot_id: id of the robot in the fleet.
+        """
+        robot = self.robots.pop(robot_id, None)
+        if robot is None:
+            raise RobotKeyError("remove_robot: robot '{}' not in the fleet".format(robot_id))
+        if self._web_socket_port is not None:
+            self._removed.append(robot)
+        self._remove_shards(robot)
+        logger.info("RobotFleet: robot '{}' removed".format(robot_id))
+
+    def get_robot(self, robot_id: str) -> FleetRobot:
+        """
+        :param robot_id: id of the robot in the fleet.
+        :return: the FleetRobot or None.
+        """
+        return self.robots.get(robot_id)
+
+    def _start_workers(self):
+        """Start the worker processes. Called when the first robot with shards is added."""
+        context = multiprocessing.get_context(configurations.FLEET_WORKERS_START_METHOD)
+        for i in range(self.workers):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(name="fleet_worker_{}".format(i), target=fleet_worker_main,
+                                      args=(worker_connection, "fleet_worker_{}".format(i)))
+            process.daemon = True
+            process.start()
+            worker_connection.close()
+            self._workers.append([process, connection, 0])
+        atexit.register(self.close)
+        if self.show_log_message:
+            print("[fleet_thread]: {} worker processes started".format(self.workers))
+
+    def _add_shards(self, robot: FleetRobot):
+        """
+        Split the motors of a robot in shards of contiguous rows and send each one to the least loaded worker.
+        :param robot: robot with a shared MotorsStore.
+        """
+        store = robot.motors_store
+        shards = max(1, min(robot.shards, store.size))
+        control = load_shared_memory().SharedMemory(create=True, size=get_control_size(shards) * 8)
+        robot.motors_control = control.buf[:get_control_size(shards) * 8].cast("d")
+        robot.motors_control[CONTROL_ROBOT_SPEED] = robot.robot_speed
+        robot.motors_control[CONTROL_PER_SECOND] = robot._motors_check_per_second
+        robot.shards = shards
+        assigned = []
+        with self._workers_lock:
+            if len(self._workers) == 0:
+                self._start_workers()
+            for shard in range(shards):
+                start, end = store.size * shard // shards, store.size * (shard + 1) // shards
+                worker = min(self._workers, key=lambda w: w[2])
+                shard_id = next(self._shard_ids)
+                worker[1].send(("add", shard_id, {
+                    "store": store.shared_memory.name, "capacity": store.size, "size": store.size,
+                    "backend": store.backend, "start": start, "end": end, "control": control.name,
+                    "shards": shards, "shard": shard
+                }))
+                worker[2] += end - start
+                assigned.append((worker, shard_id, end - start))
+        self._robot_shards[robot] = (control, assigned)
+        logger.info("RobotFleet: robot '{}' {} motors split in {} shards".format(robot.fleet_id, store.size, shards))
+
+    def _remove_shards(self, robot: FleetRobot):
+        """
+        Stop stepping the shards of a robot and destroy its shared memory. The memory is freed when every process
+        has closed it, so the robot can still be used.
+        :param robot: the robot.
+        """
+        control, assigned = self._robot_shards.pop(robot, (None, []))
+        with self._workers_lock:
+            for worker, shard_id, rows in assigned:
+                if worker[0].is_alive():
+                    worker[1].send(("remove", shard_id))
+                worker[2] -= rows
+        robot.motors_store.unlink()
+        if control is not None:
+            robot.motors_control.release()
+            robot.motors_control = None  # Motors are stepped by the fleet thread again
+            control.close()
+            control.unlink()
+
+    def get_workers_stats(self) -> list:
+        """
+        :return: list of dict with name, pid, alive and rows (motors stepped) of every worker process.
+        """
+        return [{"name": process.name, "pid": process.pid, "alive": process.is_alive(), "rows": rows}
+                for process, _, rows in list(self._workers)]
+
+    def close(self):
+        """
+        Stop the worker processes and destroy the shared memory of the robots.
+        """
+        for robot in list(self._robot_shards):
+            self._remove_shards(robot)
+        with self._workers_lock:
+            workers = self._workers
+            self._workers = []
+        for process, connection, _ in workers:
+            try:
+                connection.send(("stop",))
+            except (OSError, ValueError):
+                pass
+        for process, connection, _ in workers:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+            connection.close()
+        atexit.unregister(self.close)
+
+    def start(self):
+        """
+        Start the fleet thread and the servers with a port.
+        """
+        self._start_thread("fleet_thread", self._fleet_thread_handler)
+        if self._socket_port is not None:
+            self._start_thread("fleet_socket_thread", self._socket_thread_handler)
+        if self._web_socket_port is not None:
+            self._start_thread("fleet_websocket_thread", self._web_socket_thread_handler)
+        if self._rest_port is not None:
+            self.rest_configure()
+            self._start_thread("rest_thread", self._rest_server.serve_forever)
+
+    def _start_thread(self, name: str, target):
+        thread = threading.Thread(name=name, target=target, args=())
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+
+    def create_ticker(self, name: str, per_second) -> Ticker:
+        """
+        Create a fixed rate Ticker for a fleet server loop, so its stats are returned by get_loops_stats().
+        :param name: name of the loop.
+        :param per_second: ticks per second. A number or a callable that returns the current rate.
+        :return: the Ticker.
+        """
+        ticker = Ticker(name, per_second)
+        self._tickers[name] = ticker
+        return ticker
+
+    def get_loops_stats(self) -> dict:
+        """
+        :return: dict of {loop name: ticker stats} of the fleet servers. Robots loops are in robot.get_loops_stats().
+        """
+        return {name: ticker.get_stats() for name, ticker in list(self._tickers.items())}
+
+    def _wake_up_motion(self, robot: FleetRobot):
+        """
+        Called by the MotionScheduler of a robot when a movement is submitted.
+        :param robot: the robot.
+        """
+        self._woken.append((robot, "motion"))
+        self._wake_up.set()
+
+    def _fleet_thread_handler(self):
+        """
+        Thread that ticks motors and point to point movements of all the robots, each one at its own deadline.
+        """
+        logger.debug("[fleet_thread]: started")
+        while True:
+            while len(self._woken) > 0:
+                self._schedule_robot(*self._woken.popleft())
+            if len(self._schedule) == 0 or self._schedule[0][0] > time.monotonic():
+                self._wake_up.wait(self._schedule[0][0] - time.monotonic() if len(self._schedule) > 0 else None)
+                self._wake_up.clear()
+                continue
+            _, _, robot, ticker, kind = heapq.heappop(self._schedule)
+            if self.robots.get(robot.fleet_id) is not robot:
+                continue  # Removed from the fleet
+            ticker.tick()
+            try:
+                if kind == "motors":
+                    start = time.perf_counter()
+                    robot._motors_tick()
+                    robot._motors_tick_seconds.observe(time.perf_counter() - start)
+                else:
+                    robot._motion_scheduler.tick()
+                    if robot._motion_scheduler.idle:
+                        self._motion_scheduled.discard(robot)
+                        continue
+            except Exception as e:
+                logger.error(traceback.format_exc())
+                logger.error("[fleet_thread]: robot '{}' {} exception: {}".format(robot.fleet_id, kind, e))
+            heapq.heappush(self._schedule, (time.monotonic() + ticker.next_delay(), next(self._sequence), robot,
+                                            ticker, kind))
+
+    def _schedule_robot(self, robot: FleetRobot, kind: str):
+        """
+        Add the next tick of a robot to the heap.
+        :param robot: the robot.
+        :param kind: "motors" or "motion".
+        """
+        if kind == "motors":
+            ticker = robot.create_ticker("motors_thread", lambda: robot._motors_check_per_second,
+                                         lambda: robot.robot_speed)
+        else:
+            if robot in self._motion_scheduled:
+                return
+            self._motion_scheduled.add(robot)
+            ticker = robot._tickers.get("motion_scheduler_thread")
+            if ticker is None:
+                ticker = robot.create_ticker("motion_scheduler_thread",
+                                             lambda: robot._motors_point_to_point_check_per_second,
+                                             lambda: robot.robot_speed)
+            ticker.reset()
+        heapq.heappush(self._schedule, (time.monotonic(), next(self._sequence), robot, ticker, kind))
+
+    def _socket_thread_handler(self):
+        """
+        Thread method that runs the asyncio event loop serving the socket clients of all the robots.
+        """
+        logger.debug("[fleet_socket_thread]: start asyncio server on {}".format((self._socket_host, self._socket_port)))
+        self._socket_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._socket_loop)
+        self._socket_loop.run_until_complete(asyncio.start_server(
+            self._socket_client_handler, self._socket_host, self._socket_port,
+            backlog=configurations.SOCKET_INCOMING_LIMIT))
+        if self.show_log_message:
+            print("[fleet_socket_thread]: listening for connections on {}"
+                  .format((self._socket_host, self._socket_port)))
+        self._socket_loop.create_task(self._socket_broadcast_handler())
+        self._socket_loop.run_forever()
+
+    async def _socket_client_handler(self, reader, writer):
+        """
+        Coroutine that reads the messages of a single client. {"robot": "id"} selects the robot of the client.
+        :param reader: asyncio StreamReader of the client.
+        :param writer: asyncio StreamWriter of the client.
+        """
+        addr = writer.get_extra_info("peername")
+        client = [None, None, addr, time.monotonic()]
+        self._socket_clients[writer] = client
+        logger.info("[fleet_socket_thread]: got connection from: {}".format(addr))
+        buffer = ""
+        try:
+            while writer in self._socket_clients:
+                data = await reader.read(8196)
+                if len(data) == 0:
+                    break
+                client[3] = time.monotonic()
+                messages, buffer = RobotSocketSDK._socket_decode_messages(buffer + data.decode("utf-8"), addr)
+                for message in messages:
+                    if "robot" in message and not self._socket_select_robot(writer, client, message["robot"]):
+                        return
+                    robot, stream = client[0], client[1]
+                    if robot is None:
+                        continue
+                    if stream.handle_message(message):
+                        logger.debug("[fleet_socket_thread]: connection: {} now use format: {} stream: {}"
+                                     .format(addr, stream.format, stream.stream))
+                    robot.socket_recv_callback(message, addr, writer)
+                    responses = await self._socket_loop.run_in_executor(None, self._socket_parse_message, robot,
+                                                                        message)
+                    if writer not in self._socket_clients:
+                        return  # Dropped while the parsers were running
+                    for response in responses:
+                        self._socket_write(writer, robot, stream, response)
+        except Exception as e:
+            logger.info("[fleet_socket_thread]: connection error with {}. {}".format(addr, e))
+        finally:
+            self._socket_drop_client(writer, "connection closed")
+
+    def _socket_select_robot(self, writer, client: list, robot_id) -> bool:
+        """
+        Move a socket client to a robot, with the admission control of the robot.
+        :param writer: asyncio StreamWriter of the client.
+        :param client: [robot, stream, addr, last activity] of the client.
+        :param robot_id: id of the robot selected by the client.
+        :return: False if the connection has been closed.
+        """
+        robot = self.robots.get(str(robot_id))
+        if robot is client[0]:
+            return True
+        reason = "Robot '{}' not found".format(robot_id) if robot is None else robot.socket_admission.admit(client[2])
+        if reason is not None:
+            if self.show_log_message:
+                print("[fleet_socket_thread]: connection refused to {}. {}".format(client[2], reason))
+            writer.write(AdmissionControl.get_message("rejected", reason))
+            self._socket_drop_client(writer, reason)
+            return False
+        if client[0] is not None:
+            client[0].socket_admission.release(client[2])
+        client[0] = robot
+        client[1] = robot.socket_admission.create_stream()
+        logger.info("[fleet_socket_thread]: {} selected robot '{}'".format(client[2], robot.fleet_id))
+        return True
+
+    async def _socket_broadcast_handler(self):
+        """
+        Coroutine that sends the status of its robot to every socket client on every tick.
+        Clients that do not read fast enough, are idle or whose robot has been removed are dropped.
+        """
+        ticker = self.create_ticker("fleet_socket_broadcast", lambda: self.socket_send_per_second)
+        while True:
+            await asyncio.sleep(ticker.next_delay())
+            ticker.tick()
+            for writer, (robot, stream, addr, last_activity) in list(self._socket_clients.items()):
+                if robot is None:
+                    continue
+                try:
+                    if self.robots.get(robot.fleet_id) is not robot:
+                        self._socket_drop_client(writer, "robot removed from the fleet", evicted=True)
+                        continue
+                    if writer.transport.get_write_buffer_size() > configurations.SOCKET_MAX_BUFFERED_BYTES:
+                        self._socket_drop_client(writer, "client too slow", evicted=True)
+                        continue
+                    if robot.socket_admission.is_idle(last_activity):
+                        payload = AdmissionControl.get_message("evicted", "Idle timeout")
+                        writer.write(pack_frame(payload) if stream.binary else payload)
+                        self._socket_drop_client(writer, "idle timeout", evicted=True)
+                        continue
+                    if stream.ready():
+                        self._socket_write(writer, robot, stream, stream.encode_status(robot.status_cache))
+                except Exception as e:
+                    logger.error(traceback.format_exc())
+                    self._socket_drop_client(writer, "send error: {}".format(e))
+
+    @staticmethod
+    def _socket_parse_message(robot: FleetRobot, message: dict) -> list:
+        """
+        Run the message parsers of a robot. It runs in the executor of the event loop, because parsers can block
+        (example: a blocking point to point movement) and the loop serves all the robots.
+        :param robot: robot of the client.
+        :param message: json message received.
+        :return: list of encoded responses to send to the client.
+        """
+        responses = []
+        for mp in robot.message_parsers:
+            response = mp(robot)(message)
+            if response is not None:
+                responses.append(json.dumps(response).encode("utf-8"))
+        return responses
+
+    @staticmethod
+    def _socket_write(writer, robot: FleetRobot, stream, payload: bytes):
+        """
+        Write a message to a socket client. With binary encoding every message is prefixed by its length.
+        :param writer: asyncio StreamWriter of the client.
+        :param robot: robot of the client, for the metrics.
+        :param stream: stream settings of the client.
+        :param payload: the message to send.
+        """
+        start = time.perf_counter()
+        data = pack_frame(payload) if stream.binary else payload
+        writer.write(data)
+        robot._socket_send_seconds.observe(time.perf_counter() - start)
+        robot._socket_bytes_sent.inc(len(data))
+
+    def _socket_drop_client(self, writer, reason: str, evicted: bool = False):
+        """
+        Close a socket client connection.
+        :param writer: asyncio StreamWriter of the client.
+        :param reason: reason to log.
+        :param evicted: True if the connection is closed by the server.
+        """
+        client = self._socket_clients.pop(writer, None)
+        if client is None:
+            return
+        if client[0] is not None:
+            client[0].socket_admission.release(client[2], evicted)
+        logger.info("[fleet_socket_thread]: connection closed with {}. {}".format(client[2], reason))
+        if reason == "client too slow":
+            writer.transport.abort()  # Pending data is discarded
+        else:
+            writer.close()
+
+    def _web_socket_thread_handler(self):
+        """
+        Thread method of the websocket server of all the robots. Like RobotWebSocketSDK, status frames are sent
+        from the server loop, only to the robots with clients.
+        """
+        logger.debug("[fleet_websocket_thread]: start listening for connections on {}"
+                     .format((self._web_socket_host, self._web_socket_port)))
+        server = SimpleWebSocketServer(self._web_socket_host, self._web_socket_port,
+                                       type("FleetConnectionHandler", (FleetConnectionHandler,), {"fleet": self}))
+        if self.show_log_message:
+            print("[fleet_websocket_thread]: listening for connections on {}"
+                  .format((self._web_socket_host, self._web_socket_port)))
+        ticker = self.create_ticker("fleet_websocket_send_data", lambda: self.web_socket_send_per_second)
+        while True:
+            while len(self._removed) > 0:
+                for client in list(self._removed.popleft().web_socket_threaded_connection):
+                    client.evict("Robot removed from the fleet")
+            robots = [r for r in list(self.robots.values()) if len(r.web_socket_threaded_connection) > 0]
+            for robot in robots:
+                robot._web_socket_flush_queues()
+            server.selectInterval = min(ticker.next_delay(), 0.1)
+            server.serveonce()
+            if ticker.due():
+                for robot in robots:
+                    robot._web_socket_broadcast()
+
+    def rest_configure(self):
+        """
+        Method to configure web services routes of all the robots: rest_base_url/robot id/...
+        """
+        with Configurator() as config:
+            config.add_route("fleet_robots", self.rest_base_url + "/", request_method="GET")
+            config.add_view(self._rest_fleet_robots, route_name="fleet_robots")
+            add_rest_routes(config, self.rest_base_url + "/{robot_id}", "custom", self._get_rest_view)
+            config.add_subscriber(self._rest_metrics_new_request, NewRequest)
+            if self.rest_enable_cors:
+                config.add_subscriber(add_cors_headers_response_callback, NewRequest)
+        app = config.make_wsgi_app()
+        self._rest_server = make_server(self._rest_host, self._rest_port, app)
+        if self.show_log_message:
+            print("[rest_thread]: start serving {} robots at: http://{}:{}{}/"
+                  .format(len(self.robots), self._rest_host, self._rest_port, self.rest_base_url))
+
+    def _get_rest_view(self, view: str):
+        """
+        :param view: name of a RobotRESTSDK view method.
+        :return: view that calls the method of the robot in the url.
+        """
+        def robot_view(root, request):
+            robot = self.robots.get(request.matchdict["robot_id"])
+            if robot is None:
+                return Response(json_body={"detail": "Robot not found."}, status=404)
+            return getattr(robot, view)(root, request)
+
+        return robot_view
+
+    def _rest_fleet_robots(self, root, request):
+        return Response(json_body=[{"id": robot_id, "name": robot.configuration["name"]}
+                                   for robot_id, robot in list(self.robots.items())])
+
+    def _rest_metrics_new_request(self, event):
+        start = time.perf_counter()
+
+        def observe_request(request, response):
+            robot = self.robots.get((request.matchdict or {}).get("robot_id"))
+            if robot is not None:
+                robot._rest_observe_request(request, response, time.perf_counter() - start)
+
+        event.request.add_response_callback(observe_request)
+
+    def __str__(self):
+        return "<RobotFleet {} robots>".format(len(self.robots))
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class FleetConnectionHandler(RobotWebSocketSDK.SimpleConnectionHandler):
+    """Websocket connection of a RobotFleet. The robot is selected by the url path: ws://host:port/robot_id"""
+    fleet = None  # RobotFleet, bound by RobotFleet._web_socket_thread_handler()
+
+    def handleConnected(self):
+        robot_id = unquote(self.request.path.split("?")[0].strip("/")) if self.request is not None else ""
+        self.robot = self.fleet.get_robot(robot_id)
+        if self.robot is None:
+            reason = "Robot '{}' not found".format(robot_id)
+            self.sendMessage(AdmissionControl.get_message("rejected", reason))
+            self.close(1008, reason)
+            return
+        self.stream = self.robot.web_socket_admission.create_stream()
+        super().handleConnected()
@@ -1,5 +1,6 @@
 import logging
 import threading
+import time
 from pyramid.config import Configurator
 from pyramid.response import Response
 from pyramid.events import NewRequest
@@ -46,64 +47,8 @@ class RobotRESTSDK(RobotWebSocketSDK):
         Method to configure web services routes and views.
         """
         with Configurator() as config:
-            config.add_route("hello_world", self.rest_base_url + "/")
-            config.add_view(self._rest_hello_world, route_name="hello_world")
-
-            config.add_route("rest_configuration", self.rest_base_url + "/configuration/",
-                             request_method=["GET", "OPTIONS"])
-            config.add_view(self._rest_robot_configuration, route_name="rest_configuration")
-
-            config.add_route("rest_motion", self.rest_base_url + "/motion/", request_method=["GET", "OPTIONS"])
-            config.add_view(self._rest_robot_motion, route_name="rest_motion")
-
-            config.add_route("rest_status", self.rest_base_url + "/status/", request_method="GET")
-            config.add_view(self._rest_robot_status, route_name="rest_status")
-            config.add_route("rest_status_abs", self.rest_base_url + "/status/absolute/", request_method="GET")
-            config.add_view(self._rest_robot_status_absolute, route_name="rest_status_abs")
-
-            config.add_route("rest_sdk_info", self.rest_base_url + "/sdk/", request_method="GET")
-            config.add_view(self._rest_robot_sdk_info, route_name="rest_sdk_info")
-            config.add_route("rest_sdk_patch", self.rest_base_url + "/sdk/", request_method=["PATCH", "OPTIONS"])
-            config.add_view(self._rest_robot_sdk_patch, route_name="rest_sdk_patch")
-
-            config.add_route("rest_motors", self.rest_base_url + "/motors/", request_method="GET")
-            config.add_view(self._rest_robot_motors, route_name="rest_motors")
-            config.add_route("rest_motor_by_key", self.rest_base_url + "/motors/{key}/", request_method="GET")
-            config.add_view(self._rest_robot_motor_detail_by_key, route_name="rest_motor_by_key")
-            config.add_route("rest_motor_patch_by_key", self.rest_base_url + "/motors/{key}/",
-                             request_method=["PATCH", "OPTIONS"])
-            config.add_view(self._rest_robot_motor_patch_by_key, route_name="rest_motor_patch_by_key")
-
-            config.add_route("rest_go_to_pose", self.rest_base_url + "/go-to-pose/{key}/",
-                             request_method=["POST", "OPTIONS"])
-            config.add_view(self._rest_robot_go_to_pose, route_name="rest_go_to_pose")
-            config.add_route("rest_poses", self.rest_base_url + "/poses/", request_method="GET")
-            config.add_view(self._rest_robot_poses, route_name="rest_poses")
-            config.add_route("rest_new_pose", self.rest_base_url + "/poses/{key}/", request_method=["POST", "OPTIONS"])
-            config.add_view(self._rest_robot_new_poses, route_name="rest_new_pose")
-            config.add_route("rest_delete_pose", self.rest_base_url + "/poses/{key}/", request_method=["DELETE", "OPTIONS"])
-            config.add_view(self._rest_robot_delete_pose, route_name="rest_delete_pose")
-            config.add_route("rest_pose_by_key", self.rest_base_url + "/poses/{key}/", request_method="GET")
-            config.add_view(self._rest_robot_pose_detail_by_key, route_name="rest_pose_by_key")
-
-            config.add_route("rest_move_point_to_point", self.rest_base_url + "/move-point-to-point/",
-                             request_method=["POST", "OPTIONS"])
-            config.add_view(self._rest_robot_move_point_to_point, route_name="rest_move_point_to_point")
-
-            config.add_route("rest_sensors", self.rest_base_url + "/sensors/", request_method="GET")
-            config.add_view(self._rest_robot_sensors, route_name="rest_sensors")
-            config.add_route("rest_sensors_by_key", self.rest_base_url + "/sensors/{key}/", request_method="GET")
-            config.add_view(self._rest_robot_sensors_detail_by_key, route_name="rest_sensors_by_key")
-            config.add_route("rest_twist", self.rest_base_url + "/twist/", request_method="GET")
-            config.add_view(self._rest_robot_twist, route_name="rest_twist")
-
-            config.add_route("rest_move_twist", self.rest_base_url + "/twist/", request_method=["POST", "OPTIONS"])
-            config.add_view(self._rest_robot_move_twist, route_name="rest_move_twist")
-            
-            config.add_route("rest_custom_post", self.rest_base_url + "/" + self.rest_custom_url + "/",
-                             request_method=["POST", "OPTIONS"])
-            config.add_view(self._rest_robot_custom_post, route_name="rest_custom_post")
-
+            add_rest_routes(config, self.rest_base_url, self.rest_custom_url, lambda view: getattr(self, view))
+            config.add_subscriber(self._rest_metrics_new_request, NewRequest)
             if self.rest_enable_cors:
                 config.add_subscriber(add_cors_headers_response_callback, NewRequest)
         app = config.make_wsgi_app()
@@ -151,13 +96,13 @@ class RobotRESTSDK(RobotWebSocketSDK):
             return Response(json_body={})
         if self.motion_configuration is None:
             return Response(json_body={"detail": "Motion configuration not found."}, status=404)
-        return Response(json_body=self.motion_configuration)
+        return Response(json_body=self.get_motion_configuration())
 
     def _rest_robot_status(self, root, request):
-        return Response(json_body=self.get_robot_dict_status())
+        return Response(body=self.status_cache.get_json(absolute=False), content_type="application/json")
 
     def _rest_robot_status_absolute(self, root, request):
-        return Response(json_body=self.get_robot_dict_status(absolute=True))
+        return Response(body=self.status_cache.get_json(absolute=True), content_type="application/json")
 
     def _rest_robot_sdk_info(self, root, request):
         return Response(json_body=self.get_sdk_infos())
@@ -174,12 +119,75 @@ class RobotRESTSDK(RobotWebSocketSDK):
             logger.error("[rest_thread]: robot_sdk_patch: {}".format(e))
             return Response(json_body={"detail": "Bad request. Use robot_speed field"}, status=400)
 
+    def _rest_robot_sdk_loops(self, root, request):
+        return Response(json_body=self.get_loops_stats())
+
+    def _rest_metrics_new_request(self, event):
+        start = time.perf_counter()
+
+        def observe_request(request, response):
+            self._rest_observe_request(request, response, time.perf_counter() - start)
+
+        event.request.add_response_callback(observe_request)
+
+    def _rest_observe_request(self, request, response, seconds: float):
+        """
+        Add a REST request to the metrics.
+        :param request: Pyramid request.
+        :param response: Pyramid response.
+        :param seconds: duration of the request.
+        """
+        route = request.matched_route.name if request.matched_route is not None else "not_found"
+        self.metrics.histogram("rest_request_seconds", "Duration of a REST request", route=route).observe(seconds)
+        self.metrics.counter("rest_responses_total", "REST responses by status code",
+                             route=route, status=response.status_code).inc()
+
+    def _rest_robot_metrics(self, root, request):
+        return Response(body=self.get_metrics(prometheus=True).encode("utf-8"),
+                        content_type="text/plain", charset="utf-8")
+
+    def _rest_robot_telemetry(self, root, request):
+        # Query parameters: seconds, max_points, keys (comma separated motors and sensors keys), format
+        try:
+            params = request.params
+            seconds = float(params["seconds"]) if "seconds" in params else None
+            max_points = int(params["max_points"]) if "max_points" in params else None
+            keys = params["keys"].split(",") if params.get("keys") else None
+            history = self.get_telemetry_history(seconds, max_points, keys, params.get("format") == "absolute")
+        except RobotKeyError as e:
+            return Response(json_body={"detail": str(e)}, status=400)
+        except ValueError:
+            return Response(json_body={"detail": "Bad request. Use seconds, max_points, keys or format parameters"},
+                            status=400)
+        return Response(json_body=history)
+
+    def _rest_robot_websocket_clients(self, root, request):
+        return Response(json_body=self.get_web_socket_clients_stats())
+
+    def _rest_robot_connections(self, root, request):
+        return Response(json_body=self.get_connections_stats())
+
     def _rest_robot_motors(self, root, request):
         motors = []
         for m in self.motors:
             motors.append(dict(m))
         return Response(json_body=motors)
 
+    def _rest_robot_motors_patch(self, root, request):
+        if request.method == "OPTIONS":
+            return Response(json_body={})
+        try:
+            goal_angles = request.json_body
+            if not isinstance(goal_angles, (dict, list)):
+                raise ValueError("body is not an object or a list")
+            goal_angles = self.set_goal_angles(goal_angles)
+        except RobotKeyError as e:
+            return Response(json_body={"detail": str(e)}, status=400)
+        except Exception as e:
+            logger.error("[rest_thread]: robot_motors_patch: {}".format(e))
+            return Response(json_body={"detail": "Bad request. Use: {\"motor_key\": goal_angle}"}, status=400)
+        return Response(json_body=[dict(self.get_motor(key)) for key in goal_angles])
+
     def _rest_robot_motor_detail_by_key(self, root, request):
         m = self.get_motor(request.matchdict["key"])
         if m is None:
@@ -202,7 +210,7 @@ class RobotRESTSDK(RobotWebSocketSDK):
     def _rest_robot_poses(self, root, request):
         if self.poses is None:
             return Response(json_body={"detail": "Not poses found"}, status=404)
-        return Response(json_body=dict(self.poses))
+        return Response(json_body=self.poses.to_dict())
 
     def _rest_robot_new_poses(self, root, request):
         if request.method == "OPTIONS":
@@ -236,12 +244,18 @@ class RobotRESTSDK(RobotWebSocketSDK):
             return Response(json_body={})
         key = request.matchdict["key"]
         seconds = 0
+        profile = None
         if request.body and "seconds" in request.json_body:
             seconds = request.json_body["seconds"]
             if type(seconds) is not int and type(seconds) is not float:
                 seconds = 0
             seconds = 0 if seconds < 0.5 else seconds
-        result = self.go_to_pose(key, seconds, seconds == 0)
+        if request.body and "profile" in request.json_body:
+            profile = request.json_body["profile"]
+        try:
+            result = self.go_to_pose(key, seconds, seconds == 0, profile)
+        except RobotKeyError as e:
+            return Response(json_body={"detail": str(e)}, status=400)
         if result:
             return Response(json_body={"detail": "Going to pose {} in {} seconds".format(key, seconds)})
         return Response(
@@ -259,12 +273,55 @@ class RobotRESTSDK(RobotWebSocketSDK):
                 if type(seconds) is not int and type(seconds) is not float:
                     seconds = 0
                 seconds = 0 if seconds < 0.5 else seconds
-            self.move_point_to_point(pose, seconds, seconds == 0)
+            profile = pose.pop("profile", None)
+            self.move_point_to_point(pose, seconds, seconds == 0, profile)
             return Response(json_body={"detail": "Move point to point in {} seconds".format(seconds)})
         except Exception as e:
             logger.error("[rest_thread]: robot_move_point_to_point: {}".format(e))
             return Response(json_body={"detail": "Bad request. Use: {\"motor_key\": goal_angle}"}, status=400)
 
+    def _rest_robot_performances(self, root, request):
+        performances = {}
+        if self.motion_configuration is not None and "performances" in self.motion_configuration:
+            performances = self.motion_configuration["performances"]
+        return Response(json_body=[{"key": key, "description": p.get("description", "")}
+                                   for key, p in performances.items()])
+
+    def _rest_robot_play_performance(self, root, request):
+        if request.method == "OPTIONS":
+            return Response(json_body={})
+        try:
+            body = request.json_body if request.body else {}
+            if not isinstance(body, dict):
+                raise ValueError("body is not an object")
+            playback = self.play_performance(request.matchdict["key"], profile=body.get("profile"),
+                                             loop=body.get("loop", False), speed=body.get("speed", 1.0))
+        except RobotKeyError as e:
+            return Response(json_body={"detail": str(e)}, status=400)
+        except Exception as e:
+            logger.error("[rest_thread]: robot_play_performance: {}".format(e))
+            return Response(json_body={"detail": "Bad request. Use profile, loop or speed fields"}, status=400)
+        return Response(json_body=playback.get_status())
+
+    def _rest_robot_playback(self, root, request):
+        playback = self.get_playback()
+        if playback is None:
+            return Response(json_body={"detail": "Not found."}, status=404)
+        return Response(json_body=playback.get_status())
+
+    def _rest_robot_playback_patch(self, root, request):
+        if request.method == "OPTIONS":
+            return Response(json_body={})
+        try:
+            body = request.json_body
+            return Response(json_body=self.control_playback(body.get("action"), body.get("seek"), body.get("speed"),
+                                                            body.get("loop")))
+        except RobotKeyError as e:
+            return Response(json_body={"detail": str(e)}, status=400)
+        except Exception as e:
+            logger.error("[rest_thread]: robot_playback_patch: {}".format(e))
+            return Response(json_body={"detail": "Bad request. Use action, seek, speed or loop fields"}, status=400)
+
     def _rest_robot_sensors(self, root, request):
         sensors = []
         for s in self.sensors:
@@ -313,6 +370,56 @@ class RobotRESTSDK(RobotWebSocketSDK):
         return None
 
 
+# (route name, path after rest_base_url, request methods, view method of RobotRESTSDK)
+REST_ROUTES = (
+    ("hello_world", "/", None, "_rest_hello_world"),
+    ("rest_configuration", "/configuration/", ["GET", "OPTIONS"], "_rest_robot_configuration"),
+    ("rest_motion", "/motion/", ["GET", "OPTIONS"], "_rest_robot_motion"),
+    ("rest_status", "/status/", "GET", "_rest_robot_status"),
+    ("rest_status_abs", "/status/absolute/", "GET", "_rest_robot_status_absolute"),
+    ("rest_sdk_info", "/sdk/", "GET", "_rest_robot_sdk_info"),
+    ("rest_sdk_patch", "/sdk/", ["PATCH", "OPTIONS"], "_rest_robot_sdk_patch"),
+    ("rest_sdk_loops", "/sdk/loops/", "GET", "_rest_robot_sdk_loops"),
+    ("rest_metrics", "/metrics/", "GET", "_rest_robot_metrics"),
+    ("rest_telemetry", "/telemetry/", "GET", "_rest_robot_telemetry"),
+    ("rest_websocket_clients", "/websocket/clients/", "GET", "_rest_robot_websocket_clients"),
+    ("rest_connections", "/connections/", "GET", "_rest_robot_connections"),
+    ("rest_motors", "/motors/", "GET", "_rest_robot_motors"),
+    ("rest_motors_patch", "/motors/", ["PATCH", "OPTIONS"], "_rest_robot_motors_patch"),
+    ("rest_motor_by_key", "/motors/{key}/", "GET", "_rest_robot_motor_detail_by_key"),
+    ("rest_motor_patch_by_key", "/motors/{key}/", ["PATCH", "OPTIONS"], "_rest_robot_motor_patch_by_key"),
+    ("rest_go_to_pose", "/go-to-pose/{key}/", ["POST", "OPTIONS"], "_rest_robot_go_to_pose"),
+    ("rest_poses", "/poses/", "GET", "_rest_robot_poses"),
+    ("rest_new_pose", "/poses/{key}/", ["POST", "OPTIONS"], "_rest_robot_new_poses"),
+    ("rest_delete_pose", "/poses/{key}/", ["DELETE", "OPTIONS"], "_rest_robot_delete_pose"),
+    ("rest_pose_by_key", "/poses/{key}/", "GET", "_rest_robot_pose_detail_by_key"),
+    ("rest_move_point_to_point", "/move-point-to-point/", ["POST", "OPTIONS"], "_rest_robot_move_point_to_point"),
+    ("rest_performances", "/performances/", "GET", "_rest_robot_performances"),
+    ("rest_play_performance", "/performances/{key}/play/", ["POST", "OPTIONS"], "_rest_robot_play_performance"),
+    ("rest_playback", "/playback/", "GET", "_rest_robot_playback"),
+    ("rest_playback_patch", "/playback/", ["PATCH", "OPTIONS"], "_rest_robot_playback_patch"),
+    ("rest_sensors", "/sensors/", "GET", "_rest_robot_sensors"),
+    ("rest_sensors_by_key", "/sensors/{key}/", "GET", "_rest_robot_sensors_detail_by_key"),
+    ("rest_twist", "/twist/", "GET", "_rest_robot_twist"),
+    ("rest_move_twist", "/twist/", ["POST", "OPTIONS"], "_rest_robot_move_twist")
+)
+
+
+def add_rest_routes(config, base_url: str, custom_url: str, get_view):
+    """
+    Add the routes of REST_ROUTES and the custom POST route to a Pyramid configuration.
+    :param config: Pyramid Configurator.
+    :param base_url: prefix of all the routes, example: "/api/v1/robot".
+    :param custom_url: path of the custom POST route.
+    :param get_view: callable that returns the view of a RobotRESTSDK view method name.
+    """
+    for name, path, request_method, view in REST_ROUTES:
+        config.add_route(name, base_url + path, request_method=request_method)
+        config.add_view(get_view(view), route_name=name)
+    config.add_route("rest_custom_post", base_url + "/" + custom_url + "/", request_method=["POST", "OPTIONS"])
+    config.add_view(get_view("_rest_robot_custom_post"), route_name="rest_custom_post")
+
+
 def add_cors_headers_response_callback(event):
     def cors_headers(request, response):
         response.headers.update({
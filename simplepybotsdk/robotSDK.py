@@ -1,12 +1,27 @@
 import logging
+import math
+import os
 import threading
 import json
 import time
 import traceback
+from collections import deque
 from datetime import datetime
 import simplepybotsdk.configurations as configurations
 from simplepybotsdk import Sensor, Motor
 from simplepybotsdk.twist import Twist, TwistVector
+from simplepybotsdk.motionScheduler import MotionScheduler, MotionHandle, PlaybackHandle
+from simplepybotsdk.trajectoryCompiler import TrajectoryCompiler
+from simplepybotsdk.ticker import Ticker
+from simplepybotsdk.motorsStore import MotorsStore
+from simplepybotsdk.statusCache import StatusCache
+from simplepybotsdk.recorder import Recorder
+from simplepybotsdk.telemetry import TelemetryBuffer
+from simplepybotsdk.stateExport import StateExport
+from simplepybotsdk.stateSnapshot import StateSnapshot, SnapshotLayout
+from simplepybotsdk.metrics import MetricsRegistry
+from simplepybotsdk.compiledConfiguration import CompiledConfiguration
+from simplepybotsdk.poseStore import PoseStore, write_json_atomic
 from simplepybotsdk.exceptions import RobotSDKInitError, RobotKeyError
 
 logger = logging.getLogger(__name__)
@@ -26,20 +41,39 @@ class RobotSDK:
         logger.info("RobotSDK version {} initialization".format(configurations.VERSION))
         self.config_path = None
         self.configuration = None
+        self.compiled_configuration = None  # Validated configuration, see CompiledConfiguration
         self.motion_path = None
         self.motion_configuration = None
         self.sensors = []
         self.motors = []
+        self.motors_store = None  # MotorsStore with the state of all the motors, see _init_motors()
+        self._motors_by_key = {}  # Lookup indexes, kept in sync by add_motor() and add_sensor()
+        self._motors_by_id = {}
+        self._sensors_by_key = {}
+        self._sensors_by_id = {}
+        self._indexed_components = (0, 0)  # (motors, sensors) count when indexes were built
         self.twist = None  # ROS like object to control movements for a robot with wheels
-        self.poses = None
+        self.poses = None  # PoseStore, see _set_motion_configuration()
         self.robot_speed = robot_speed
         self._motors_check_per_second = motors_check_per_second
         self._motors_point_to_point_check_per_second = motors_point_to_point_check_per_second
         self._thread_motors = None
+        self._motors_ticks = 0
+        self.metrics = MetricsRegistry()  # Counters and histograms of the hot paths, see get_metrics()
+        self.metrics.add_collector(self._collect_loops_metrics)
+        self.status_cache = StatusCache(self)  # Live status shared by all the transports
+        self._motion_scheduler = MotionScheduler(self)
+        self.trajectory_compiler = TrajectoryCompiler(self)  # Cache of compiled movements and performances
+        self._playback = None  # Last PlaybackHandle started, see get_playback()
         self.show_log_message = True
         self._record_point_to_point = None  # If not None will be the start of recording
-        self._point_to_point_session = []  # Used to record point to point
-        self.sleep_avoid_cpu_waste = configurations.SLEEP_AVOID_CPU_WASTE  # Max value is 1
+        self._point_to_point_session = deque()  # Used to record point to point in memory
+        self.recorder = None  # Recorder if the recording is streamed to a file
+        self._tickers = {}  # Fixed rate loops, see create_ticker()
+        self.telemetry = None  # TelemetryBuffer written by the motors thread, see get_telemetry_history()
+        self.state_export = None  # StateExport written by the motors thread, see enable_state_export()
+        self._snapshot = None  # Last StateSnapshot committed, see get_state_snapshot()
+        self._snapshot_lock = threading.Lock()  # Held by the writers of the snapshots only
 
         if self._motors_check_per_second is None:
             self._motors_check_per_second = configurations.MOTORS_CHECK_PER_SECOND
@@ -50,60 +84,65 @@ class RobotSDK:
 
     def _init_robot(self, config_path: str):
         """
-        Read the JSON file configuration from path.
+        Read the JSON file configuration from path, validated and compiled (see CompiledConfiguration).
         Then starts robot's component initialization.
         :param config_path: SimplePYBotSDK json configuration file path.
         """
         logger.debug("Initialization with file: {}".format(config_path))
         self.config_path = config_path
         try:
-            with open(self.config_path) as f:
-                self.configuration = json.load(f)
-        except Exception as e:
-            logger.error(traceback.format_exc())
-            logger.error("Initialization configuration error: exception: {}".format(e))
-            print("Initialization configuration error: exception: {}".format(e))
-            raise RobotSDKInitError("Initialization configuration error: exception: {}".format(e))
-
-        logger.debug("Robot configuration: {}".format(self.configuration))
-        if ("id" in self.configuration) and ("version" in self.configuration) and ("name" in self.configuration):
-            self._init_sensors()
-            self._init_motors()
-            self._init_twist_controller()
-            self._init_motion()
-        else:
-            logger.error("Initialization configuration error: id, version and name are required in configuration file")
-            print("Initialization configuration error: id, version and name are required in configuration file")
-            raise RobotSDKInitError("Configuration error: id, version and name are required in configuration file")
+            self.compiled_configuration = CompiledConfiguration.load(self.config_path)
+        except RobotSDKInitError as e:
+            print(e)
+            raise
+        self.configuration = self.compiled_configuration.configuration
+
+        logger.debug("Robot configuration: {}".format(self.compiled_configuration))
+        self._init_sensors()
+        self._init_motors()
+        self._init_twist_controller()
+        self._init_motion()
 
     def _init_motors(self):
-        """Initialize motors from JSON configuration and start thread."""
-        if "motors" not in self.configuration:
-            logger.error("Initialization configuration error: no motors found in the configuration file")
-            print("Initialization configuration error: no motors found in the configuration file")
-            raise RobotSDKInitError("Configuration error: no motors found in the configuration file")
-        if "motors_type" not in self.configuration:
-            logger.error("Initialization configuration error: no motors_type found in the configuration file")
-            print("Initialization configuration error: no motors_type found in the configuration file")
-            raise RobotSDKInitError("Configuration error: no motors_type found in the configuration file")
-        for key, m in self.configuration["motors"].items():
-            self.motors.append(Motor(
-                identifier=m["id"],
+        """Initialize motors from the compiled configuration and start thread."""
+        self.motors_store = self._create_motors_store()
+        for s in self.sensors:
+            s._store = self.motors_store  # Sensor writes make the last StateSnapshot stale, see get_state_snapshot()
+        for row in self.compiled_configuration.motors:
+            key, identifier, offset, orientation, limit_min, limit_max, motor_type, _ = row
+            self.add_motor(Motor(
+                identifier=identifier,
                 key=key,
-                offset=m["offset"],
-                angle_limit=m["angle_limit"],
-                orientation=m["orientation"],
-                motor_type=m["type"],
+                offset=offset,
+                angle_limit=[limit_min, limit_max],
+                orientation=orientation,
+                motor_type=motor_type,
                 instant_mode=self._motors_check_per_second <= 0
             ))
         logger.debug("Motors initialization completed. Total motors: {} {}".format(len(self.motors), self.motors))
         if self._motors_check_per_second > 0:
-            self._thread_motors = threading.Thread(name="motors_thread", target=self._motors_thread_handler, args=())
-            self._thread_motors.daemon = True
-            self._thread_motors.start()
+            telemetry_seconds = self.configuration.get("telemetry_seconds", configurations.TELEMETRY_SECONDS)
+            if telemetry_seconds > 0:
+                self.telemetry = TelemetryBuffer(self, int(telemetry_seconds * self._motors_check_per_second))
+            state_export_path = self.configuration.get("state_export_path", configurations.STATE_EXPORT_PATH)
+            if state_export_path is not None:
+                self.enable_state_export(state_export_path)
+            self._start_motors_thread()
         else:
             logger.debug("[motors_thread]: thread to control motors disabled by motors_check_per_second parameter")
 
+    def _create_motors_store(self) -> MotorsStore:
+        """
+        :return: empty MotorsStore for the motors. Robots of a RobotFleet with workers use a shared memory store.
+        """
+        return MotorsStore(self.configuration.get("motors_store_backend"))
+
+    def _start_motors_thread(self):
+        """Start the dedicated motors thread. Robots of a RobotFleet are ticked by the fleet thread instead."""
+        self._thread_motors = threading.Thread(name="motors_thread", target=self._motors_thread_handler, args=())
+        self._thread_motors.daemon = True
+        self._thread_motors.start()
+
     def _motors_thread_handler(self):
         """
         Dedicated thread to move motors to the goal angle position, based on motor angle/sec speed.
@@ -112,43 +151,177 @@ class RobotSDK:
         logger.debug("[motors_thread]: start handling {} motors".format(len(self.motors)))
         if self.show_log_message:
             print("[motors_thread]: start handling {} motors".format(len(self.motors)))
-        last_time = 0
-        motors_conf = self.configuration["motors_type"]
+        ticker = self.create_ticker("motors_thread", lambda: self._motors_check_per_second, lambda: self.robot_speed)
+        tick_seconds = self.metrics.histogram("motors_tick_seconds", "Duration of a motors thread tick")
         while True:
-            if (time.time() - last_time) > ((1 / self._motors_check_per_second) / self.robot_speed):
-                last_time = time.time()
-                try:
-                    for m in self.motors:  # Watching all motors
-                        if m.abs_goal_angle != m.abs_current_angle:  # Check if is not in goal position
-                            speed = motors_conf[m.motor_type]["angle_speed"]  # Get degree/sec
-                            max_step = speed / self._motors_check_per_second  # Get max step for this iteration
-                            step = m.abs_goal_angle - m.abs_current_angle
-                            if step > max_step:
-                                step = max_step
-                            elif step < -max_step:
-                                step = -max_step
-
-                            logger.debug("[motors_thread]: {}: {:.2f} -> {:.2f} [{:.2f}]"
-                                         .format(m.key, m.abs_current_angle, m.abs_goal_angle, step))
-                            m.abs_current_angle = m.abs_current_angle + step
-                except Exception as e:
-                    logger.error(traceback.format_exc())
-                    logger.error("[motors_thread]: exception: {}".format(e))
-                    print("[motors_thread]: exception: {}".format(e))
-                    pass
-                # Avoid wasting CPU time
-                time.sleep((self.sleep_avoid_cpu_waste / self._motors_check_per_second) / self.robot_speed)
+            ticker.sleep()
+            try:
+                start = time.perf_counter()
+                self._motors_tick()
+                tick_seconds.observe(time.perf_counter() - start)
+            except Exception as e:
+                logger.error(traceback.format_exc())
+                logger.error("[motors_thread]: exception: {}".format(e))
+                print("[motors_thread]: exception: {}".format(e))
+
+    def _motors_tick(self):
+        """
+        Move every motor one step towards its goal angle. All the motors are moved by a single batched operation.
+        """
+        if self._indexed_components[0] != len(self.motors):
+            self._check_components_index()  # Motors added without add_motor() need to be adopted by the store
+        self.motors_store.step()
+        if self.telemetry is not None:
+            self.telemetry.write()
+        self._motors_ticks += 1
+        self.commit_state_snapshot()
+        if self.state_export is not None:
+            self.state_export.write()
+
+    def create_ticker(self, name: str, per_second, speed=None) -> Ticker:
+        """
+        Create a fixed rate Ticker and register it, so its stats are returned by get_loops_stats().
+        :param name: name of the loop.
+        :param per_second: ticks per second. A number or a callable that returns the current rate.
+        :param speed: optional callable that returns a rate multiplier.
+        :return: the Ticker.
+        """
+        ticker = Ticker(name, per_second, speed)
+        self._tickers[name] = ticker
+        return ticker
+
+    def remove_ticker(self, name: str, ticker: Ticker = None):
+        """
+        Unregister a Ticker created by create_ticker(). Use this when a loop ends.
+        :param name: name of the loop.
+        :param ticker: if set, the loop is unregistered only if it is still this Ticker: a new loop with the same
+            name may have replaced it.
+        """
+        if ticker is None:
+            self._tickers.pop(name, None)
+        elif self._tickers.get(name) is ticker:
+            del self._tickers[name]
+
+    def get_loops_stats(self) -> dict:
+        """
+        :return: dict of {loop name: ticker stats} for all the running timing loops.
+        """
+        return {name: ticker.get_stats() for name, ticker in list(self._tickers.items())}
+
+    def commit_state_snapshot(self) -> StateSnapshot:
+        """
+        Publish a new StateSnapshot with the current motors, sensors and twist. Called by the motors thread after
+        every step: readers always get a whole tick. Call this after a change that must be visible before the next
+        tick.
+        :return: the new StateSnapshot.
+        """
+        with self._snapshot_lock:
+            self._check_components_index()
+            previous = self._snapshot
+            changes = self.motors_store.changes  # Before the copy: a write during the copy makes the snapshot stale
+            twist = self.twist
+            layout = previous.layout if previous is not None else None
+            if layout is None or layout.shape != (len(self.motors), len(self.sensors), self.motors_store.size,
+                                                  twist is not None):
+                layout = SnapshotLayout(self)
+            snapshot = StateSnapshot(
+                previous.version + 1 if previous is not None else 1, time.monotonic(), self._motors_ticks, layout,
+                self.motors_store.copy_columns(), tuple(s.abs_value + s.offset for s in layout.sensors),
+                (twist.linear.x, twist.linear.y, twist.linear.z, twist.angular.x, twist.angular.y, twist.angular.z)
+                if twist is not None else None, changes)
+            self._snapshot = snapshot  # Readers take the reference, no lock
+        return snapshot
+
+    def get_state_snapshot(self) -> StateSnapshot:
+        """
+        :return: last StateSnapshot committed by the motors thread. A new snapshot is committed if goals, sensors or
+            motors settings were written after the last one (see MotorsStore.changes), or without motors thread.
+            Movements stepped by the motors thread and point to point playbacks are visible after the next tick.
+        """
+        snapshot = self._snapshot
+        if snapshot is None or self._motors_check_per_second <= 0 or snapshot.changes != self.motors_store.changes:
+            return self.commit_state_snapshot()
+        return snapshot
+
+    def enable_state_export(self, path: str) -> StateExport:
+        """
+        Publish motors, sensors and twist in a memory mapped file after every motors thread step, so processes on the
+        same host can read the state without sockets or JSON. See StateReader.
+        :param path: file path of the state. Example: /dev/shm/robot.state on Linux.
+        :return: the StateExport.
+        """
+        self.disable_state_export()
+        self.state_export = StateExport(self, path)
+        logger.debug("State export enabled: {}".format(path))
+        return self.state_export
+
+    def disable_state_export(self):
+        """
+        Stop publishing the state. Readers keep the last frame.
+        """
+        state_export, self.state_export = self.state_export, None
+        if state_export is not None:
+            state_export.close()
+
+    def get_telemetry_history(self, seconds: float = None, max_points: int = None, keys: list = None,
+                              absolute: bool = False) -> dict:
+        """
+        :param seconds: only samples of the last seconds. None for all the samples.
+        :param max_points: downsample to this number of samples at most.
+        :param keys: motors and sensors keys to return. None for all.
+        :param absolute: angle absolute or relative.
+        :return: history of the robot state, see TelemetryBuffer.get_history().
+        """
+        if self.telemetry is None:
+            raise RobotKeyError("Telemetry disabled. Set telemetry_seconds in configuration and start motors thread")
+        if keys is not None:
+            for key in keys:
+                if self.get_motor(key) is None and self.get_sensor(key) is None:
+                    raise RobotKeyError("Motor or sensor '{}' not found".format(key))
+        return self.telemetry.get_history(seconds, max_points, keys, absolute)
+
+    def _collect_loops_metrics(self) -> list:
+        """
+        :return: metrics of the timing loops and connections, see MetricsRegistry.add_collector().
+        """
+        samples = []
+        for name, ticker in list(self._tickers.items()):
+            labels = {"loop": name}
+            samples.append(("loop_ticks_total", "counter", "Ticks of a timing loop", labels, ticker.ticks))
+            samples.append(("loop_overruns_total", "counter", "Ticks that started late by one or more periods",
+                            labels, ticker.overruns))
+            samples.append(("loop_skipped_ticks_total", "counter", "Ticks skipped because of overruns", labels,
+                            ticker.skipped_ticks))
+            samples.append(("loop_jitter_max_seconds", "gauge", "Max lateness of a timing loop wake up", labels,
+                            ticker.jitter_max))
+        for transport, stats in self.get_connections_stats().items():
+            samples.append(("connections", "gauge", "Clients connected", {"transport": transport},
+                            stats["connections"]))
+        return samples
+
+    def get_metrics(self, prometheus: bool = False):
+        """
+        :param prometheus: if True return the Prometheus text format.
+        :return: dict of metrics or str in Prometheus text format.
+        """
+        return self.metrics.get_prometheus() if prometheus else self.metrics.get_dict()
+
+    def get_connections_stats(self) -> dict:
+        """
+        :return: dict of {transport name: admission control stats}. Transports add their own entry.
+        """
+        return {}
 
     def _init_sensors(self):
-        """Initialize sensors from JSON configuration."""
+        """Initialize sensors from the compiled configuration."""
         if "sensors" not in self.configuration:
             logger.debug("No sensors found in the configuration file")
             return
-        for key, s in self.configuration["sensors"].items():
-            self.sensors.append(Sensor(
-                identifier=s["id"],
+        for key, identifier, offset in self.compiled_configuration.sensors:
+            self.add_sensor(Sensor(
+                identifier=identifier,
                 key=key,
-                offset=s["offset"]
+                offset=offset
             ))
         logger.debug("Sensors initialization completed. Total sensors: {} {}".format(len(self.sensors), self.sensors))
 
@@ -163,52 +336,164 @@ class RobotSDK:
 
     def _init_motion(self):
         """Initialize motion data."""
-        if "poses" in self.configuration:
-            self.poses = self.configuration["poses"]
-            logger.debug("Loaded {} poses from configuration".format(len(self.poses)))
-        if "motion_file" in self.configuration:
-            self.load_motion_from_file(self.configuration["motion_file"])
+        if "motion_file" in self.configuration:  # Already read and validated by CompiledConfiguration
+            self.motion_path = self.compiled_configuration.motion_path
+            self.trajectory_compiler.invalidate()
+            self._set_motion_configuration(self.compiled_configuration.motion_configuration)
         elif self.motion_path is None:
             # Motion file probably not exist
             self.motion_path = self.config_path.replace(".json", "_motion.json")
-            self.motion_configuration = {
+            if os.path.isfile(self.motion_path):  # Saved by a previous session, its journal is replayed on it
+                self.load_motion_from_file(self.motion_path)
+                return
+            self._set_motion_configuration({
                 "id": self.configuration["id"],
                 "version": self.configuration["version"],
-                "poses": self.poses if self.poses is not None else {},
+                "poses": {},
                 "performances": {}
-            }
+            })
+
+    def add_motor(self, motor: Motor):
+        """
+        Add a motor to the robot and index it by key and id.
+        :param motor: the motor to add.
+        """
+        self._check_components_index()
+        self.motors.append(motor)
+        self._adopt_motor(motor)
+        self._index_component(self._motors_by_key, motor.key, motor)
+        self._index_component(self._motors_by_id, motor.id, motor)
+        self._indexed_components = (len(self.motors), len(self.sensors))
+
+    def add_sensor(self, sensor: Sensor):
+        """
+        Add a sensor to the robot and index it by key and id.
+        :param sensor: the sensor to add.
+        """
+        self._check_components_index()
+        self.sensors.append(sensor)
+        sensor._store = self.motors_store
+        self._index_component(self._sensors_by_key, sensor.key, sensor)
+        self._index_component(self._sensors_by_id, sensor.id, sensor)
+        self._indexed_components = (len(self.motors), len(self.sensors))
+
+    def _adopt_motor(self, motor: Motor):
+        """
+        Move the state of a motor in the robot MotorsStore, with its max step based on the motor type angle_speed.
+        :param motor: the motor to adopt.
+        """
+        if motor._store is self.motors_store:
+            return
+        motors_type = self.configuration["motors_type"]
+        if motor.motor_type not in motors_type:
+            logger.error("add_motor: motor type '{}' not in motors_type".format(motor.motor_type))
+            raise RobotKeyError("add_motor: motor type '{}' not in motors_type".format(motor.motor_type))
+        max_step = 0.0
+        if self._motors_check_per_second > 0:
+            max_step = motors_type[motor.motor_type]["angle_speed"] / self._motors_check_per_second
+        self.motors_store.adopt(motor, max_step)
+
+    @staticmethod
+    def _index_component(index: dict, identifier: str, component):
+        """
+        Add a component to a lookup index. Duplicated identifiers are mapped to None, so they are never found.
+        :param index: lookup dict to update.
+        :param identifier: key or id of the component.
+        :param component: motor or sensor.
+        """
+        index[identifier] = None if identifier in index else component
+
+    def _check_components_index(self):
+        """
+        Rebuild lookup indexes if motors or sensors lists have been changed without add_motor() or add_sensor().
+        """
+        if self._indexed_components == (len(self.motors), len(self.sensors)):
+            return
+        self._motors_by_key = {}
+        self._motors_by_id = {}
+        self._sensors_by_key = {}
+        self._sensors_by_id = {}
+        for m in self.motors:
+            self._adopt_motor(m)
+            self._index_component(self._motors_by_key, m.key, m)
+            self._index_component(self._motors_by_id, m.id, m)
+        for s in self.sensors:
+            self._index_component(self._sensors_by_key, s.key, s)
+            self._index_component(self._sensors_by_id, s.id, s)
+        self._indexed_components = (len(self.motors), len(self.sensors))
 
     def get_motor(self, key: str) -> Motor:
         """
         :param key: key to use to find the motor.
         :return: motor if found or None.
         """
-        found = [m for m in self.motors if m.key == key]
-        return found[0] if len(found) == 1 else None
+        self._check_components_index()
+        return self._motors_by_key.get(key)
 
     def get_motor_by_id(self, identifier: str) -> Motor:
         """
         :param identifier: id to use to find the motor.
         :return: motor if found or None.
         """
-        found = [m for m in self.motors if m.id == identifier]
-        return found[0] if len(found) == 1 else None
+        self._check_components_index()
+        return self._motors_by_id.get(identifier)
+
+    def set_goal_angles(self, goal_angles) -> dict:
+        """
+        Set the goal angle of many motors as a single update: angle limits are applied in bulk and the status never
+        shows only a part of the new goals. Unknown keys and, in a dict, angles that are not finite numbers raise
+        RobotKeyError before any motor is changed.
+        :param goal_angles: dict of {"key": goal_angle}, or list of goal angles in the order of self.motors
+            (None or NaN to leave a motor unchanged).
+        :return: dict of {"key": goal_angle} set, after the angle limits.
+        """
+        self._check_components_index()
+        if isinstance(goal_angles, dict):
+            motors = []
+            for key in goal_angles:
+                m = self._motors_by_key.get(key)
+                if m is None:
+                    raise RobotKeyError("set_goal_angles: motor '{}' not found".format(key))
+                motors.append(m)
+            angles = [float(a) for a in goal_angles.values()]
+            for key, a in zip(goal_angles, angles):
+                if not math.isfinite(a):
+                    raise RobotKeyError("set_goal_angles: motor '{}' goal angle must be a finite number, got {}"
+                                        .format(key, a))
+        else:
+            if len(goal_angles) != len(self.motors):
+                raise RobotKeyError("set_goal_angles: {} angles for {} motors".format(len(goal_angles),
+                                                                                      len(self.motors)))
+            motors = []
+            angles = []
+            for m, a in zip(self.motors, goal_angles):
+                if a is not None and a == a:
+                    motors.append(m)
+                    angles.append(float(a))
+        clamped = self.motors_store.set_goals([m._index for m in motors], angles,
+                                              [m._index for m in motors if m.instant_mode])
+        result = {}
+        for m, angle, goal in zip(motors, angles, clamped):
+            if angle != goal:
+                logger.warning("{}: set_goal_angles: {:.2f} -> {:.2f}".format(m.key, angle, goal))
+            result[m.key] = goal
+        return result
 
     def get_sensor(self, key: str) -> Sensor:
         """
         :param key: key to use to find the sensor.
         :return: sensor if found or None.
         """
-        found = [s for s in self.sensors if s.key == key]
-        return found[0] if len(found) == 1 else None
+        self._check_components_index()
+        return self._sensors_by_key.get(key)
 
     def get_sensor_by_id(self, identifier: str) -> Sensor:
         """
         :param identifier: id to use to find the sensor.
         :return: sensor if found or None.
         """
-        found = [s for s in self.sensors if s.id == identifier]
-        return found[0] if len(found) == 1 else None
+        self._check_components_index()
+        return self._sensors_by_id.get(identifier)
 
     def set_twist(self, linear: TwistVector, angular: TwistVector):
         """
@@ -218,6 +503,8 @@ class RobotSDK:
         """
         self.twist.linear = linear
         self.twist.angular = angular
+        self.commit_state_snapshot()
+        self.status_cache.invalidate()
 
     def get_twist_dict(self) -> dict:
         """
@@ -232,43 +519,62 @@ class RobotSDK:
         """
         logger.debug("Reading performances from file: {}".format(path))
         self.motion_path = path
+        self.trajectory_compiler.invalidate()
         try:
             with open(self.motion_path) as f:
-                self.motion_configuration = json.load(f)
-                if "poses" in self.motion_configuration:
-                    if type(self.poses) == dict:
-                        x = self.poses.copy()
-                        x.update(self.motion_configuration["poses"])
-                        self.poses = x
-                        self.motion_configuration["poses"] = self.poses
-                    else:
-                        self.poses = self.motion_configuration["poses"]
-                    logger.debug("Loaded {} poses from motion configuration".format(len(self.poses)))
+                self._set_motion_configuration(json.load(f))
         except Exception as e:
             logger.error(traceback.format_exc())
             logger.error("Motion configuration error: exception: {}".format(e))
             print("Motion configuration error: exception: {}".format(e))
             raise RobotSDKInitError("Motion configuration error: exception: {}".format(e))
 
+    def _set_motion_configuration(self, motion_configuration: dict):
+        """
+        Use a motion configuration. Its poses are indexed by a PoseStore (changes saved in the journal of the motion
+        file) and merged with the poses of the robot configuration.
+        :param motion_configuration: motion configuration.
+        """
+        if self.poses is not None:
+            self.poses.close()
+        self.motion_configuration = motion_configuration
+        self.poses = PoseStore(self.motion_path, motion_configuration.get("poses", {}), motion_configuration)
+        for name, pose in self.configuration.get("poses", {}).items():
+            if name not in self.poses:  # Poses of the motion file win
+                self.poses.set(name, pose, persist=False)
+        self.motion_configuration["poses"] = self.poses
+        logger.debug("Loaded {} poses from motion configuration: {}".format(len(self.poses), self.poses))
+
+    def get_motion_configuration(self) -> dict:
+        """
+        :return: motion configuration with performances and poses, JSON serializable.
+        """
+        if self.motion_configuration is None:
+            return None
+        return dict(self.motion_configuration, poses=self.poses.to_dict())
+
     def save_motion_file(self, path: str = None):
         """
-        Write the JSON file performances and poses configuration to path.
-        :param path: SimplePYBotSDK json performances file path.
+        Write the JSON file performances and poses configuration to path. The file is replaced atomically.
+        :param path: SimplePYBotSDK json performances file path. Default is the motion file: its journal is compacted.
+        :raise OSError: if the file can not be written.
         """
-        if path is None:
-            path = self.motion_path
+        if path is None or path == self.motion_path:
+            logger.info("save_motion_file: compacting poses to file {}".format(self.motion_path))
+            self.poses.compact()
+            return
         logger.info("save_motion_file: saving to file {}".format(path))
-        with open(path, "w") as f:  # Motion path from config file or new one created in _init_motion
-            f.write(json.dumps(self.motion_configuration, indent=2))
+        write_json_atomic(path, self.get_motion_configuration(), indent=2)
 
     def create_pose(self, pose_name: str, pose_dict: dict, save_to_motion_file: bool = True):
         """
         Method to create or override a pose.
+        The change is appended to the journal of the motion file in background, see PoseStore.
         :param pose_name: the name of the new pose.
         :param pose_dict: dict of {"key": goal_angle, "key": goal_angle}.
         :param save_to_motion_file: if True will edit the motion file or create if not exist.
         """
-        if self.poses is not None and pose_name in self.poses:
+        if pose_name in self.poses:
             logger.warning("create_pose: pose with key '{}' overwritten".format(pose_name))
 
         for item in pose_dict:
@@ -276,42 +582,41 @@ class RobotSDK:
             if m is None:
                 logger.warning("create_pose: motor with key '{}' not exist".format(item))
                 raise RobotKeyError("create_pose: motor with key '{}' not exist".format(item))
-        self.poses[pose_name] = pose_dict
-        self.motion_configuration["poses"] = self.poses
+        self.poses.set(pose_name, pose_dict, persist=save_to_motion_file)
+        self.trajectory_compiler.invalidate()
         logger.info("create_pose: new pose with key '{}' added. {}".format(pose_name, pose_dict))
-        if save_to_motion_file:
-            self.save_motion_file()
 
     def delete_pose(self, pose_name: str, save_to_motion_file: bool = True):
         """
         Method to delete a pose.
+        The change is appended to the journal of the motion file in background, see PoseStore.
         :param pose_name: the name of the pose to delete.
         :param save_to_motion_file: if True will edit the motion file or create if not exist.
         """
-        if self.poses is not None and pose_name in self.poses:
-            del self.poses[pose_name]
-            self.motion_configuration["poses"] = self.poses
+        if pose_name in self.poses:
+            self.poses.delete(pose_name, persist=save_to_motion_file)
+            self.trajectory_compiler.invalidate()
             logger.info("delete_pose: pose with key '{}' deleted".format(pose_name))
-            if save_to_motion_file:
-                self.save_motion_file()
         else:
             logger.warning("delete_pose: pose with key '{}' not exist".format(pose_name))
             raise RobotKeyError("delete_pose: pose with key '{}' not exist".format(pose_name))
 
-    def go_to_pose(self, pose_name: str, seconds: float = 0, blocking: bool = False):
+    def go_to_pose(self, pose_name: str, seconds: float = 0, blocking: bool = False, profile: str = None):
         """
         Method to move the robot in a specific pose defined in the configuration file.
         :param pose_name: name of the pose.
         :param seconds: duration in seconds of the simultaneous movement.
-        :param blocking: if False start a dedicated thread to handle the movements.
+        :param blocking: if True wait until the movement is done.
+        :param profile: interpolation profile: "linear", "cubic", "minimum_jerk" or "trapezoidal".
+            Default is configurations.MOTION_PROFILE.
         """
         if self.poses is not None:
             if pose_name in self.poses:
                 pose = self.poses[pose_name]
                 logger.info("go_to_pose: {}".format(pose_name))
                 if seconds == 0:
-                    blocking = True  # Avoid starting the thread
-                self.move_point_to_point(pose, seconds, blocking)
+                    blocking = True  # Pose is reached on the next scheduler tick
+                self.move_point_to_point(pose, seconds, blocking, profile)
                 return True
             else:
                 logger.error("go_to_pose: pose '{}' not found".format(pose_name))
@@ -319,135 +624,190 @@ class RobotSDK:
             logger.error("go_to_pose: no poses loaded")
         return False
 
-    def move_point_to_point(self, motors_goal: dict, seconds: float, blocking: bool = False):
+    def move_point_to_point(self, motors_goal: dict, seconds: float, blocking: bool = False,
+                            profile: str = None) -> MotionHandle:
         """
         Method to move several motors simultaneously towards the goal angle position.
-        This method calc the future positions of the motors and then use _exec_point_to_point().
+        This method compiles the future positions of the motors (see TrajectoryCompiler) and then submit the movement
+        to the motion scheduler.
+        If a motor is already moving because of another point to point, the newest movement wins.
         :param motors_goal: dict of {"key": goal_angle, "key": goal_angle}.
         :param seconds: duration in seconds of the simultaneous movement.
-        :param blocking: if False start a dedicated thread to handle the movements.
+        :param blocking: if True wait until the movement is done.
+        :param profile: interpolation profile: "linear", "cubic", "minimum_jerk" or "trapezoidal".
+            Default is configurations.MOTION_PROFILE.
+        :return: MotionHandle to cancel or wait the movement.
         """
         logger.info("move_point_to_point: {} in {} sec".format(motors_goal, seconds))
-        point_to_point = []
-        for item in motors_goal:
-            m = self.get_motor(item)
-            if m is None:
-                logger.warning("move_point_to_point: motor with key '{}' not found".format(item))
-                continue
-
-            goal = motors_goal[item]
-            current = m.get_goal_angle()
-            difference = goal - current
-            point_to_point.append({
-                "key": item,
-                "start": current,
-                "step": difference / ((seconds * self._motors_point_to_point_check_per_second) if seconds != 0 else 1)
-            })
-
+        trajectory = self.trajectory_compiler.compile_move(motors_goal, seconds, profile)
         if self._record_point_to_point is not None:  # If recording save method input
-            self._point_to_point_session.append(
-                (motors_goal, seconds, round(time.time() - self._record_point_to_point, 3)))
+            if self.recorder is not None:
+                self.recorder.write_point_to_point(motors_goal, seconds, profile)
+            else:
+                if len(self._point_to_point_session) == self._point_to_point_session.maxlen:
+                    logger.warning("move_point_to_point: recording limit reached, oldest movement dropped")
+                self._point_to_point_session.append(
+                    (motors_goal, seconds, round(time.monotonic() - self._record_point_to_point, 3)))
 
-        number_of_steps = self._motors_point_to_point_check_per_second * seconds if seconds != 0 else 1
+        logger.debug("move_point_to_point: submit {}".format(trajectory))
+        handle = self._motion_scheduler.submit(MotionHandle(trajectory))
         if blocking:
-            logger.debug("_exec_point_to_point with {} steps: {}".format(number_of_steps, point_to_point))
-            self._exec_point_to_point(point_to_point, number_of_steps)
-        else:
-            logger.debug("_exec_point_to_point thread with {} steps: {}".format(number_of_steps, point_to_point))
-            threading.Thread(target=self._exec_point_to_point, args=(point_to_point, number_of_steps,)).start()
-
-    def _exec_point_to_point(self, point_to_point: list, number_of_steps: int):
-        """
-        Auxiliary method to handle the movement of several motors simultaneously.
-        :param point_to_point: list of {"key": key, "start": start, "step": step}.
-        :param number_of_steps: duration in seconds of the simultaneous movement.
-        """
-        step = 0
-        last_time = 0
-        while step < number_of_steps:
-            if (time.time() - last_time) > (1 / self._motors_point_to_point_check_per_second) / self.robot_speed:
-                last_time = time.time()
-                step = step + 1
-                for move in point_to_point:
-                    self.get_motor(move["key"]).set_goal_angle(move["start"] + move["step"] * step)
-                # Avoid wasting CPU time
-                time.sleep(
-                    (self.sleep_avoid_cpu_waste / self._motors_point_to_point_check_per_second) / self.robot_speed)
+            handle.wait()
+        return handle
+
+    def play_performance(self, performance_name: str, blocking: bool = False, profile: str = None,
+                         loop: bool = False, speed: float = 1.0) -> PlaybackHandle:
+        """
+        Method to play a performance defined in the motion file.
+        The playback follows an absolute timeline scaled by speed and robot_speed: use the returned handle to pause,
+        resume, seek or cancel it.
+        :param performance_name: name of the performance.
+        :param blocking: if True wait until the performance is done.
+        :param profile: interpolation profile of the pose steps without a "profile". See move_point_to_point().
+        :param loop: if True the performance restarts when the end is reached.
+        :param speed: playback speed, multiplied by robot_speed.
+        :return: PlaybackHandle to control the performance.
+        """
+        logger.info("play_performance: {}".format(performance_name))
+        self._check_playback_value("play_performance", "speed", speed, positive=True)
+        trajectory = self.trajectory_compiler.compile_performance(performance_name, profile)
+        return self._play(PlaybackHandle(trajectory, performance_name, lambda: self.robot_speed, loop, speed),
+                          blocking)
+
+    def _play(self, handle: PlaybackHandle, blocking: bool) -> PlaybackHandle:
+        """
+        Submit a playback to the motion scheduler.
+        :param handle: the playback.
+        :param blocking: if True wait until the playback is done.
+        :return: the same handle.
+        """
+        self._playback = handle
+        self._motion_scheduler.submit(handle)
+        if blocking:
+            handle.wait()
+        return handle
 
-    def point_to_point_start_recording(self):
+    @staticmethod
+    def _check_playback_value(method: str, name: str, value, positive: bool = False):
+        """
+        Raise RobotKeyError if a playback speed or seek is not a finite number, or not positive when required.
+        :param method: name of the caller method. Used in the error message.
+        :param name: name of the value.
+        :param value: the value to check.
+        :param positive: if True the value must be greater than 0.
+        """
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or \
+                (positive and value <= 0):
+            raise RobotKeyError("{}: {} must be a {}number, got {}".format(
+                method, name, "positive " if positive else "", repr(value)))
+
+    def get_playback(self) -> PlaybackHandle:
+        """
+        :return: the last performance or recording playback started, None if nothing was played.
+        """
+        return self._playback
+
+    def control_playback(self, action: str = None, seek: float = None, speed: float = None,
+                         loop: bool = None) -> dict:
+        """
+        Control the last playback started. Used by REST and JSON commands.
+        :param action: "pause", "resume" or "cancel". None to leave it unchanged.
+        :param seek: new position in seconds. None to leave it unchanged.
+        :param speed: new playback speed. None to leave it unchanged.
+        :param loop: new loop flag. None to leave it unchanged.
+        :return: playback status.
+        """
+        playback = self._playback
+        if playback is None:
+            raise RobotKeyError("control_playback: no performance or recording played")
+        if action not in (None, "pause", "resume", "cancel"):
+            raise RobotKeyError("control_playback: unknown action '{}'. Use pause, resume or cancel".format(action))
+        if seek is not None:
+            self._check_playback_value("control_playback", "seek", seek)
+        if speed is not None:
+            self._check_playback_value("control_playback", "speed", speed, positive=True)
+        if seek is not None:
+            playback.seek(seek)
+        if speed is not None:
+            playback.speed = speed
+        if loop is not None:
+            playback.loop = loop
+        if action is not None:
+            getattr(playback, action)()
+            logger.info("control_playback: {} {}".format(action, playback))
+        return playback.get_status()
+
+    def point_to_point_start_recording(self, path: str = None, sample_per_second: float = 0, **recorder_options):
         """
         Start to save all point to point position received by the method move_point_to_point() or go_to_pose()
+        Without path the recording is kept in memory, up to configurations.POINT_TO_POINT_RECORDING_LIMIT movements.
+        With path the recording is streamed to a JSON Lines file, see Recorder and RecordingReader.
+        :param path: recording file path. None to record in memory.
+        :param sample_per_second: with path, also record the motors angles this many times per second.
+        :param recorder_options: with path, Recorder options: fsync_interval, max_bytes, max_seconds.
         """
         logger.debug("point_to_point_start_recording: start recording")
-        self._point_to_point_session = []
-        self._record_point_to_point = time.time()
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        self._point_to_point_session = deque(maxlen=configurations.POINT_TO_POINT_RECORDING_LIMIT)
+        if path is not None:
+            self.recorder = Recorder(self, path, sample_per_second, **recorder_options)
+        self._record_point_to_point = time.monotonic()
 
     def point_to_point_stop_recording(self) -> list:
         """
         Stop recording point to point position and return the list.
         The list is composed by (motors_goal, duration in second, time_since_start).
-        :return: list of motors with absolute angle, id and key.
+        If the recording was streamed to a file the list is empty: use RecordingReader(robot.recorder.paths).
+        :return: list of (motors_goal, duration in second, time_since_start).
         """
         logger.debug("point_to_point_stop_recording: Total step recorded: {}".format(len(self._point_to_point_session)))
         self._record_point_to_point = None
-        return self._point_to_point_session
+        if self.recorder is not None:
+            self.recorder.close()
+        return list(self._point_to_point_session)
 
-    def point_to_point_play_recorded(self, animation: list, blocking=True):
+    def point_to_point_play_recorded(self, animation: list, blocking=True, loop: bool = False,
+                                     speed: float = 1.0) -> PlaybackHandle:
         """
-        Start to save all point to point position received by the method move_point_to_point()
+        Play the point to point positions recorded with point_to_point_start_recording().
+        Every movement starts at its time_since_start on an absolute timeline, like play_performance().
         :param animation: list of (motors_goal, duration in second, time_since_start).
-        :param blocking: if False start a dedicated thread to handle each point to point movement.
+        :param blocking: if True wait until the end of the recording.
+        :param loop: if True the recording restarts when the end is reached.
+        :param speed: playback speed, multiplied by robot_speed.
+        :return: PlaybackHandle to control the playback.
         """
         if self._record_point_to_point is not None:
             logger.error("point_to_point_reward_recorded: you need to stop recording first")
-            return
+            return None
 
-        previous_time = 0
-        for (motors_goal, seconds, time_since_start) in animation:
-            time.sleep(time_since_start - previous_time)
-            self.move_point_to_point(motors_goal, seconds, blocking=blocking)
-            previous_time = seconds + time_since_start
+        self._check_playback_value("point_to_point_play_recorded", "speed", speed, positive=True)
+        trajectory = self.trajectory_compiler.compile_recording(animation)
+        return self._play(PlaybackHandle(trajectory, "recording", lambda: self.robot_speed, loop, speed), blocking)
 
     def get_motors_list_abs_angles(self) -> list:
         """
-        :return: list of motors with absolute angle, id and key.
+        :return: list of motors with absolute angle, id and key, from the last StateSnapshot. Goals set with
+            set_goal_angle() or set_goal_angles() are returned at once, motors moving toward the goal and point to point
+            playbacks are updated once per motors thread tick, see get_state_snapshot().
         """
-        motors = []
-        for m in self.motors:
-            motors.append({
-                "id": m.id,
-                "key": m.key,
-                "abs_goal_angle": round(m.abs_goal_angle, 1),
-                "abs_current_angle": round(m.abs_current_angle, 1)
-            })
-        return motors
+        return [dict(m) for m in self.get_state_snapshot().get_motors_list(absolute=True)]
 
     def get_motors_list_relative_angles(self) -> list:
         """
-        :return: list of motors with relative angle, id and key.
+        :return: list of motors with relative angle, id and key, from the last StateSnapshot. Like
+            get_motors_list_abs_angles(), moving motors are updated once per motors thread tick.
         """
-        motors = []
-        for m in self.motors:
-            motors.append({
-                "id": m.id,
-                "key": m.key,
-                "goal_angle": round(m.to_relative_angle(m.abs_goal_angle), 1),
-                "current_angle": round(m.to_relative_angle(m.abs_current_angle), 1)
-            })
-        return motors
+        return [dict(m) for m in self.get_state_snapshot().get_motors_list(absolute=False)]
 
     def get_sensors_list(self) -> list:
         """
-        :return: list of sensors with their value.
+        :return: list of sensors with their value, from the last StateSnapshot. Values set with Sensor.set_value()
+            are returned at once.
         """
-        sensors = []
-        for s in self.sensors:
-            sensors.append({
-                "id": s.id,
-                "key": s.key,
-                "value": s.get_value()
-            })
-        return sensors
+        return [dict(s) for s in self.get_state_snapshot().get_sensors_list()]
 
     def get_sdk_infos(self) -> dict:
         """
@@ -467,15 +827,35 @@ class RobotSDK:
             "timestamp": datetime.now().isoformat()
         }
 
-    def get_robot_dict_status(self, absolute: bool = False) -> dict:
+    def get_robot_dict_status(self, absolute: bool = False, snapshot: StateSnapshot = None) -> dict:
         """
         :param absolute: angle absolute or relative.
+        :param snapshot: StateSnapshot to dump. Default is the last one, see get_state_snapshot(): moving motors are
+            updated once per motors thread tick.
         :return: dict dump of current state of the robot.
         """
+        dict_robot = self._get_robot_dict_status(absolute, snapshot)
+        dict_robot["motors"] = [dict(m) for m in dict_robot["motors"]]
+        dict_robot["sensors"] = [dict(s) for s in dict_robot["sensors"]]
+        twist = dict_robot["twist"]
+        if twist is not None:
+            dict_robot["twist"] = dict(twist, linear=dict(twist["linear"]), angular=dict(twist["angular"]))
+        return dict_robot
+
+    def _get_robot_dict_status(self, absolute: bool, snapshot: StateSnapshot = None) -> dict:
+        """
+        Like get_robot_dict_status(), but motors, sensors and twist are the lists of the snapshot, shared between
+        callers. Used by StatusCache, that encodes them once for all the clients.
+        :param absolute: angle absolute or relative.
+        :param snapshot: StateSnapshot to dump. Default is the last one, see get_state_snapshot().
+        :return: dict dump of current state of the robot. Do not modify motors, sensors and twist.
+        """
+        if snapshot is None:
+            snapshot = self.get_state_snapshot()
         dict_robot = {
-            "motors": self.get_motors_list_abs_angles() if absolute else self.get_motors_list_relative_angles(),
-            "sensors": self.get_sensors_list(),
-            "twist": self.get_twist_dict(),
+            "motors": snapshot.get_motors_list(absolute),
+            "sensors": snapshot.get_sensors_list(),
+            "twist": snapshot.get_twist_dict(),
             "format": "absolute" if absolute else "relative",
             "sdk": self.get_sdk_infos(),
             "system": self.get_system_infos()
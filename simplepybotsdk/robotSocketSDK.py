@@ -1,14 +1,19 @@
+import asyncio
 import logging
 import threading
 import json
-import time
 import socket
+import time
 from select import select
 import traceback
 
 import simplepybotsdk.configurations as configurations
 from simplepybotsdk.robotSDK import RobotSDK as RobotSDK
+from simplepybotsdk.exceptions import RobotSDKInitError
 from simplepybotsdk.parserJSONCommands import ParserJSONCommands
+from simplepybotsdk.statusStream import ClientStream
+from simplepybotsdk.admissionControl import AdmissionControl
+from simplepybotsdk.binaryStatus import pack_frame
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +23,7 @@ class RobotSocketSDK(RobotSDK):
 
     def __init__(self, config_path: str, socket_host: str, socket_port: int, robot_speed: float = 1.0,
                  motors_check_per_second: int = None, motors_point_to_point_check_per_second: int = None,
-                 socket_send_per_second: int = None):
+                 socket_send_per_second: int = None, socket_mode: str = None):
         """
         :param config_path: SimplePYBotSDK json configuration file path.
         :param socket_host: socket host to listen.
@@ -27,15 +32,28 @@ class RobotSocketSDK(RobotSDK):
         :param motors_check_per_second: numbers of motor's check per second. Set to 0 to disable dedicated thread.
         :param motors_point_to_point_check_per_second: numbers of motor's movement in a second during point to point.
         :param socket_send_per_second: numbers of dump send to the socket client in 1 second.
+        :param socket_mode: "thread" to handle every client with a dedicated thread, "asyncio" to handle all the
+            clients with a single event loop. Default is configurations.SOCKET_MODE.
         """
         super().__init__(config_path, robot_speed, motors_check_per_second, motors_point_to_point_check_per_second)
         self._socket_host = socket_host
         self._socket_port = socket_port
         self._socket_send_per_second = socket_send_per_second
+        self._socket_mode = socket_mode
         self.message_parsers = []
         self._socket_threaded_connection = []
+        self._socket_clients = {}  # asyncio mode: StreamWriter -> [ClientStream, addr, last activity]
+        self.socket_admission = AdmissionControl.from_configuration("socket_thread", self.configuration, "socket")
+        self._socket_loop = None
+        self._socket_send_seconds = self.metrics.histogram(
+            "send_seconds", "Time to hand a message to a client transport", transport="socket")
+        self._socket_bytes_sent = self.metrics.counter("bytes_sent_total", "Bytes sent to clients", transport="socket")
         if self._socket_send_per_second is None:
             self._socket_send_per_second = configurations.SOCKET_SEND_PER_SECOND
+        if self._socket_mode is None:
+            self._socket_mode = configurations.SOCKET_MODE
+        if self._socket_mode not in ("thread", "asyncio"):
+            raise RobotSDKInitError("RobotSocketSDK: unknown socket_mode '{}'".format(self._socket_mode))
 
         if self._socket_send_per_second <= 0:
             logger.debug("RobotSocketSDK disabled")
@@ -45,7 +63,11 @@ class RobotSocketSDK(RobotSDK):
 
         logger.debug("RobotSocketSDK initialization")
 
-        self._thread_socket = threading.Thread(name="socket_thread", target=self._socket_thread_handler, args=())
+        if self._socket_mode == "asyncio":
+            self._thread_socket = threading.Thread(name="socket_thread", target=self._socket_asyncio_thread_handler,
+                                                   args=())
+        else:
+            self._thread_socket = threading.Thread(name="socket_thread", target=self._socket_thread_handler, args=())
         self._thread_socket.daemon = True
         self._thread_socket.start()
 
@@ -64,6 +86,11 @@ class RobotSocketSDK(RobotSDK):
 
         while True:
             c, addr = self._socket.accept()
+            reason = self.socket_admission.admit(addr)
+            if reason is not None:
+                self._socket_decline(c, addr, reason)
+                continue
+            self._socket_threaded_connection = [t for t in self._socket_threaded_connection if t.is_alive()]
             thread = threading.Thread(target=self._socket_thread_connection_handler, args=(c, addr,))
             thread.name = "socket_thread_client_handler_{}".format(addr[1])
             thread.daemon = True
@@ -78,46 +105,261 @@ class RobotSocketSDK(RobotSDK):
         :param addr: tuple with ip and socket of the client connected.
         """
         thread_name = threading.current_thread().name
+        evicted = False
         try:
             logger.info("[{}]: got connection from: {}".format(thread_name, addr))
             if self.show_log_message:
                 print("[{}]: got connection from: {}".format(thread_name, addr))
-            last_time = 0
-            absolute = False
+            ticker = self.create_ticker(thread_name, lambda: self._socket_send_per_second)
+            stream = self.socket_admission.create_stream()
+            last_activity = time.monotonic()
             while True:
-                if (time.time() - last_time) > (1 / self._socket_send_per_second):
-                    last_time = time.time()
-                    got_message, message = self._socket_connect_return_json_if_received(conn, addr)
-                    if got_message:
-                        if "socket" in message and "format" in message["socket"]:
-                            f = message["socket"]["format"]
-                            if f == "absolute":
-                                logger.debug("[{}]: connection: {} now use format: {}".format(thread_name, addr, f))
-                                absolute = True
-                            if f == "relative":
-                                logger.debug("[{}]: connection: {} now use format: {}".format(thread_name, addr, f))
-                                absolute = False
-                        self.socket_recv_callback(message, addr, conn)
-                        for mp in self.message_parsers:
-                            mp_instance = mp(self)
-                            response = mp_instance(message)
-                            if response is not None:
-                                conn.send(json.dumps(response).encode("utf-8"))
-                    conn.send(json.dumps({
-                        "type": "R2C",
-                        "data": {
-                            "area": "status",
-                            "action": "live_status",
-                            "value": self.get_robot_dict_status(absolute=absolute)
-                        }}).encode("utf-8"))
-                    time.sleep(self.sleep_avoid_cpu_waste / self._socket_send_per_second)  # Avoid wasting CPU time
+                ticker.sleep()
+                got_message, message = self._socket_connect_return_json_if_received(conn, addr)
+                if got_message:
+                    last_activity = time.monotonic()
+                    for response in self._socket_handle_message(message, stream, addr, conn):
+                        self._socket_send(conn, stream, response)
+                elif self.socket_admission.is_idle(last_activity):
+                    evicted = True
+                    self._socket_send(conn, stream, AdmissionControl.get_message("evicted", "Idle timeout"))
+                    raise ConnectionAbortedError("Idle timeout")
+                if stream.ready():
+                    self._socket_send(conn, stream, stream.encode_status(self.status_cache))
         except Exception as e:
             logger.info("[{}]: connection closed with {}. {}".format(thread_name, addr, e))
             if self.show_log_message:
                 print("[{}]: connection closed with {}. {}".format(thread_name, addr, e))
+        finally:
+            self.socket_admission.release(addr, evicted)
+            self.remove_ticker(thread_name)
+            conn.close()
+
+    def _socket_decline(self, conn, addr: tuple, reason: str):
+        """
+        Send the reason of the rejection to a client, then close the connection.
+        :param conn: socket connection instance.
+        :param addr: tuple with ip and socket of the client.
+        :param reason: reason of the rejection.
+        """
+        if self.show_log_message:
+            print("[socket_thread]: connection refused to {}. {}".format(addr, reason))
+        try:
+            conn.settimeout(1)
+            conn.sendall(AdmissionControl.get_message("rejected", reason))
+        except Exception as e:
+            logger.debug("[socket_thread]: fail to send rejection to {}. {}".format(addr, e))
         finally:
             conn.close()
 
+    def get_connections_stats(self) -> dict:
+        """
+        :return: dict of {transport name: admission control stats}.
+        """
+        stats = super().get_connections_stats()
+        stats["socket"] = self.socket_admission.get_stats()
+        return stats
+
+    def _socket_handle_message(self, message: dict, stream: ClientStream, addr: tuple, conn) -> list:
+        """
+        Handle a message received from a client: stream settings, socket_recv_callback() and message parsers.
+        :param message: json message received.
+        :param stream: stream settings of the client.
+        :param addr: tuple with ip and socket of the client that send the message.
+        :param conn: the socket connection (a StreamWriter in asyncio mode).
+        :return: list of encoded responses to send to the client.
+        """
+        self._socket_handle_stream(message, stream, addr, conn)
+        return self._socket_parse_message(message)
+
+    def _socket_handle_stream(self, message: dict, stream: ClientStream, addr: tuple, conn):
+        """
+        Apply the stream settings of a message and call socket_recv_callback().
+        :param message: json message received.
+        :param stream: stream settings of the client.
+        :param addr: tuple with ip and socket of the client that send the message.
+        :param conn: the socket connection (a StreamWriter in asyncio mode).
+        """
+        if stream.handle_message(message):
+            logger.debug("[socket_thread]: connection: {} now use format: {} stream: {}"
+                         .format(addr, stream.format, stream.stream))
+        self.socket_recv_callback(message, addr, conn)
+
+    def _socket_parse_message(self, message: dict) -> list:
+        """
+        Run the message parsers. In asyncio mode it runs in the executor of the event loop, because parsers can
+        block (example: a blocking point to point movement).
+        :param message: json message received.
+        :return: list of encoded responses to send to the client.
+        """
+        responses = []
+        for mp in self.message_parsers:
+            mp_instance = mp(self)
+            response = mp_instance(message)
+            if response is not None:
+                responses.append(json.dumps(response).encode("utf-8"))
+        return responses
+
+    def _socket_asyncio_thread_handler(self):
+        """
+        Thread method that runs the asyncio event loop serving all the socket clients.
+        """
+        logger.debug("[socket_thread]: start asyncio server on {}".format((self._socket_host, self._socket_port)))
+        self._socket_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._socket_loop)
+        self._socket = self._socket_loop.run_until_complete(asyncio.start_server(
+            self._socket_asyncio_client_handler, self._socket_host, self._socket_port,
+            backlog=configurations.SOCKET_INCOMING_LIMIT))
+        if self.show_log_message:
+            print("[socket_thread]: listening for connections on {} (asyncio)"
+                  .format((self._socket_host, self._socket_port)))
+        self._socket_loop.create_task(self._socket_asyncio_broadcast_handler())
+        self._socket_loop.run_forever()
+
+    async def _socket_asyncio_client_handler(self, reader, writer):
+        """
+        Coroutine that reads the messages of a single client. Status messages are sent by the broadcast coroutine.
+        :param reader: asyncio StreamReader of the client.
+        :param writer: asyncio StreamWriter of the client.
+        """
+        addr = writer.get_extra_info("peername")
+        reason = self.socket_admission.admit(addr)
+        if reason is not None:
+            if self.show_log_message:
+                print("[socket_thread]: connection refused to {}. {}".format(addr, reason))
+            writer.write(AdmissionControl.get_message("rejected", reason))
+            writer.close()
+            return
+        stream = self.socket_admission.create_stream()
+        client = [stream, addr, time.monotonic()]
+        self._socket_clients[writer] = client
+        logger.info("[socket_thread]: got connection from: {}".format(addr))
+        if self.show_log_message:
+            print("[socket_thread]: got connection from: {}".format(addr))
+        buffer = ""
+        try:
+            while True:
+                data = await reader.read(8196)
+                if len(data) == 0:
+                    break
+                client[2] = time.monotonic()
+                messages, buffer = self._socket_decode_messages(buffer + data.decode("utf-8"), addr)
+                for message in messages:
+                    self._socket_handle_stream(message, stream, addr, writer)
+                    responses = await self._socket_loop.run_in_executor(None, self._socket_parse_message, message)
+                    if writer not in self._socket_clients:
+                        return  # Dropped while the parsers were running
+                    for response in responses:
+                        self._socket_asyncio_write(writer, stream, response)
+        except Exception as e:
+            logger.info("[socket_thread]: connection error with {}. {}".format(addr, e))
+        finally:
+            self._socket_asyncio_drop_client(writer, "connection closed")
+
+    async def _socket_asyncio_broadcast_handler(self):
+        """
+        Coroutine that sends the status to all the clients on every tick.
+        Encoded status is shared, clients that do not read fast enough or are idle are dropped.
+        """
+        ticker = self.create_ticker("socket_asyncio_broadcast", lambda: self._socket_send_per_second)
+        broadcast_seconds = self.metrics.histogram(
+            "broadcast_seconds", "Duration of a status broadcast to all the clients", transport="socket")
+        while True:
+            await asyncio.sleep(ticker.next_delay())
+            ticker.tick()
+            start = time.perf_counter()
+            for writer, (stream, addr, last_activity) in list(self._socket_clients.items()):
+                try:
+                    if writer.transport.get_write_buffer_size() > configurations.SOCKET_MAX_BUFFERED_BYTES:
+                        self._socket_asyncio_drop_client(writer, "client too slow", evicted=True)
+                        continue
+                    if self.socket_admission.is_idle(last_activity):
+                        payload = AdmissionControl.get_message("evicted", "Idle timeout")
+                        writer.write(pack_frame(payload) if stream.binary else payload)
+                        self._socket_asyncio_drop_client(writer, "idle timeout", evicted=True)
+                        continue
+                    if not stream.ready():
+                        continue
+                    self._socket_asyncio_write(writer, stream, stream.encode_status(self.status_cache))
+                except Exception as e:
+                    logger.error(traceback.format_exc())
+                    self._socket_asyncio_drop_client(writer, "send error: {}".format(e))
+            broadcast_seconds.observe(time.perf_counter() - start)
+
+    def _socket_asyncio_write(self, writer, stream: ClientStream, payload: bytes):
+        """
+        Write a message to an asyncio client. With binary encoding every message is prefixed by its length.
+        :param writer: asyncio StreamWriter of the client.
+        :param stream: stream settings of the client.
+        :param payload: the message to send.
+        """
+        start = time.perf_counter()
+        data = pack_frame(payload) if stream.binary else payload
+        writer.write(data)
+        self._socket_send_seconds.observe(time.perf_counter() - start)
+        self._socket_bytes_sent.inc(len(data))
+
+    def _socket_asyncio_drop_client(self, writer, reason: str, evicted: bool = False):
+        """
+        Close an asyncio client connection.
+        :param writer: asyncio StreamWriter of the client.
+        :param reason: reason to log.
+        :param evicted: True if the connection is closed by the server.
+        """
+        client = self._socket_clients.pop(writer, None)
+        if client is None:
+            return
+        self.socket_admission.release(client[1], evicted)
+        logger.info("[socket_thread]: connection closed with {}. {}".format(client[1], reason))
+        if self.show_log_message:
+            print("[socket_thread]: connection closed with {}. {}".format(client[1], reason))
+        if reason == "client too slow":
+            writer.transport.abort()  # Pending data is discarded
+        else:
+            writer.close()
+
+    @staticmethod
+    def _socket_decode_messages(data: str, addr: tuple) -> (list, str):
+        """
+        Decode all the JSON messages in data. Messages can be concatenated or split between reads.
+        :param data: text received, with the remainder of the previous read.
+        :param addr: tuple with ip and socket of the client connected.
+        :return: list of messages and the remainder to keep for the next read.
+        """
+        if data.startswith("GET"):
+            logger.debug("[socket_thread]: got HTTP/GET from: {}".format(addr))
+            return [{}], ""
+        decoder = json.JSONDecoder()
+        messages = []
+        index = 0
+        while True:
+            while index < len(data) and data[index].isspace():
+                index += 1
+            if index >= len(data):
+                return messages, ""
+            try:
+                message, index = decoder.raw_decode(data, index)
+                if type(message) == dict:
+                    messages.append(message)
+            except ValueError as e:
+                if data[index] != "{" or len(data) - index > 65536:
+                    logger.error("[socket_thread]: fail to decode message from: {}: {}. {}".format(addr, data, e))
+                    return messages, ""
+                return messages, data[index:]  # Message not complete yet
+
+    def _socket_send(self, conn, stream: ClientStream, payload: bytes):
+        """
+        Send a message to a client. With binary encoding every message is prefixed by its length.
+        :param conn: socket connection instance.
+        :param stream: stream settings of the client.
+        :param payload: the message to send.
+        """
+        start = time.perf_counter()
+        data = pack_frame(payload) if stream.binary else payload
+        conn.sendall(data)
+        self._socket_send_seconds.observe(time.perf_counter() - start)
+        self._socket_bytes_sent.inc(len(data))
+
     @staticmethod
     def _socket_connect_return_json_if_received(conn, addr) -> (bool, dict):
         """
@@ -3,14 +3,15 @@ import threading
 import json
 import time
 import traceback
+from collections import deque
 
 from SimpleWebSocketServer import SimpleWebSocketServer, WebSocket
 import simplepybotsdk.configurations as configurations
 from simplepybotsdk.robotSDK import RobotSDK as RobotSDK
 from simplepybotsdk.parserJSONCommands import ParserJSONCommands
+from simplepybotsdk.admissionControl import AdmissionControl
 
 logger = logging.getLogger(__name__)
-robot_instance = None
 
 
 class RobotWebSocketSDK(RobotSDK):
@@ -34,93 +35,111 @@ class RobotWebSocketSDK(RobotSDK):
         self._web_socket_send_per_second = socket_send_per_second
         self.web_socket_threaded_connection = set()
         self.message_parsers = []
+        self.web_socket_admission = AdmissionControl.from_configuration("websocket_thread", self.configuration,
+                                                                        "web_socket")
+        self._web_socket_send_seconds = self.metrics.histogram(
+            "send_seconds", "Time to hand a message to a client transport", transport="web_socket")
+        self._web_socket_bytes_sent = self.metrics.counter("bytes_sent_total", "Bytes sent to clients",
+                                                           transport="web_socket")
+        self._web_socket_broadcast_seconds = self.metrics.histogram(
+            "broadcast_seconds", "Duration of a status broadcast to all the clients", transport="web_socket")
+        self._web_socket_ticker = None
+        self._thread_web_socket = None
         if self._web_socket_send_per_second is None:
             self._web_socket_send_per_second = configurations.WEB_SOCKET_SEND_PER_SECOND
+        if "enable_parser_json_commands" in self.configuration and self.configuration["enable_parser_json_commands"]:
+            self.message_parsers.append(ParserJSONCommands)
 
         if self._web_socket_send_per_second <= 0:
             logger.debug("RobotWebSocketSDK disabled")
             return
-        if "enable_parser_json_commands" in self.configuration and self.configuration["enable_parser_json_commands"]:
-            self.message_parsers.append(ParserJSONCommands)
 
         logger.debug("RobotWebSocketSDK initialization")
+        self._start_web_socket_thread()
 
-        self._thread_web_socket_send_data = None
+    def _start_web_socket_thread(self):
+        """Start the websocket server thread. Robots of a RobotFleet share the fleet websocket server instead."""
         self._thread_web_socket = threading.Thread(target=self._web_socket_thread_handler, args=())
         self._thread_web_socket.name = "websocket_thread"
         self._thread_web_socket.daemon = True
         self._thread_web_socket.start()
 
+    def _get_web_socket_handler_class(self):
+        """
+        :return: SimpleConnectionHandler subclass bound to this robot. SimpleWebSocketServer creates the handlers
+            from a class, so every robot needs its own class to run many robots in the same process.
+        """
+        return type("SimpleConnectionHandler", (self.SimpleConnectionHandler,), {"robot": self})
+
     def _web_socket_thread_handler(self):
         """
         Thread method used to start WebSocket server in a dedicated thread.
+        Status frames are sent from this same loop: the server waits on select until the next broadcast deadline,
+        then every client queue is filled and flushed without blocking.
         """
         logger.debug("[websocket_thread]: start listening for connections on {}"
                      .format((self._web_socket_host, self._web_socket_port)))
-        global robot_instance
-        robot_instance = self
-        server = SimpleWebSocketServer(self._web_socket_host, self._web_socket_port, self.SimpleConnectionHandler)
+        server = SimpleWebSocketServer(self._web_socket_host, self._web_socket_port,
+                                       self._get_web_socket_handler_class())
         if self.show_log_message:
             print("[websocket_thread]: listening for connections on {}"
                   .format((self._web_socket_host, self._web_socket_port)))
-        server.serveforever()
+        self._web_socket_ticker = self.create_ticker("websocket_thread_send_data",
+                                                     lambda: self._web_socket_send_per_second)
+        while True:
+            self._web_socket_flush_queues()
+            server.selectInterval = min(self._web_socket_ticker.next_delay(), 0.1)
+            server.serveonce()
+            if self._web_socket_ticker.due():
+                self._web_socket_broadcast()
 
     def start_web_socket_send_data(self):
         """
-        This method create a new thread when the first client connects.
+        Called when a client connects: restart the broadcast timeline if no client was connected.
+        Status frames are sent by the websocket server thread, no new thread is created.
         """
-        if self._thread_web_socket_send_data is None:
-            logger.info("[websocket_thread]: start_web_socket_send_data thread starting")
-            self._thread_web_socket_send_data = threading.Thread(target=self._web_socket_send_data_handler, args=())
-            self._thread_web_socket_send_data.name = "websocket_thread"
-            self._thread_web_socket_send_data.daemon = True
-            self._thread_web_socket_send_data.start()
+        if len(self.web_socket_threaded_connection) <= 1 and self._web_socket_ticker is not None:
+            self._web_socket_ticker.reset()
 
-    def _web_socket_send_data_handler(self):
+    def _web_socket_broadcast(self):
         """
-        Thread dedicated of sending realtime date to client, in the correct format.
-        This thread sends to the client a JSON dump of current state of the robot.
+        Queue the next status frame for every connected client. Idle clients are evicted.
         """
-        last_time = 0
-        j_relative = None
-        j_absolute = None
-        if self._web_socket_send_per_second <= 0:
-            self._thread_web_socket_send_data = None
-            return
+        start = time.perf_counter()
         try:
-            while len(self.web_socket_threaded_connection) > 0:
-                if (time.time() - last_time) > (1 / self._web_socket_send_per_second):
-                    last_time = time.time()
-                    for client in self.web_socket_threaded_connection:
-                        if client.message_format == "relative":
-                            if j_relative is None:
-                                j_relative = json.dumps({
-                                    "type": "R2C",
-                                    "data": {
-                                        "area": "status",
-                                        "action": "live_status",
-                                        "value": self.get_robot_dict_status(absolute=False)
-                                    }}).encode("utf-8")
-                            client.sendMessage(j_relative)
-                        elif client.message_format == "absolute":
-                            if j_absolute is None:
-                                j_absolute = json.dumps({
-                                    "type": "R2C",
-                                    "data": {
-                                        "area": "status",
-                                        "action": "live_status",
-                                        "value": self.get_robot_dict_status(absolute=True)
-                                    }}).encode("utf-8")
-                            client.sendMessage(j_absolute)
-                    j_relative = None
-                    j_absolute = None
-                    time.sleep(self.sleep_avoid_cpu_waste / self._web_socket_send_per_second)  # Avoid wasting CPU time
-            logger.info("[websocket_thread_send_data]: stopped due to inactivity")
-            self._thread_web_socket_send_data = None
+            for client in list(self.web_socket_threaded_connection):
+                if client.closed:
+                    continue
+                if self.web_socket_admission.is_idle(client.last_activity):
+                    client.evict("Idle timeout")
+                    continue
+                if client.stream.ready():
+                    client.queue_status(client.stream.encode_status(self.status_cache))
         except Exception as e:
             logger.error(traceback.format_exc())
-            logger.error("[websocket_thread_send_data]: _web_socket_send_data_handler crashed: {}".format(e))
-            self._thread_web_socket_send_data = None
+            logger.error("[websocket_thread_send_data]: _web_socket_broadcast crashed: {}".format(e))
+        self._web_socket_broadcast_seconds.observe(time.perf_counter() - start)
+
+    def _web_socket_flush_queues(self):
+        """
+        Move queued frames into the websocket send buffer of every client that is not lagging behind.
+        """
+        for client in list(self.web_socket_threaded_connection):
+            client.flush_queues()
+
+    def get_web_socket_clients_stats(self) -> list:
+        """
+        :return: list of dict with stream settings and send queue stats of every websocket client.
+        """
+        return [client.get_stats() for client in list(self.web_socket_threaded_connection)]
+
+    def get_connections_stats(self) -> dict:
+        """
+        :return: dict of {transport name: admission control stats}.
+        """
+        stats = super().get_connections_stats()
+        stats["web_socket"] = self.web_socket_admission.get_stats()
+        return stats
 
     def web_socket_handle_incoming_message(self, socket: WebSocket, message, addr):
         """
@@ -140,16 +159,15 @@ class RobotWebSocketSDK(RobotSDK):
             logger.debug("[websocket_thread]: got message from: {}: {}".format(addr, data))
             try:
                 j = json.loads(data)
-                if "socket" in j and "format" in j["socket"]:
-                    f = j["socket"]["format"]
-                    logger.debug("[websocket_thread]: connection: {} now use format: {}".format(addr, f))
-                    socket.message_format = f
+                if socket.stream.handle_message(j):
+                    logger.debug("[websocket_thread]: connection: {} now use format: {} stream: {}"
+                                 .format(addr, socket.stream.format, socket.stream.stream))
                 self.web_socket_recv_callback(j, addr, socket)
                 for mp in self.message_parsers:
                     mp_instance = mp(self)
                     response = mp_instance(j)
                     if response is not None:
-                        socket.sendMessage(json.dumps(response).encode("utf-8"))
+                        socket.queue_control(json.dumps(response).encode("utf-8"))
             except Exception as e:
                 logger.error(traceback.format_exc())
                 logger.error("[websocket_thread]: fail to decode message from: {}: {}. {}".format(addr, data, e))
@@ -166,26 +184,102 @@ class RobotWebSocketSDK(RobotSDK):
         pass
 
     class SimpleConnectionHandler(WebSocket):
-        """A simple class to handle websocket communication."""
+        """A simple class to handle websocket communication. Use RobotWebSocketSDK._get_web_socket_handler_class()."""
+        robot = None  # RobotWebSocketSDK of the connection
 
         def __init__(self, server, sock, address):
             super().__init__(server, sock, address)
-            global robot_instance
-            self.robot = robot_instance
-            self.message_format = "relative"
-            if self.robot is None:
-                logger.error("[websocket_thread]: SimpleConnectionHandler: robot instance is None")
+            self.stream = self.robot.web_socket_admission.create_stream() if self.robot is not None else None
+            self.status_queue = deque(maxlen=configurations.WEB_SOCKET_CLIENT_QUEUE_SIZE)  # (queued at, frame)
+            self.control_queue = deque()  # Responses to the client, never dropped
+            self.sent_frames = 0
+            self.dropped_frames = 0
+            self.last_activity = time.monotonic()
+            self.admitted = False
+            self.evicted = False
+
+        @property
+        def message_format(self) -> str:
+            return self.stream.format
+
+        def queue_status(self, frame: bytes):
+            """
+            Queue a status frame. If the queue is full the oldest frame is dropped: the client only needs the newest.
+            On the delta stream the changes of a dropped frame are lost, so the next frame is a keyframe.
+            :param frame: status message.
+            """
+            if len(self.status_queue) == self.status_queue.maxlen:
+                self.dropped_frames += 1
+                if self.stream is not None and self.stream.delta is not None:
+                    self.stream.delta.request_keyframe()
+            self.status_queue.append((time.monotonic(), frame))
+
+        def queue_control(self, message: bytes):
+            """
+            Queue a message that must be delivered, like a parser response.
+            :param message: message to send.
+            """
+            self.control_queue.append(message)
+
+        def flush_queues(self):
+            """
+            Hand queued messages to the websocket send buffer. Nothing is handed over while the socket is still
+            writing previous messages, so a slow client only grows its bounded status queue.
+            Send time of a status frame includes the time spent in the queue.
+            """
+            while not self.closed and len(self.sendq) < configurations.WEB_SOCKET_CLIENT_MAX_PENDING_FRAMES:
+                if len(self.control_queue) > 0:
+                    message = self.control_queue.popleft()
+                    self.sendMessage(message)
+                elif len(self.status_queue) > 0:
+                    queued, message = self.status_queue.popleft()
+                    self.sendMessage(message)
+                    self.sent_frames += 1
+                    self.robot._web_socket_send_seconds.observe(time.monotonic() - queued)
+                else:
+                    return
+                self.robot._web_socket_bytes_sent.inc(len(message))
+
+        def get_stats(self) -> dict:
+            """
+            :return: dict with stream settings and send queue stats. lag_ms is the age of the oldest queued frame.
+            """
+            oldest = self.status_queue[0][0] if len(self.status_queue) > 0 else None
+            return {
+                "address": "{}:{}".format(self.address[0], self.address[1]),
+                "format": self.stream.format,
+                "stream": self.stream.stream,
+                "encoding": "binary" if self.stream.binary else "json",
+                "sent_frames": self.sent_frames,
+                "dropped_frames": self.dropped_frames,
+                "queued_frames": len(self.status_queue),
+                "pending_frames": len(self.sendq),
+                "lag_ms": round((time.monotonic() - oldest) * 1000, 3) if oldest is not None else 0.0
+            }
+
+        def evict(self, reason: str):
+            """
+            Send the reason to the client and close the connection.
+            :param reason: reason of the eviction.
+            """
+            logger.info("[websocket_thread]: evict {}. {}".format(self.address, reason))
+            self.evicted = True
+            self.sendMessage(AdmissionControl.get_message("evicted", reason))
+            self.close(1000, reason)
 
         def handleMessage(self):
+            self.last_activity = time.monotonic()
             self.robot.web_socket_handle_incoming_message(self, self.data, self.address)
 
         def handleConnected(self):
-            if len(self.robot.web_socket_threaded_connection) >= configurations.SOCKET_INCOMING_LIMIT:
-                logger.warning("[websocket_thread]: connection refused to {}".format(self.address))
+            reason = self.robot.web_socket_admission.admit(self.address)
+            if reason is not None:
                 if self.robot.show_log_message:
-                    print("[websocket_thread]: connection refused to {}".format(self.address))
-                self.handleClose()
+                    print("[websocket_thread]: connection refused to {}. {}".format(self.address, reason))
+                self.sendMessage(AdmissionControl.get_message("rejected", reason))
+                self.close(1013, reason)  # Try again later
                 return
+            self.admitted = True
             logger.info("[websocket_thread]: got connection from: {}".format(self.address))
             if self.robot.show_log_message:
                 print("[websocket_thread]: got connection from {}".format(self.address))
@@ -193,7 +287,10 @@ class RobotWebSocketSDK(RobotSDK):
             self.robot.start_web_socket_send_data()
 
         def handleClose(self):
+            if not self.admitted:
+                return
+            self.robot.web_socket_admission.release(self.address, self.evicted)
             logger.info("[websocket_thread]: connection closed with {}".format(self.address))
             if self.robot.show_log_message:
                 print("[websocket_thread]: connection closed with {}".format(self.address))
-            self.robot.web_socket_threaded_connection.remove(self)
+            self.robot.web_socket_threaded_connection.discard(self)
@@ -17,15 +17,20 @@ class Sensor:
         self.offset = offset
         logger.debug("{}: initialization".format(self.key))
         self.abs_value = 0.0
+        self._store = None  # MotorsStore of the robot: its changes counter tells the readers that the state changed
 
     def get_value(self) -> float:
         return self.abs_value + self.offset
 
     def set_value(self, value: float):
         self.abs_value = value - self.offset
+        if self._store is not None:
+            self._store.changes += 1
 
     def set_abs_value(self, value: float):
         self.abs_value = value
+        if self._store is not None:
+            self._store.changes += 1
 
     def __iter__(self):
         for key in self.__dict__:
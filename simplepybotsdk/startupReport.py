@@ -0,0 +1,133 @@
+"""
+Startup time and memory of every SDK class. Every class is measured in a fresh Python process, so imports are not
+shared between measures.
+
+Usage:
+    python -m simplepybotsdk.startupReport [--config robot_configuration.json]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+
+SDK_CLASSES = ("RobotSDK", "RobotSocketSDK", "RobotWebSocketSDK", "RobotRESTSDK")
+
+# Code executed in the child process. Prints a JSON dict with the measures.
+_MEASURE_CODE = """
+import json, sys, time
+stdout = sys.stdout
+sys.stdout = sys.stderr  # SDK messages must not mix with the measures
+start = time.perf_counter()
+import simplepybotsdk
+from simplepybotsdk.startupReport import get_rss_kb
+sdk_class = getattr(simplepybotsdk, sys.argv[1])
+imported = time.perf_counter()
+rss_imported = get_rss_kb()
+arguments = json.loads(sys.argv[3])
+robot = sdk_class(sys.argv[2], **arguments)
+robot.show_log_message = False
+created = time.perf_counter()
+stdout.write(json.dumps({
+    "import_ms": round((imported - start) * 1000, 3),
+    "init_ms": round((created - imported) * 1000, 3),
+    "rss_imported_kb": rss_imported,
+    "rss_kb": get_rss_kb(),
+    "modules": len(sys.modules)
+}) + "\\n")
+stdout.flush()
+"""
+
+_EXAMPLE_CONFIGURATION = {
+    "id": "startup_report",
+    "version": "1",
+    "name": "Startup report robot",
+    "motors": {"motor_{}".format(i): {
+        "id": str(i),
+        "offset": 0.0,
+        "type": "virtual-servo",
+        "angle_limit": [-90, 90],
+        "orientation": "direct"
+    } for i in range(20)},
+    "motors_type": {"virtual-servo": {"angle_speed": 60}},
+    "sensors": {"sensor_0": {"id": "s0", "offset": 0.0}}
+}
+
+
+def get_rss_kb() -> int:
+    """
+    :return: resident memory of the current process in KB, None if it is not available on this platform.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # Peak memory: KB on Linux, bytes on macOS
+        return rss // 1024 if sys.platform == "darwin" else rss
+    except ImportError:
+        return None
+
+
+def _get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def _get_arguments(sdk_class: str) -> dict:
+    if sdk_class == "RobotSDK":
+        return {}
+    arguments = {"socket_host": "localhost", "socket_port": _get_free_port()}
+    if sdk_class == "RobotRESTSDK":
+        arguments.update({"rest_host": "localhost", "rest_port": _get_free_port()})
+    return arguments
+
+
+def measure_class(sdk_class: str, config_path: str) -> dict:
+    """
+    :param sdk_class: name of the SDK class, see SDK_CLASSES.
+    :param config_path: SimplePYBotSDK json configuration file path.
+    :return: dict with import_ms, init_ms, rss_imported_kb, rss_kb and modules loaded, or error.
+    """
+    package_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = package_path + os.pathsep + environment.get("PYTHONPATH", "")
+    result = subprocess.run([sys.executable, "-c", _MEASURE_CODE, sdk_class, config_path,
+                             json.dumps(_get_arguments(sdk_class))],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=environment, timeout=60)
+    if result.returncode != 0:
+        return {"error": result.stderr.decode("utf-8", "replace").strip().splitlines()[-1:]}
+    return json.loads(result.stdout.decode("utf-8").strip().splitlines()[-1])
+
+
+def get_startup_report(config_path: str = None, classes: tuple = SDK_CLASSES) -> dict:
+    """
+    :param config_path: SimplePYBotSDK json configuration file path. None to use a 20 motors example robot.
+    :param classes: names of the SDK classes to measure.
+    :return: dict of {class name: measures}, see measure_class().
+    """
+    from simplepybotsdk.configurations import VERSION
+    report = {"sdk_version": VERSION, "python": sys.version.split()[0], "classes": {}}
+    with tempfile.TemporaryDirectory() as directory:
+        if config_path is None:
+            config_path = os.path.join(directory, "startup_report.json")
+            with open(config_path, "w") as f:
+                json.dump(_EXAMPLE_CONFIGURATION, f)
+        for sdk_class in classes:
+            report["classes"][sdk_class] = measure_class(sdk_class, os.path.abspath(config_path))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SimplePYBotSDK startup time and memory report")
+    parser.add_argument("--config", help="robot configuration path. Default is a 20 motors example robot")
+    parser.add_argument("--classes", default=",".join(SDK_CLASSES), help="comma separated SDK classes")
+    args = parser.parse_args()
+    print(json.dumps(get_startup_report(args.config, tuple(args.classes.split(","))), indent=2))
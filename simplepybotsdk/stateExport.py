@@ -0,0 +1,256 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from array import array
+
+logger = logging.getLogger(__name__)
+
+# File layout, little endian:
+# - header (HEADER_SIZE bytes): magic, format version, state, motors, sensors, metadata bytes, sequence, time.time()
+#   of the frame and motors thread ticks. State is STATE_LIVE, or STATE_REPLACED when the writer moved to a new file
+#   (motors or sensors changed) or was closed.
+# - data (doubles): motors absolute goal angles, absolute current angles, offsets and signs (one column of "motors"
+#   values each), sensors values, twist (linear x, y, z, angular x, y, z).
+# - metadata: UTF-8 JSON with robot id and name, motors keys and ids, sensors keys and ids.
+# Seqlock: the writer makes the sequence odd, writes the data and makes it even again. A reader copies the data and
+# retries if the sequence was odd or changed meanwhile, so reads never wait for the writer and frames are consistent.
+MAGIC = b"SPBSTATE"
+FORMAT_VERSION = 1
+STATE_LIVE = 1
+STATE_REPLACED = 2
+_HEADER = struct.Struct("<8sIIIII4xQdQ")
+HEADER_SIZE = _HEADER.size
+_SEQUENCE_OFFSET = 32  # uint64, aligned so that it is written with a single store
+_FRAME = struct.Struct("<dQ")  # Time and ticks, after the sequence
+
+
+class StateExport:
+    """
+    Publish the robot state in a memory mapped file, for readers on the same host (see StateReader). Use a path in
+    /dev/shm on Linux to keep it in memory. Written by the motors thread after every step: motors columns are bulk
+    copies of the MotorsStore, so a write does not depend on JSON or on the number of clients.
+    """
+
+    def __init__(self, robot, path: str):
+        """
+        :param robot: RobotSDK instance.
+        :param path: file path of the state.
+        """
+        self._robot = robot
+        self.path = path
+        self.writes = 0
+        self._map = None
+        self._shape = None
+
+    def _open(self):
+        """Create the file for the current motors and sensors. Readers of a previous file are told to reopen."""
+        robot = self._robot
+        robot._check_components_index()
+        store = robot.motors_store
+        sensors = list(robot.sensors)
+        n, ns = store.size, len(sensors)
+        keys = {m._index: m for m in robot.motors if m._store is store}
+        metadata = json.dumps({
+            "id": robot.configuration.get("id"),
+            "name": robot.configuration.get("name"),
+            "motors": [keys[i].key if i in keys else None for i in range(n)],
+            "motors_id": [keys[i].id if i in keys else None for i in range(n)],
+            "sensors": [s.key for s in sensors],
+            "sensors_id": [s.id for s in sensors]
+        }).encode("utf-8")
+        data_size = 8 * (4 * n + ns + 6)
+        size = HEADER_SIZE + data_size + len(metadata)
+        tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, STATE_LIVE, n, ns, len(metadata), 0, 0.0, 0))
+            f.write(bytes(data_size))
+            f.write(metadata)
+        os.replace(tmp_path, self.path)
+        self.close()
+        with open(self.path, "r+b") as f:
+            self._map = mmap.mmap(f.fileno(), size)
+        self._sequence = memoryview(self._map)[_SEQUENCE_OFFSET:_SEQUENCE_OFFSET + 8].cast("Q")
+        data = memoryview(self._map)[HEADER_SIZE:HEADER_SIZE + data_size].cast("d")
+        self._goal = data[0:n]
+        self._current = data[n:2 * n]
+        self._offset = data[2 * n:3 * n]
+        self._sign = data[3 * n:4 * n]
+        self._data = data
+        self._sensors = sensors
+        self._shape = (len(robot.motors), ns, n)
+        logger.debug("StateExport: {} created for {} motors and {} sensors".format(self.path, n, ns))
+
+    def write(self):
+        """
+        Publish the current state. Called by the motors thread after every step, only one thread must write.
+        """
+        robot = self._robot
+        store = robot.motors_store
+        if self._shape != (len(robot.motors), len(robot.sensors), store.size):
+            self._open()
+        n = self._shape[2]
+        sequence = self._sequence[0] + 1
+        self._sequence[0] = sequence  # Odd: write in progress
+        if store.backend == "numpy":
+            self._goal[:] = store.goal[:n]
+            self._current[:] = store.current[:n]
+            self._offset[:] = store.offset[:n]
+            self._sign[:] = store.sign[:n]
+        else:
+            self._goal[:] = store.goal
+            self._current[:] = store.current
+            self._offset[:] = store.offset
+            self._sign[:] = store.sign
+        data = self._data
+        j = 4 * n
+        for s in self._sensors:
+            data[j] = s.abs_value + s.offset
+            j += 1
+        twist = robot.twist
+        if twist is not None:
+            data[j] = twist.linear.x
+            data[j + 1] = twist.linear.y
+            data[j + 2] = twist.linear.z
+            data[j + 3] = twist.angular.x
+            data[j + 4] = twist.angular.y
+            data[j + 5] = twist.angular.z
+        _FRAME.pack_into(self._map, _SEQUENCE_OFFSET + 8, time.time(), robot._motors_ticks)
+        self._sequence[0] = sequence + 1  # Even: frame complete
+        self.writes += 1
+
+    def close(self):
+        """
+        Tell the readers that this file is not written anymore and release the memory map.
+        """
+        if self._map is None:
+            return
+        struct.pack_into("<I", self._map, 12, STATE_REPLACED)
+        for view in (self._goal, self._current, self._offset, self._sign, self._data, self._sequence):
+            view.release()
+        self._map.close()
+        self._map = None
+
+    def __str__(self):
+        return "<StateExport {} writes: {}>".format(self.path, self.writes)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class StateReader:
+    """
+    Lock free reader of a state published by StateExport, for other processes on the same host.
+    Example:
+        reader = StateReader("/dev/shm/my_robot.state")
+        state = reader.read()
+        print(state["motors"]["motor_1"]["current_angle"])
+    """
+
+    def __init__(self, path: str, retries: int = 1000):
+        """
+        :param path: file path of the state.
+        :param retries: attempts to read a consistent frame before raising RuntimeError.
+        """
+        self.path = path
+        self.retries = retries
+        self._map = None
+        self._data = None
+        self._open()
+
+    def _open(self):
+        self.close()
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, n, ns, metadata_size, _, _, _ = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError("StateReader: {} is not a SimplePYBotSDK state, version {}".format(self.path, version))
+        self.motors_count = n
+        self.sensors_count = ns
+        data_size = 8 * (4 * n + ns + 6)
+        self._data = memoryview(self._map)[HEADER_SIZE:HEADER_SIZE + data_size]
+        self._sequence = memoryview(self._map)[_SEQUENCE_OFFSET:_SEQUENCE_OFFSET + 8].cast("Q")
+        metadata = json.loads(bytes(self._map[HEADER_SIZE + data_size:HEADER_SIZE + data_size + metadata_size]))
+        self.robot_id = metadata["id"]
+        self.robot_name = metadata["name"]
+        self.motors = metadata["motors"]
+        self.motors_id = metadata["motors_id"]
+        self.sensors = metadata["sensors"]
+        self.sensors_id = metadata["sensors_id"]
+
+    @property
+    def sequence(self) -> int:
+        """
+        :return: sequence of the last frame: it grows by 2 on every write. Cheap way to check for a new frame.
+        """
+        return self._sequence[0]
+
+    def read_values(self) -> tuple:
+        """
+        Copy a consistent frame.
+        :return: tuple of (sequence, time.time() of the frame, motors thread ticks, array("d") with the data, see the
+            file layout).
+        """
+        for _ in range(self.retries):
+            if struct.unpack_from("<I", self._map, 12)[0] != STATE_LIVE:
+                self._open()  # Motors or sensors changed, or the writer was closed: then the last frame is read
+            sequence = self._sequence[0]
+            if sequence & 1:
+                continue  # Write in progress
+            data = array("d")
+            data.frombytes(self._data)
+            timestamp, ticks = _FRAME.unpack_from(self._map, _SEQUENCE_OFFSET + 8)
+            if self._sequence[0] == sequence:
+                return sequence, timestamp, ticks, data
+        raise RuntimeError("StateReader: {} no consistent frame after {} retries".format(self.path, self.retries))
+
+    def read(self, absolute: bool = False) -> dict:
+        """
+        :param absolute: angle absolute or relative.
+        :return: dict with sequence, t (time.time() of the frame), ticks, motors ({key: {"goal_angle",
+            "current_angle"}}), sensors ({key: value}), twist ([linear x, y, z, angular x, y, z]) and format.
+        """
+        sequence, timestamp, ticks, data = self.read_values()
+        n = self.motors_count
+        motors = {}
+        for i, key in enumerate(self.motors):
+            goal, current = data[i], data[n + i]
+            if not absolute:
+                offset, sign = data[2 * n + i], data[3 * n + i]
+                goal, current = goal * sign - offset, current * sign - offset
+            motors[key] = {"goal_angle": goal, "current_angle": current}
+        j = 4 * n
+        return {
+            "sequence": sequence,
+            "t": timestamp,
+            "ticks": ticks,
+            "motors": motors,
+            "sensors": dict(zip(self.sensors, data[j:j + self.sensors_count])),
+            "twist": data[j + self.sensors_count:j + self.sensors_count + 6].tolist(),
+            "format": "absolute" if absolute else "relative"
+        }
+
+    def close(self):
+        if self._map is None:
+            return
+        if self._data is not None:
+            self._data.release()
+            self._sequence.release()
+            self._data = None
+        self._map.close()
+        self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __str__(self):
+        return "<StateReader {} {} motors>".format(self.path, self.motors_count)
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,145 @@
+import logging
+from array import array
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotLayout:
+    """Motors, sensors and twist identity of the snapshots. Shared by all the snapshots until they change."""
+
+    __slots__ = ("motors", "rows", "ordered", "sensors", "twist", "shape")
+
+    def __init__(self, robot):
+        """
+        :param robot: RobotSDK instance.
+        """
+        self.motors = tuple((m.id, m.key) for m in robot.motors)
+        self.rows = tuple(m._index for m in robot.motors)  # MotorsStore row of every motor
+        self.ordered = self.rows == tuple(range(robot.motors_store.size))
+        self.sensors = tuple(robot.sensors)
+        self.twist = (robot.twist.id, robot.twist.key) if robot.twist is not None else None
+        self.shape = (len(robot.motors), len(robot.sensors), robot.motors_store.size, robot.twist is not None)
+
+
+class StateSnapshot:
+    """
+    Immutable state of the robot after a whole motors tick: motors columns copied from the MotorsStore in a single
+    update, sensors values and twist. Snapshots are published by reference (see RobotSDK.commit_state_snapshot()),
+    so readers never take locks and all the values of a snapshot come from the same tick.
+    Derived values (relative angles, status lists) are computed on first use and shared by all the readers: do not
+    modify them.
+    """
+
+    __slots__ = ("version", "t", "ticks", "layout", "goal", "current", "offset", "sign", "sensors", "twist",
+                 "changes", "_cache")
+
+    def __init__(self, version: int, t: float, ticks: int, layout: SnapshotLayout, columns: tuple, sensors: tuple,
+                 twist: tuple, changes: int = 0):
+        """
+        :param version: sequence number, it grows on every commit.
+        :param t: time.monotonic() of the commit.
+        :param ticks: motors thread ticks at the commit.
+        :param layout: SnapshotLayout of the robot.
+        :param columns: copies of the goal, current, offset and sign columns of the MotorsStore.
+        :param sensors: sensors values, in layout order.
+        :param twist: linear x, y, z and angular x, y, z. None if the robot has no twist.
+        :param changes: MotorsStore.changes read before the copy: a different value means the snapshot is stale.
+        """
+        self.version = version
+        self.t = t
+        self.ticks = ticks
+        self.layout = layout
+        self.goal, self.current, self.offset, self.sign = columns
+        self.sensors = sensors
+        self.twist = twist
+        self.changes = changes
+        self._cache = {}
+
+    def get_columns(self, absolute: bool = False) -> tuple:
+        """
+        :param absolute: angle absolute or relative.
+        :return: tuple of (goal angles, current angles) lists, indexed by MotorsStore row.
+        """
+        key = ("columns", absolute)
+        columns = self._cache.get(key)
+        if columns is None:
+            if absolute:
+                columns = (self.goal.tolist(), self.current.tolist())
+            elif isinstance(self.goal, array):
+                sign, offset = self.sign, self.offset
+                columns = ([v * s - o for v, s, o in zip(self.goal, sign, offset)],
+                           [v * s - o for v, s, o in zip(self.current, sign, offset)])
+            else:  # numpy
+                columns = ((self.goal * self.sign - self.offset).tolist(),
+                           (self.current * self.sign - self.offset).tolist())
+            self._cache[key] = columns
+        return columns
+
+    def get_angles(self, absolute: bool = False) -> tuple:
+        """
+        :param absolute: angle absolute or relative.
+        :return: tuple of (goal angles, current angles) lists, in the order of robot.motors.
+        """
+        key = ("angles", absolute)
+        angles = self._cache.get(key)
+        if angles is None:
+            goals, currents = self.get_columns(absolute)
+            if not self.layout.ordered:  # Store rows not in configuration order
+                rows = self.layout.rows
+                goals = [goals[i] for i in rows]
+                currents = [currents[i] for i in rows]
+            angles = (goals, currents)
+            self._cache[key] = angles
+        return angles
+
+    def get_motors_list(self, absolute: bool = False) -> list:
+        """
+        :param absolute: angle absolute or relative.
+        :return: list of motors with id, key, goal and current angle rounded to 0.1 degrees, see
+            RobotSDK.get_motors_list_relative_angles().
+        """
+        key = ("motors", absolute)
+        motors = self._cache.get(key)
+        if motors is None:
+            goals, currents = self.get_angles(absolute)
+            goal_key, current_key = ("abs_goal_angle", "abs_current_angle") if absolute else \
+                ("goal_angle", "current_angle")
+            motors = [{"id": identifier, "key": motor_key, goal_key: round(goal, 1), current_key: round(current, 1)}
+                      for (identifier, motor_key), goal, current in zip(self.layout.motors, goals, currents)]
+            self._cache[key] = motors
+        return motors
+
+    def get_sensors_list(self) -> list:
+        """
+        :return: list of sensors with id, key and value.
+        """
+        sensors = self._cache.get("sensors")
+        if sensors is None:
+            sensors = [{"id": s.id, "key": s.key, "value": value} for s, value in zip(self.layout.sensors,
+                                                                                          self.sensors)]
+            self._cache["sensors"] = sensors
+        return sensors
+
+    def get_twist_dict(self) -> dict:
+        """
+        :return: dict of twist with linear and angular, or None.
+        """
+        if self.twist is None:
+            return None
+        twist = self._cache.get("twist")
+        if twist is None:
+            t = self.twist
+            twist = {
+                "id": self.layout.twist[0],
+                "key": self.layout.twist[1],
+                "linear": {"x": t[0], "y": t[1], "z": t[2]},
+                "angular": {"x": t[3], "y": t[4], "z": t[5]}
+            }
+            self._cache["twist"] = twist
+        return twist
+
+    def __str__(self):
+        return "<StateSnapshot version: {} ticks: {}>".format(self.version, self.ticks)
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,113 @@
+import json
+import logging
+import threading
+import time
+
+import simplepybotsdk.configurations as configurations
+from simplepybotsdk.binaryStatus import BinaryStatusEncoder
+
+logger = logging.getLogger(__name__)
+
+LIVE_STATUS_MESSAGE_PREFIX = b'{"type": "R2C", "data": {"area": "status", "action": "live_status", "value": '
+LIVE_STATUS_MESSAGE_SUFFIX = b'}}'
+
+
+class StatusCache:
+    """
+    Cache of the robot live status, one entry for every format (relative and absolute).
+    An entry is rebuilt at most once per StateSnapshot committed by the motors thread (or once per period if the
+    motors thread is disabled), or when invalidate() is called. The JSON encoding is shared by all the transports
+    and clients.
+    """
+
+    def __init__(self, robot):
+        """
+        :param robot: RobotSDK instance.
+        """
+        self._robot = robot
+        self._entries = {}  # absolute -> (stamp, status dict, status JSON bytes, live_status message bytes)
+        self._binary_entries = {}  # absolute -> (stamp, binary status bytes)
+        self._binary_encoder = BinaryStatusEncoder(robot)
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+        self._json_seconds = robot.metrics.histogram("status_build_seconds", "Duration of a live status rebuild",
+                                                     encoding="json")
+        self._binary_seconds = robot.metrics.histogram("status_build_seconds", "Duration of a live status rebuild",
+                                                       encoding="binary")
+
+    def invalidate(self):
+        """
+        Force the rebuild of all the entries on the next request. Call this after a state change that must be visible
+        before the next motors tick.
+        """
+        self._generation += 1
+
+    def _stamp(self) -> tuple:
+        """
+        :return: tuple of (value that changes when the cached status is no longer valid, StateSnapshot to build the
+            status from or None to commit a new one).
+        """
+        if self._robot._motors_check_per_second > 0:
+            snapshot = self._robot.get_state_snapshot()
+            return (self._generation, snapshot.version), snapshot
+        return (self._generation, int(time.monotonic() * configurations.MOTORS_CHECK_PER_SECOND)), None
+
+    def _get_entry(self, absolute: bool) -> tuple:
+        stamp, snapshot = self._stamp()
+        entry = self._entries.get(absolute)
+        if entry is not None and entry[0] == stamp:
+            return entry
+        with self._lock:
+            entry = self._entries.get(absolute)
+            if entry is not None and entry[0] == stamp:
+                return entry  # Rebuilt by another thread while waiting the lock
+            start = time.perf_counter()
+            status = self._robot._get_robot_dict_status(absolute, snapshot)
+            status_json = json.dumps(status).encode("utf-8")
+            entry = (stamp, status, status_json,
+                     LIVE_STATUS_MESSAGE_PREFIX + status_json + LIVE_STATUS_MESSAGE_SUFFIX)
+            self._entries[absolute] = entry
+            self.rebuilds += 1
+            self._json_seconds.observe(time.perf_counter() - start)
+            return entry
+
+    def get_binary(self, absolute: bool = False) -> bytes:
+        """
+        :param absolute: angle absolute or relative.
+        :return: cached binary live status, see binaryStatus.
+        """
+        stamp, snapshot = self._stamp()
+        entry = self._binary_entries.get(absolute)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        with self._lock:
+            entry = self._binary_entries.get(absolute)
+            if entry is None or entry[0] != stamp:
+                start = time.perf_counter()
+                entry = (stamp, self._binary_encoder.encode(absolute, snapshot))
+                self._binary_entries[absolute] = entry
+                self.rebuilds += 1
+                self._binary_seconds.observe(time.perf_counter() - start)
+            return entry[1]
+
+    def get_dict(self, absolute: bool = False) -> dict:
+        """
+        :param absolute: angle absolute or relative.
+        :return: cached dict of get_robot_dict_status(). Shared between callers: do not modify it.
+        """
+        return self._get_entry(absolute)[1]
+
+    def get_json(self, absolute: bool = False) -> bytes:
+        """
+        :param absolute: angle absolute or relative.
+        :return: cached JSON encoding of get_robot_dict_status().
+        """
+        return self._get_entry(absolute)[2]
+
+    def get_message(self, absolute: bool = False) -> bytes:
+        """
+        :param absolute: angle absolute or relative.
+        :return: cached JSON encoding of the R2C live_status message sent by socket and websocket.
+        """
+        return self._get_entry(absolute)[3]
@@ -0,0 +1,193 @@
+import json
+import logging
+import time
+
+import simplepybotsdk.configurations as configurations
+
+logger = logging.getLogger(__name__)
+
+
+class StatusDeltaEncoder:
+    """
+    Encoder of the live_status_delta stream for a single client.
+    The first message is a keyframe with the full status, then only motors and sensors whose value changed are sent.
+    A keyframe is sent again every keyframe_interval messages, so clients can resync.
+    """
+
+    def __init__(self, keyframe_interval: int = None):
+        """
+        :param keyframe_interval: number of messages between two keyframes.
+            Default is configurations.STATUS_DELTA_KEYFRAME_INTERVAL.
+        """
+        self.keyframe_interval = keyframe_interval
+        if self.keyframe_interval is None:
+            self.keyframe_interval = configurations.STATUS_DELTA_KEYFRAME_INTERVAL
+        self.seq = 0
+        self._since_keyframe = 0
+        self._force_keyframe = True
+        self._motors = {}  # key -> item sent
+        self._sensors = {}
+        self._twist = None
+        self._sdk = None
+        self._last_status = None
+
+    def request_keyframe(self):
+        """
+        Send a keyframe with the next message.
+        """
+        self._force_keyframe = True
+
+    def encode(self, status: dict) -> bytes:
+        """
+        :param status: dict from get_robot_dict_status().
+        :return: JSON encoding of the R2C live_status_delta message.
+        """
+        self.seq += 1
+        keyframe = self._force_keyframe or self._since_keyframe >= self.keyframe_interval
+        if keyframe:
+            self._force_keyframe = False
+            self._since_keyframe = 0
+            self._motors = {m["key"]: m for m in status["motors"]}
+            self._sensors = {s["key"]: s for s in status["sensors"]}
+            self._twist = status["twist"]
+            self._sdk = status["sdk"]
+            value = status
+        else:
+            self._since_keyframe += 1
+            unchanged = status is self._last_status  # Status cache not rebuilt since the last message
+            value = {
+                "motors": [] if unchanged else self._changed(self._motors, status["motors"]),
+                "sensors": [] if unchanged else self._changed(self._sensors, status["sensors"]),
+                "format": status["format"],
+                "system": status["system"]
+            }
+            if status["twist"] != self._twist:
+                self._twist = value["twist"] = status["twist"]
+            if status["sdk"] != self._sdk:
+                self._sdk = value["sdk"] = status["sdk"]
+        self._last_status = status
+        return json.dumps({
+            "type": "R2C",
+            "data": {
+                "area": "status",
+                "action": "live_status_delta",
+                "seq": self.seq,
+                "keyframe": keyframe,
+                "value": value
+            }}).encode("utf-8")
+
+    @staticmethod
+    def _changed(sent: dict, items: list) -> list:
+        """
+        :param sent: dict of key -> last item sent. Updated with the changed items.
+        :param items: list of motors or sensors of the current status.
+        :return: list of changed items, without the id.
+        """
+        changed = []
+        for item in items:
+            previous = sent.get(item["key"])
+            if previous is None or previous != item:
+                sent[item["key"]] = item
+                changed.append({k: v for k, v in item.items() if k != "id"})
+        return changed
+
+
+class ClientStream:
+    """
+    Status stream settings of a socket or websocket client.
+    Settings are negotiated by the client with the message: {"socket": {"format": "absolute", "stream": "delta"}}.
+    - format: "relative" (default) or "absolute".
+    - stream: "full" (default) sends the full live_status every time, "delta" sends live_status_delta messages.
+    - keyframe: true to ask a keyframe on the delta stream.
+    - encoding: "json" (default) or "binary" to receive the binary live status (see binaryStatus).
+      Raw TCP sockets also prefix every message with its length when using binary encoding.
+    - rate: max status messages per second, lower than the transport rate. Limited by rate_limit.
+    """
+
+    def __init__(self, rate_limit: float = None):
+        """
+        :param rate_limit: max status messages per second allowed to the client. None for no limit.
+        """
+        self.absolute = False
+        self.delta = None  # StatusDeltaEncoder if the client uses the delta stream
+        self.binary = False
+        self.rate_limit = rate_limit
+        self.rate = rate_limit
+        self._next_send = 0.0
+
+    @property
+    def format(self) -> str:
+        return "absolute" if self.absolute else "relative"
+
+    @property
+    def stream(self) -> str:
+        return "full" if self.delta is None else "delta"
+
+    def handle_message(self, message: dict) -> bool:
+        """
+        Update the settings if the message is a {"socket": {...}} message.
+        :param message: json message received from the client.
+        :return: True if the message was a stream settings message.
+        """
+        if "socket" not in message or type(message["socket"]) != dict:
+            return False
+        settings = message["socket"]
+        if "format" in settings:
+            if settings["format"] in ("absolute", "relative"):
+                absolute = settings["format"] == "absolute"
+                if absolute != self.absolute and self.delta is not None:
+                    self.delta.request_keyframe()
+                self.absolute = absolute
+            else:
+                logger.warning("ClientStream: unknown format '{}'".format(settings["format"]))
+        if "stream" in settings:
+            if settings["stream"] == "delta":
+                if self.delta is None:
+                    self.delta = StatusDeltaEncoder()
+            elif settings["stream"] == "full":
+                self.delta = None
+            else:
+                logger.warning("ClientStream: unknown stream '{}'".format(settings["stream"]))
+        if "encoding" in settings:
+            if settings["encoding"] in ("json", "binary"):
+                self.binary = settings["encoding"] == "binary"
+            else:
+                logger.warning("ClientStream: unknown encoding '{}'".format(settings["encoding"]))
+        if "rate" in settings:
+            rate = settings["rate"]
+            if rate is None or (type(rate) in (int, float) and rate > 0):
+                self.rate = rate if self.rate_limit is None or (rate is not None and rate < self.rate_limit) \
+                    else self.rate_limit
+            else:
+                logger.warning("ClientStream: invalid rate '{}'".format(rate))
+        if settings.get("keyframe") is True and self.delta is not None:
+            self.delta.request_keyframe()
+        return True
+
+    def ready(self) -> bool:
+        """
+        Check the rate of the client. Call this on every transport tick, before encode_status().
+        :return: True if a status message must be sent now.
+        """
+        if self.rate is None:
+            return True
+        now = time.monotonic()
+        if now < self._next_send:
+            return False
+        period = 1 / self.rate
+        if now - self._next_send < period:
+            self._next_send += period  # Keep the timeline, so the rate does not drift
+        else:
+            self._next_send = now + period
+        return True
+
+    def encode_status(self, status_cache) -> bytes:
+        """
+        :param status_cache: StatusCache of the robot.
+        :return: the next status message to send to this client.
+        """
+        if self.binary:
+            return status_cache.get_binary(absolute=self.absolute)
+        if self.delta is not None:
+            return self.delta.encode(status_cache.get_dict(absolute=self.absolute))
+        return status_cache.get_message(absolute=self.absolute)
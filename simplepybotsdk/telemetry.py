@@ -0,0 +1,156 @@
+import logging
+import math
+import threading
+import time
+from array import array
+
+from simplepybotsdk.motorsStore import load_numpy
+
+logger = logging.getLogger(__name__)
+
+
+class TelemetryBuffer:
+    """
+    Fixed size ring buffer with the history of the robot state, written on every motors thread tick.
+    Every sample has a time.monotonic() timestamp, motors goal and current absolute angles, sensors values and twist.
+    Buffers are preallocated: write() copies values in place and does not allocate.
+    They are allocated again only if motors or sensors are added at runtime.
+    """
+
+    def __init__(self, robot, capacity: int):
+        """
+        :param robot: RobotSDK instance.
+        :param capacity: number of samples kept.
+        """
+        self._robot = robot
+        self.capacity = capacity
+        self.count = 0  # Samples written since the last allocation
+        self._head = 0  # Next slot to write
+        self._shape = None
+        self._lock = threading.Lock()  # Held while a sample is written or the buffers are allocated or read
+
+    def _allocate(self):
+        robot = self._robot
+        robot._check_components_index()
+        self._motors = list(robot.motors)
+        self._sensors = list(robot.sensors)
+        self._store = robot.motors_store
+        self._shape = (len(self._motors), len(self._sensors), self._store.size)
+        self._numpy = self._store.backend == "numpy"
+        n, ns, cap = self._store.size, len(self._sensors), self.capacity  # Motors columns are store rows
+        self._times = array("d", bytes(8 * cap))
+        if self._numpy:
+            numpy = load_numpy()
+            self._goal = numpy.zeros((cap, n))
+            self._current = numpy.zeros((cap, n))
+        else:
+            self._goal = array("d", bytes(8 * cap * n))
+            self._current = array("d", bytes(8 * cap * n))
+            self._goal_view = memoryview(self._goal)  # Also copies rows of shared stores, see MotorsStore
+            self._current_view = memoryview(self._current)
+        self._sensor_values = array("d", bytes(8 * cap * ns))
+        self._twist = array("d", bytes(8 * cap * 6))
+        self.count = 0
+        self._head = 0
+        logger.debug("Telemetry: allocated {} samples for {} motors and {} sensors".format(cap, n, ns))
+
+    def write(self):
+        """
+        Append the current state. Called by the motors thread after every step.
+        """
+        robot = self._robot
+        store = robot.motors_store
+        with self._lock:  # Once the buffer is full readers also return the slot being written
+            if self._shape != (len(robot.motors), len(robot.sensors), store.size):
+                self._allocate()
+            self._write_slot(robot, store)
+
+    def _write_slot(self, robot, store):
+        """Copy the current state in the slot at head. Called with the lock held."""
+        i = self._head
+        n = self._shape[2]
+        if self._numpy:
+            self._goal[i] = store.goal[:n]
+            self._current[i] = store.current[:n]
+        else:
+            self._goal_view[i * n:(i + 1) * n] = store.goal
+            self._current_view[i * n:(i + 1) * n] = store.current
+        values = self._sensor_values
+        j = i * self._shape[1]
+        for s in self._sensors:
+            values[j] = s.abs_value + s.offset
+            j += 1
+        twist = robot.twist
+        if twist is not None:
+            j = i * 6
+            self._twist[j] = twist.linear.x
+            self._twist[j + 1] = twist.linear.y
+            self._twist[j + 2] = twist.linear.z
+            self._twist[j + 3] = twist.angular.x
+            self._twist[j + 4] = twist.angular.y
+            self._twist[j + 5] = twist.angular.z
+        self._times[i] = time.monotonic()
+        self._head = (i + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def get_history(self, seconds: float = None, max_points: int = None, keys: list = None,
+                    absolute: bool = False) -> dict:
+        """
+        :param seconds: only samples of the last seconds. None for all the samples.
+        :param max_points: downsample to this number of samples at most. None to return all the samples.
+        :param keys: motors and sensors keys to return. None for all.
+        :param absolute: angle absolute or relative.
+        :return: dict with "t" (seconds from now to the sample, negative, oldest first), "motors" ({key: {"goal": [],
+            "current": []}}), "sensors" ({key: []}), "twist" (list of [linear x, y, z, angular x, y, z] or None) and
+            "format".
+        """
+        with self._lock:
+            if self._shape is None:
+                return {"t": [], "motors": {}, "sensors": {}, "twist": None,
+                        "format": "absolute" if absolute else "relative"}
+            now = time.monotonic()
+            count, head, cap = self.count, self._head, self.capacity
+            slots = [(head - count + k) % cap for k in range(count)]
+            if seconds is not None:
+                slots = [i for i in slots if now - self._times[i] <= seconds]
+            if max_points is not None and 0 < max_points < len(slots):
+                step = math.ceil(len(slots) / max_points)
+                slots = slots[len(slots) - 1::-step][::-1]  # Keep the newest sample
+            ns, n = self._shape[1], self._shape[2]
+            motors = {}
+            for m in self._motors:
+                if keys is not None and m.key not in keys:
+                    continue
+                column = m._index
+                if self._numpy:
+                    goal = [float(self._goal[i, column]) for i in slots]
+                    current = [float(self._current[i, column]) for i in slots]
+                else:
+                    goal = [self._goal[i * n + column] for i in slots]
+                    current = [self._current[i * n + column] for i in slots]
+                if not absolute:
+                    sign, offset = float(self._store.sign[column]), float(self._store.offset[column])
+                    goal = [a * sign - offset for a in goal]
+                    current = [a * sign - offset for a in current]
+                motors[m.key] = {"goal": [round(a, 2) for a in goal], "current": [round(a, 2) for a in current]}
+            sensors = {}
+            for j, s in enumerate(self._sensors):
+                if keys is None or s.key in keys:
+                    sensors[s.key] = [round(self._sensor_values[i * ns + j], 3) for i in slots]
+            twist = None
+            if self._robot.twist is not None:
+                twist = [[round(v, 3) for v in self._twist[i * 6:i * 6 + 6]] for i in slots]
+            return {
+                "t": [round(self._times[i] - now, 3) for i in slots],
+                "motors": motors,
+                "sensors": sensors,
+                "twist": twist,
+                "format": "absolute" if absolute else "relative"
+            }
+
+    def __str__(self):
+        return "<TelemetryBuffer {}/{} samples>".format(self.count, self.capacity)
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,114 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Ticker:
+    """
+    Fixed rate loop timer based on time.monotonic().
+    Every tick is scheduled at an absolute deadline, so the loop rate does not drift with the work duration
+    and is not affected by wall clock adjustments.
+    """
+
+    def __init__(self, name: str, per_second, speed=None):
+        """
+        :param name: name of the loop. Used in logs and stats.
+        :param per_second: ticks per second. A number or a callable that returns the current rate.
+        :param speed: optional callable that returns a rate multiplier. Example: lambda: robot.robot_speed.
+        """
+        self.name = name
+        self._per_second = per_second
+        self._speed = speed
+        self._deadline = None
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped_ticks = 0
+        self.jitter_max = 0.0
+        self._jitter_total = 0.0
+
+    def get_period(self) -> float:
+        """
+        :return: current tick period in seconds.
+        """
+        per_second = self._per_second() if callable(self._per_second) else self._per_second
+        speed = self._speed() if self._speed is not None else 1
+        return 1 / (per_second * speed)
+
+    def reset(self):
+        """
+        Restart the timeline from now. Use this after the loop has been idle, to avoid counting overruns.
+        """
+        self._deadline = None
+
+    def next_delay(self) -> float:
+        """
+        :return: seconds to wait before the next tick. 0 if the tick is already due.
+        """
+        now = time.monotonic()
+        if self._deadline is None:
+            self._deadline = now
+        return max(0.0, self._deadline - now)
+
+    def due(self) -> bool:
+        """
+        Non blocking version of sleep(). Useful for loops that already wait on something else (like select).
+        :return: True if the tick was due, and it is now consumed.
+        """
+        if self.next_delay() > 0:
+            return False
+        self.tick()
+        return True
+
+    def sleep(self):
+        """
+        Sleep until the next deadline, then consume the tick.
+        """
+        delay = self.next_delay()
+        if delay > 0:
+            time.sleep(delay)
+        self.tick()
+
+    def tick(self):
+        """
+        Consume the current tick and schedule the next deadline.
+        If the loop is late by one or more periods the missed ticks are skipped and an overrun is counted.
+        Call this after waiting next_delay() seconds (sleep() and due() already do it).
+        """
+        now = time.monotonic()
+        if self._deadline is None:
+            self._deadline = now
+        jitter = now - self._deadline
+        self.ticks += 1
+        self._jitter_total += jitter
+        if jitter > self.jitter_max:
+            self.jitter_max = jitter
+
+        period = self.get_period()
+        self._deadline += period
+        if now >= self._deadline:
+            missed = int((now - self._deadline) / period) + 1
+            self._deadline += missed * period
+            self.overruns += 1
+            self.skipped_ticks += missed
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[{}]: overrun, {} ticks skipped".format(self.name, missed))
+
+    def get_stats(self) -> dict:
+        """
+        :return: dict with rate, ticks, overruns and jitter (lateness of the wake up) in milliseconds.
+        """
+        return {
+            "per_second": round(1 / self.get_period(), 2),
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "skipped_ticks": self.skipped_ticks,
+            "jitter_mean_ms": round(self._jitter_total / self.ticks * 1000, 3) if self.ticks > 0 else 0.0,
+            "jitter_max_ms": round(self.jitter_max * 1000, 3)
+        }
+
+    def __str__(self):
+        return "<Ticker {} {:.2f}/s>".format(self.name, 1 / self.get_period())
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,403 @@
+import logging
+import math
+import threading
+from array import array
+from collections import OrderedDict
+
+import simplepybotsdk.configurations as configurations
+from simplepybotsdk.exceptions import RobotKeyError
+
+logger = logging.getLogger(__name__)
+
+NO_SAMPLE = float("nan")  # Motor not controlled by the trajectory on that tick
+PROFILES = ("linear", "cubic", "minimum_jerk", "trapezoidal")
+
+
+def get_profile_shape(profile: str, rows: int) -> list:
+    """
+    Normalized position of a movement on every tick, from 0 (start) to 1 (goal).
+    - linear: constant velocity.
+    - cubic: cubic ease in and out, velocity is 0 at the start and at the end.
+    - minimum_jerk: 5th order polynomial, velocity and acceleration are 0 at the start and at the end.
+    The trapezoidal profile depends on the motor speed, see get_trapezoidal_shape().
+    :param profile: profile name.
+    :param rows: number of ticks of the movement.
+    :return: list of rows positions. The last one is always 1.
+    """
+    shape = []
+    for k in range(1, rows + 1):
+        t = k / rows
+        if profile == "linear":
+            shape.append(t)
+        elif profile == "cubic":
+            shape.append(t * t * (3 - 2 * t))
+        elif profile == "minimum_jerk":
+            shape.append(t * t * t * (10 - 15 * t + 6 * t * t))
+        else:
+            raise RobotKeyError("Unknown motion profile '{}'. Use one of {}".format(profile, PROFILES))
+    return shape
+
+
+def get_trapezoidal_shape(rows: int, rate: float, distance: float, angle_speed: float) -> list:
+    """
+    Normalized position of a trapezoidal velocity movement: constant acceleration, cruise, constant deceleration.
+    Acceleration takes 1/3 of the movement, less if needed to keep the cruise velocity under angle_speed.
+    If the movement is too long to be done at angle_speed the velocity is constant (the motors thread limits it).
+    :param rows: number of ticks of the movement.
+    :param rate: ticks per second.
+    :param distance: absolute angle distance of the movement.
+    :param angle_speed: max motor speed in degrees per second.
+    :return: list of rows positions. The last one is always 1.
+    """
+    duration = rows / rate
+    accel_time = duration / 3
+    if angle_speed > 0 and distance > 0:
+        accel_time = max(0.0, min(accel_time, duration - distance / angle_speed))
+    if accel_time == 0:
+        return get_profile_shape("linear", rows)
+    velocity = 1 / (duration - accel_time)  # Normalized cruise velocity
+    acceleration = velocity / accel_time
+    shape = []
+    for k in range(1, rows + 1):
+        t = k / rate
+        if t < accel_time:
+            shape.append(0.5 * acceleration * t * t)
+        elif t <= duration - accel_time:
+            shape.append(0.5 * acceleration * accel_time * accel_time + velocity * (t - accel_time))
+        else:
+            shape.append(1 - 0.5 * acceleration * (duration - t) ** 2)
+    shape[-1] = 1.0
+    return shape
+
+
+class Trajectory:
+    """
+    Precomputed sample table of a movement: one row per scheduler tick, one column per motor.
+    Samples are absolute goal angles, already limited by the motor angle_limit. NaN samples leave the motor untouched.
+    """
+
+    def __init__(self, motors: list, rate: float, number_of_steps: int, samples: array):
+        """
+        :param motors: list of Motor, one for every column.
+        :param rate: ticks per second used to compile the table (point to point check per second).
+        :param number_of_steps: number of rows.
+        :param samples: flat array of number_of_steps * len(motors) absolute goal angles, row by row.
+        """
+        self.motors = motors
+        self.rate = rate
+        self.number_of_steps = number_of_steps
+        self.samples = samples
+
+    @property
+    def duration(self) -> float:
+        """
+        :return: duration in seconds at robot_speed 1.
+        """
+        return self.number_of_steps / self.rate
+
+    def get_row(self, step: int) -> array:
+        """
+        :param step: row index, from 0 to number_of_steps - 1.
+        :return: absolute goal angles of all the columns.
+        """
+        n = len(self.motors)
+        return self.samples[step * n:(step + 1) * n]
+
+    def __str__(self):
+        return "<Trajectory {} steps x {} motors at {}/s>".format(self.number_of_steps, len(self.motors), self.rate)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class TrajectoryCompiler:
+    """
+    Compiles point to point movements and motion file performances into Trajectory sample tables.
+    Compiled tables are cached: movements by (motors, start pose, goal pose, seconds, rate, profile),
+    performances by (name, start pose, rate, profile) until the motion configuration changes.
+    Profiles: "linear", "cubic", "minimum_jerk" and "trapezoidal" (velocity limited by motors_type angle_speed).
+    """
+
+    def __init__(self, robot, cache_size: int = None):
+        """
+        :param robot: RobotSDK instance.
+        :param cache_size: max number of cached trajectories. Default is configurations.TRAJECTORY_CACHE_SIZE.
+        """
+        self._robot = robot
+        self.cache_size = cache_size
+        if self.cache_size is None:
+            self.cache_size = configurations.TRAJECTORY_CACHE_SIZE
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._shapes = {}  # (profile, rows) -> profile shape shared by all the motors
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self):
+        """
+        Clear the cache. Call this when poses or performances change.
+        """
+        with self._lock:
+            self._cache.clear()
+
+    def _cache_get(self, key):
+        with self._lock:
+            trajectory = self._cache.get(key)
+            if trajectory is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return trajectory
+
+    def _cache_put(self, key, value):
+        with self._lock:
+            self._cache[key] = value
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _resolve_motors(self, motors_goal: dict, method: str) -> list:
+        """
+        :param motors_goal: dict of {"key": goal_angle}.
+        :param method: name of the caller, for logs.
+        :return: list of (motor, goal angle) for the motors that exist.
+        """
+        resolved = []
+        for key, goal in motors_goal.items():
+            m = self._robot.get_motor(key)
+            if m is None:
+                logger.warning("{}: motor with key '{}' not found".format(method, key))
+                continue
+            resolved.append((m, goal))
+        return resolved
+
+    def compile_move(self, motors_goal: dict, seconds: float, profile: str = None) -> Trajectory:
+        """
+        :param motors_goal: dict of {"key": goal_angle, "key": goal_angle}. Relative angles.
+        :param seconds: duration in seconds of the simultaneous movement.
+        :param profile: interpolation profile. Default is configurations.MOTION_PROFILE.
+        :return: Trajectory from the current goal angles to motors_goal.
+        """
+        profile = self._check_profile(profile)
+        rate = self._robot._motors_point_to_point_check_per_second
+        resolved = self._resolve_motors(motors_goal, "move_point_to_point")
+        motors = [m for m, _ in resolved]
+        start = tuple(round(m.get_goal_angle(), 3) for m in motors)
+        goal = tuple(g for _, g in resolved)
+        key = ("move", tuple(m.key for m in motors), start, goal, seconds, rate, profile)
+        trajectory = self._cache_get(key)
+        if trajectory is not None:
+            return trajectory
+
+        number_of_steps = self.get_number_of_steps(seconds, rate)
+        samples = array("d", bytes(8 * number_of_steps * len(motors)))
+        for column, m in enumerate(motors):
+            shape = self._get_shape(profile, number_of_steps, rate, m, goal[column] - start[column])
+            self._write_segment(samples, len(motors), column, m, 0, start[column], goal[column], shape)
+        trajectory = Trajectory(motors, rate, number_of_steps, samples)
+        self._cache_put(key, trajectory)
+        return trajectory
+
+    def compile_performance(self, name: str, profile: str = None) -> Trajectory:
+        """
+        Compile a performance of the motion file. Steps:
+        - {"type": "pose", "to": pose name, "seconds": duration}
+        - {"type": "performance", "to": performance name}
+        - {"type": "multiple-performance", "to": [performance names]}: performances played at the same time.
+        Every step can have a "delay": seconds to wait before the step starts.
+        Pose steps can have a "profile", otherwise the profile of the performance is used.
+        :param name: performance name.
+        :param profile: interpolation profile. Default is configurations.MOTION_PROFILE.
+        :return: Trajectory of the whole performance, starting from the current goal angles.
+        """
+        profile = self._check_profile(profile)
+        performances = self._get_performances()
+        if name not in performances:
+            raise RobotKeyError("compile_performance: performance '{}' not found".format(name))
+        rate = self._robot._motors_point_to_point_check_per_second
+        plan_key = ("plan", name, rate, profile)
+        plan = self._cache_get(plan_key)
+        if plan is None:
+            segments = []  # (motor, first row, number of rows, goal, profile)
+            length = self._plan_performance(name, performances, rate, profile, 0, segments, ())
+            motors = []
+            for m, _, _, _, _ in segments:
+                if m not in motors:
+                    motors.append(m)
+            plan = (length, sorted(segments, key=lambda s: s[1]), motors)
+            self._cache_put(plan_key, plan)
+        length, segments, motors = plan
+        start = tuple(round(m.get_goal_angle(), 3) for m in motors)
+        key = ("performance", name, tuple(m.key for m in motors), start, rate, profile)
+        trajectory = self._cache_get(key)
+        if trajectory is not None:
+            return trajectory
+        trajectory = self._build_trajectory(motors, start, length, segments, rate)
+        self._cache_put(key, trajectory)
+        return trajectory
+
+    def compile_recording(self, animation: list, profile: str = None) -> Trajectory:
+        """
+        Compile a point to point recording, see RobotSDK.point_to_point_start_recording().
+        Every movement starts at its time_since_start, a newer movement interrupts the older one on the same motor.
+        :param animation: list of (motors_goal, duration in second, time_since_start).
+        :param profile: interpolation profile. Default is configurations.MOTION_PROFILE.
+        :return: Trajectory of the whole recording, starting from the current goal angles.
+        """
+        profile = self._check_profile(profile)
+        rate = self._robot._motors_point_to_point_check_per_second
+        segments = []
+        length = 0
+        motors = []
+        for motors_goal, seconds, time_since_start in animation:
+            first = round(time_since_start * rate)
+            rows = self.get_number_of_steps(seconds, rate)
+            length = max(length, first + rows)
+            for m, goal in self._resolve_motors(motors_goal, "compile_recording"):
+                segments.append((m, first, rows, goal, profile))
+                if m not in motors:
+                    motors.append(m)
+        segments.sort(key=lambda s: s[1])
+        start = tuple(m.get_goal_angle() for m in motors)
+        return self._build_trajectory(motors, start, length, segments, rate)
+
+    def _build_trajectory(self, motors: list, start: tuple, length: int, segments: list, rate: float) -> Trajectory:
+        """
+        :param motors: list of Motor, one for every column.
+        :param start: relative goal angles of the motors when the trajectory starts.
+        :param length: number of rows.
+        :param segments: list of (motor, first row, number of rows, goal, profile), sorted by first row.
+        :param rate: ticks per second.
+        :return: Trajectory with NaN samples where motors are not controlled.
+        """
+        n = len(motors)
+        number_of_steps = max(length, 1)
+        samples = array("d", [NO_SAMPLE]) * (number_of_steps * n)
+        columns = {m: column for column, m in enumerate(motors)}
+        last = dict(zip(motors, start))  # Relative goal angle of the last segment of every motor
+        end = {}  # Row after the last segment of every motor
+        for m, first, rows, goal, segment_profile in segments:
+            column = columns[m]
+            if end.get(m, 0) > first:  # Newest segment wins: stop the previous one where it is
+                if first > 0 and samples[(first - 1) * n + column] == samples[(first - 1) * n + column]:
+                    last[m] = m.to_relative_angle(samples[(first - 1) * n + column])
+                for row in range(first, end[m]):
+                    samples[row * n + column] = NO_SAMPLE
+            shape = self._get_shape(segment_profile, rows, rate, m, goal - last[m])
+            self._write_segment(samples, n, column, m, first, last[m], goal, shape)
+            last[m] = goal
+            end[m] = first + rows
+        return Trajectory(motors, rate, number_of_steps, samples)
+
+    def _get_performances(self) -> dict:
+        motion = self._robot.motion_configuration
+        if motion is None or "performances" not in motion:
+            return {}
+        return motion["performances"]
+
+    def _plan_performance(self, name: str, performances: dict, rate: float, profile: str, row: int, segments: list,
+                          parents: tuple) -> int:
+        """
+        Append the pose segments of a performance, recursively.
+        :param name: performance name.
+        :param performances: performances of the motion configuration.
+        :param rate: ticks per second.
+        :param profile: default interpolation profile.
+        :param row: first row of the performance.
+        :param segments: list where (motor, first row, number of rows, goal, profile) segments are appended.
+        :param parents: names of the performances that are playing this one. Used to detect loops.
+        :return: row after the end of the performance.
+        """
+        if name not in performances:
+            raise RobotKeyError("compile_performance: performance '{}' not found".format(name))
+        if name in parents:
+            raise RobotKeyError("compile_performance: performance '{}' plays itself".format(name))
+        poses = self._robot.poses if self._robot.poses is not None else {}
+        for step in performances[name].get("steps", []):
+            row += round(step.get("delay", 0) * rate)
+            if step["type"] == "pose":
+                if step["to"] not in poses:
+                    raise RobotKeyError("compile_performance: pose '{}' not found".format(step["to"]))
+                rows = self.get_number_of_steps(step.get("seconds", 0), rate)
+                step_profile = self._check_profile(step.get("profile", profile))
+                for m, goal in self._resolve_motors(poses[step["to"]], "compile_performance"):
+                    segments.append((m, row, rows, goal, step_profile))
+                row += rows
+            elif step["type"] == "performance":
+                row = self._plan_performance(step["to"], performances, rate, profile, row, segments,
+                                             parents + (name,))
+            elif step["type"] == "multiple-performance":
+                row = max([self._plan_performance(p, performances, rate, profile, row, segments, parents + (name,))
+                           for p in step["to"]] + [row])
+            else:
+                raise RobotKeyError("compile_performance: unknown step type '{}' in '{}'".format(step["type"], name))
+        return row
+
+    @staticmethod
+    def _check_profile(profile: str) -> str:
+        """
+        :param profile: profile name or None.
+        :return: profile name, configurations.MOTION_PROFILE if None.
+        """
+        if profile is None:
+            profile = configurations.MOTION_PROFILE
+        if profile not in PROFILES:
+            raise RobotKeyError("Unknown motion profile '{}'. Use one of {}".format(profile, PROFILES))
+        return profile
+
+    def _get_shape(self, profile: str, rows: int, rate: float, m, delta: float) -> list:
+        """
+        :param profile: profile name.
+        :param rows: number of ticks of the movement.
+        :param rate: ticks per second.
+        :param m: Motor, used by the trapezoidal profile to read the motor type speed.
+        :param delta: relative angle distance of the movement.
+        :return: normalized position on every tick.
+        """
+        if profile == "trapezoidal":
+            motor_type = self._robot.configuration.get("motors_type", {}).get(m.motor_type, {})
+            return get_trapezoidal_shape(rows, rate, abs(delta), motor_type.get("angle_speed", 0))
+        shape = self._shapes.get((profile, rows))
+        if shape is None:
+            shape = get_profile_shape(profile, rows)
+            if len(self._shapes) < configurations.TRAJECTORY_CACHE_SIZE:
+                self._shapes[(profile, rows)] = shape
+        return shape
+
+    @staticmethod
+    def get_number_of_steps(seconds: float, rate: float) -> int:
+        """
+        :param seconds: duration in seconds.
+        :param rate: ticks per second.
+        :return: number of ticks of the movement, at least 1.
+        """
+        return math.ceil(rate * seconds) if seconds > 0 else 1
+
+    @staticmethod
+    def _write_segment(samples: array, n: int, column: int, m, first: int, start: float, goal: float, shape: list):
+        """
+        Write the movement of a motor into a sample table. The last row is exactly the goal angle.
+        :param samples: flat sample table.
+        :param n: number of columns.
+        :param column: column of the motor.
+        :param m: Motor.
+        :param first: first row of the movement.
+        :param start: relative start angle.
+        :param goal: relative goal angle.
+        :param shape: normalized position on every row of the movement, see get_profile_shape().
+        """
+        limit_min, limit_max = m.angle_limit[0], m.angle_limit[1]
+        if not limit_min <= goal <= limit_max:
+            logger.warning("{}: goal angle {:.2f} out of angle limit {}".format(m.key, goal, m.angle_limit))
+        offset = m.offset
+        sign = -1.0 if m.orientation == 1 else 1.0
+        delta = goal - start
+        index = first * n + column
+        for s in shape:
+            angle = start + delta * s
+            if angle < limit_min:
+                angle = limit_min
+            elif angle > limit_max:
+                angle = limit_max
+            samples[index] = (angle + offset) * sign
+            index += n